@@ -0,0 +1,126 @@
+import pandas as pd
+from sqlalchemy import func, select
+
+from api import amostragem, arquivo, dimensoes
+from api.rollups import ROLLUPS
+from api.tables import consumo_agua, consumo_energia, compra_tbl, atividade_tbl
+
+
+# tabela -> (coluna de tempo, medidas somadas, dimensões permitidas no agrupamento/filtro)
+AGREGAVEIS = {
+    "consumo_agua": (consumo_agua, "timestamp", ["volume_litros"], ["usuario_id", "atividade"]),
+    "consumo_energia": (consumo_energia, "timestamp", ["gasto_h"], ["usuario_id", "equipamento"]),
+    "compra": (compra_tbl, "data", ["gasto_total", "quantidade"], ["usuario_id", "produto_id", "produto_nome"]),
+    "atividade": (atividade_tbl, "data", ["consumo", "porcentagem_gasto"],
+                  ["usuario_id", "produto_id", "produto_nome", "atividade"]),
+}
+
+GRANULARIDADES = ("hora", "dia", "semana", "mes", "total")
+
+
+def balde(coluna, granularidade):
+    if granularidade == "hora":
+        return func.strftime("%Y-%m-%d %H:00:00", coluna)
+    if granularidade == "dia":
+        return func.date(coluna)
+    if granularidade == "semana":
+        # semana começando na segunda-feira
+        return func.date(coluna, "-6 days", "weekday 1")
+    if granularidade == "mes":
+        return func.date(coluna, "start of month")
+    return None
+
+
+def inicio_de_dia(valor):
+    return valor is None or (valor.hour, valor.minute, valor.second, valor.microsecond) == (0, 0, 0, 0)
+
+
+def origem(tabela, granularidade, inicio, fim):
+    tbl, tempo, medidas, _ = AGREGAVEIS[tabela]
+    # com janelas em dias inteiros, o rollup diário responde sem ler as leituras brutas
+    if tabela in ROLLUPS and granularidade != "hora" and inicio_de_dia(inicio) and inicio_de_dia(fim):
+        rollup, _, _ = ROLLUPS[tabela]
+        return rollup, rollup.c.periodo, func.sum(rollup.c.leituras), rollup.c.granularidade == "dia"
+    return tbl, tbl.c[tempo], func.count(), None
+
+
+def formatar_periodo(tempo, granularidade):
+    # mesmos textos que balde() produz no SQLite
+    if granularidade == "hora":
+        return tempo.dt.strftime("%Y-%m-%d %H:00:00")
+    if granularidade == "semana":
+        return (tempo.dt.normalize() - pd.to_timedelta(tempo.dt.weekday, unit="D")).dt.strftime("%Y-%m-%d")
+    return tempo.dt.strftime("%Y-%m-01" if granularidade == "mes" else "%Y-%m-%d")
+
+
+def agregar_com_arquivo(conn, tabela, granularidade, por, inicio, fim, filtros, pasta=None):
+    # intervalo que alcança leituras arquivadas e não pode usar o rollup: agrega em memória
+    _, _, medidas, _ = AGREGAVEIS[tabela]
+    df = arquivo.ler_consumo(conn, tabela, [*por, *medidas], inicio, fim, filtros, pasta)
+    chaves = (["periodo"] if granularidade != "total" else []) + list(por)
+    if granularidade != "total":
+        df["periodo"] = formatar_periodo(df["timestamp"], granularidade)
+    if chaves:
+        grupos = df.groupby(chaves, sort=True)
+        resultado = grupos[medidas].sum()
+        resultado.insert(0, "leituras", grupos.size())
+        resultado = resultado.reset_index()
+    else:
+        resultado = pd.DataFrame({"leituras": [len(df)], **{m: [df[m].sum() if len(df) else None] for m in medidas}})
+    colunas = [*chaves, "leituras", *medidas]
+    # astype(object): tipos do Python, não do NumPy, para a serialização em JSON
+    return colunas, list(resultado[colunas].astype(object).itertuples(index=False, name=None))
+
+
+def agregar(conn, tabela, granularidade="dia", por=(), inicio=None, fim=None, filtros=None, pontos=None, pasta=None):
+    if tabela not in AGREGAVEIS:
+        raise KeyError(tabela)
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade}")
+    _, _, medidas, dimensoes = AGREGAVEIS[tabela]
+    filtros = filtros or {}
+    for coluna in [*por, *filtros]:
+        if coluna not in dimensoes:
+            raise ValueError(f"Dimensão inválida para {tabela}: {coluna}")
+
+    fonte, tempo, leituras, condicao = origem(tabela, granularidade, inicio, fim)
+    limite = arquivo.fronteira(conn, tabela) if tabela in arquivo.ARQUIVAVEIS and condicao is None else None
+    if limite is not None and (inicio is None or inicio < limite):
+        colunas, linhas = agregar_com_arquivo(conn, tabela, granularidade, por, inicio, fim, filtros, pasta)
+    else:
+        colunas, linhas = agregar_sql(conn, tabela, fonte, tempo, leituras, condicao, medidas, granularidade, por,
+                                      inicio, fim, filtros)
+    # resposta colunar: uma lista por coluna, sem repetir as chaves a cada linha
+    valores = list(zip(*linhas)) if linhas else [()] * len(colunas)
+    dados = {coluna: list(v) for coluna, v in zip(colunas, valores)}
+    if pontos and granularidade != "total":
+        # para gráficos: mínimo e máximo por balde de tempo, o suficiente para a largura pedida
+        dados = amostragem.reduzir_colunar(dados, "periodo", medidas[0], pontos, list(por))
+    return {
+        "tabela": tabela,
+        "granularidade": granularidade,
+        "linhas": len(dados[colunas[0]]) if colunas else 0,
+        "colunas": colunas,
+        "dados": dados,
+    }
+
+
+def agregar_sql(conn, tabela, fonte, tempo, leituras, condicao, medidas, granularidade, por, inicio, fim, filtros):
+    periodo = balde(tempo, granularidade)
+    chaves = ([periodo.label("periodo")] if periodo is not None else []) + [dimensoes.coluna(tabela, fonte, d) for d in por]
+
+    sel = select(*chaves, leituras.label("leituras"), *[func.sum(fonte.c[m]).label(m) for m in medidas])
+    sel = sel.select_from(dimensoes.juntar(tabela, fonte, por))
+    if condicao is not None:
+        sel = sel.where(condicao)
+    if inicio is not None:
+        sel = sel.where(tempo >= (inicio.date() if condicao is not None else inicio))
+    if fim is not None:
+        sel = sel.where(tempo < (fim.date() if condicao is not None else fim))
+    for coluna, valor in filtros.items():
+        sel = sel.where(dimensoes.filtro(tabela, fonte, coluna, valor))
+    if chaves:
+        sel = sel.group_by(*chaves).order_by(*chaves)
+
+    resultado = conn.execute(sel)
+    return list(resultado.keys()), resultado.fetchall()
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+from api import config
+
+# Redução de séries temporais para gráficos: divide o eixo do tempo em baldes
+# (um por coluna de pixels) e guarda, em cada balde, o ponto de mínimo e o de
+# máximo. O desenho fica igual ao da série completa na mesma largura, e os picos
+# (um banho, o chuveiro elétrico ligado) nunca são descartados.
+
+PONTOS_POR_PIXEL = 2  # mínimo e máximo de cada coluna de pixels
+
+
+def pontos_para_largura(largura_px=None):
+    return max(int(largura_px or config.LARGURA_GRAFICO_PX), 1) * PONTOS_POR_PIXEL
+
+
+def indices_min_max(x, y, pontos):
+    # x crescente (numérico); devolve até `pontos` índices a manter, em ordem
+    n = len(y)
+    if n <= pontos:
+        return np.arange(n)
+    if pontos < 4:
+        # orçamento menor que um balde com as pontas: o pico, o vale e o primeiro ponto, nessa ordem
+        return np.unique(np.array([np.argmax(y), np.argmin(y), 0][:max(pontos, 0)], dtype=np.int64))
+    # o primeiro e o último ponto sempre ficam: sobram (pontos - 2) // 2 baldes de mínimo e máximo
+    baldes = (pontos - 2) // 2
+    # limites dos baldes no tempo; baldes vazios somem ao remover limites repetidos
+    limites = np.searchsorted(x, np.linspace(x[0], x[-1], baldes + 1)[1:-1], side="right")
+    inicios = np.unique(np.concatenate(([0], limites[limites < n])))
+    tamanhos = np.diff(np.append(inicios, n))
+    balde = np.repeat(np.arange(len(inicios)), tamanhos)
+
+    maximos = np.maximum.reduceat(y, inicios)
+    minimos = np.minimum.reduceat(y, inicios)
+    # primeira posição de cada balde onde o valor é o máximo (ou o mínimo) do balde
+    posicoes = np.arange(n)
+    eh_max = y == maximos[balde]
+    eh_min = y == minimos[balde]
+    _, primeiro_max = np.unique(balde[eh_max], return_index=True)
+    _, primeiro_min = np.unique(balde[eh_min], return_index=True)
+    manter = np.concatenate(([0, n - 1], posicoes[eh_max][primeiro_max], posicoes[eh_min][primeiro_min]))
+    return np.unique(manter)
+
+
+def repartir(tamanhos, pontos):
+    # orçamento de cada grupo, proporcional ao tamanho e somando no máximo `pontos`; cada
+    # grupo fica com pelo menos um ponto se couber, e nenhum recebe mais do que tem
+    tamanhos = np.asarray(tamanhos, dtype=np.int64)
+    minimo = 1 if len(tamanhos) <= pontos else 0
+    cotas = (pontos - minimo * len(tamanhos)) * tamanhos / tamanhos.sum()
+    orcamentos = minimo + np.floor(cotas).astype(np.int64)
+    sobra = pontos - orcamentos.sum()
+    # o que sobra do arredondamento vai para as maiores frações
+    orcamentos[np.argsort(np.floor(cotas) - cotas, kind="stable")[:sobra]] += 1
+    return np.minimum(orcamentos, tamanhos)
+
+
+def reduzir_serie(serie, pontos=None):
+    # serie: pd.Series indexada por tempo (ordenada); NaN ficam de fora
+    pontos = pontos or pontos_para_largura()
+    serie = serie.dropna()
+    if len(serie) <= pontos:
+        return serie
+    x = serie.index.asi8 if isinstance(serie.index, pd.DatetimeIndex) else np.asarray(serie.index, dtype=float)
+    return serie.iloc[indices_min_max(x, serie.to_numpy(dtype=float), pontos)]
+
+
+def reduzir_colunar(dados, tempo, medida, pontos, grupos=()):
+    # dados no formato colunar de agregados.agregar ({coluna: [...]}); reduz cada
+    # combinação de grupos separadamente, usando a medida para escolher os pontos
+    n = len(dados[tempo])
+    if n <= pontos:
+        return dados
+    x = pd.to_datetime(pd.Series(dados[tempo])).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    y = np.asarray(dados[medida], dtype=float)
+    if grupos:
+        chaves = pd.MultiIndex.from_arrays([dados[g] for g in grupos]) if len(grupos) > 1 else pd.Index(dados[grupos[0]])
+        codigos, _ = pd.factorize(chaves)
+    else:
+        codigos = np.zeros(n, dtype=np.int64)
+    orcamentos = repartir(np.bincount(codigos), pontos)
+    manter = []
+    for codigo, orcamento in enumerate(orcamentos):
+        posicoes = np.flatnonzero(codigos == codigo)
+        # o orçamento total é dividido entre os grupos: a soma não passa de `pontos`
+        ordem = posicoes[np.argsort(x[posicoes], kind="stable")]
+        manter.append(ordem[indices_min_max(x[ordem], y[ordem], orcamento)])
+    manter = np.sort(np.concatenate(manter))
+    return {coluna: [valores[i] for i in manter] for coluna, valores in dados.items()}
@@ -0,0 +1,231 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import math
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, select, tuple_
+from sqlalchemy.dialects.sqlite import insert
+
+from api import config, db, dimensoes, versoes
+from api.tables import alerta_tbl, anomalia_estado_tbl, consumo_agua, consumo_energia
+
+# Detecção de anomalias em fluxo: cada série (tabela, usuário, atividade/equipamento)
+# guarda só médias e variância móveis exponenciais (EWMA) do log do valor, então a
+# memória é O(1) por série e nada do histórico é relido. Chamado por escrita.gravar na
+# mesma transação do insert, com o estado no banco: reiniciar a API não muda nada.
+# Dois testes por leitura:
+# - pico: a leitura está muito acima da média lenta (escore z acima do limiar);
+#   é "vazamento" se for água de madrugada, "consumo_alto" se for água no resto do dia;
+# - nível: soma acumulada (CUSUM) dos escores acima de uma folga, que cresce quando
+#   várias leituras seguidas ficam acima do normal (ex.: uma descarga que não para,
+#   uma geladeira gastando o dobro em todas as leituras); avisa uma vez por mudança.
+# Para energia os dois viram "falha_equipamento".
+
+# tabela de leituras -> coluna analisada
+VALORES = {"consumo_agua": "volume_litros", "consumo_energia": "gasto_h"}
+ORIGENS = {"consumo_agua": consumo_agua, "consumo_energia": consumo_energia}
+TIPOS = ("vazamento", "consumo_alto", "falha_equipamento")
+
+# desvio mínimo (em log): séries quase constantes não disparam por variações pequenas
+DESVIO_MINIMO = 0.05
+# somado antes do log para aceitar leituras zeradas (1 mL / 1 Wh)
+PISO = 1e-3
+# folga do CUSUM, em desvios: escores até ela não acumulam
+FOLGA_CUSUM = 0.5
+LOTE_RECONSTRUCAO = 50_000
+
+
+CAMPOS_ESTADO = ("leituras", "media", "variancia", "cusum", "em_deriva", "ultima_leitura")
+
+
+def novo_estado():
+    return {"leituras": 0, "media": 0.0, "variancia": 0.0, "cusum": 0.0, "em_deriva": False, "ultima_leitura": None}
+
+
+def carregar_estados(conn, tabela, chaves):
+    estados = {}
+    chaves = list(chaves)
+    c = anomalia_estado_tbl.c
+    # em blocos: o SQLite limita o número de parâmetros por comando
+    for inicio in range(0, len(chaves), 400):
+        sel = select(anomalia_estado_tbl).where(
+            c.tabela == tabela, tuple_(c.usuario_id, c.dimensao_id).in_(chaves[inicio:inicio + 400]))
+        for linha in conn.execute(sel).mappings():
+            estados[(linha["usuario_id"], linha["dimensao_id"])] = {campo: linha[campo] for campo in CAMPOS_ESTADO}
+    return estados
+
+
+def salvar_estados(conn, tabela, estados):
+    if not estados:
+        return
+    ins = insert(anomalia_estado_tbl)
+    conn.execute(ins.on_conflict_do_update(
+        index_elements=[c for c in anomalia_estado_tbl.primary_key.columns],
+        set_={campo: ins.excluded[campo] for campo in CAMPOS_ESTADO},
+    ), [{"tabela": tabela, "usuario_id": u, "dimensao_id": d, **estado} for (u, d), estado in estados.items()])
+
+
+def tipo_alerta(tabela, timestamp, teste):
+    if tabela == "consumo_energia":
+        return "falha_equipamento"
+    if teste == "nivel" or timestamp.hour in config.ANOMALIA_HORAS_NOITE:
+        return "vazamento"
+    return "consumo_alto"
+
+
+def esperado(estado):
+    return math.exp(estado["media"]) - PISO
+
+
+def observar(estado, valor, parametros):
+    # atualiza o estado com uma leitura; devolve [(teste, escore, esperado)] dos testes que dispararam
+    x = math.log(max(valor, 0.0) + PISO)
+    desvio = max(math.sqrt(estado["variancia"]), DESVIO_MINIMO)
+    escore = (x - estado["media"]) / desvio
+    disparos = []
+
+    if estado["leituras"] >= parametros["aquecimento"]:
+        if escore > parametros["limiar"]:
+            disparos.append(("pico", escore, esperado(estado)))
+            # o pico entra limitado ao limiar: uma leitura isolada não desloca a média nem o CUSUM
+            escore = parametros["limiar"]
+            x = estado["media"] + escore * desvio
+        estado["cusum"] = max(0.0, estado["cusum"] + escore - FOLGA_CUSUM)
+        if estado["cusum"] > parametros["limiar_nivel"] and not estado["em_deriva"]:
+            disparos.append(("nivel", estado["cusum"], esperado(estado)))
+            estado["em_deriva"] = True
+        elif estado["em_deriva"] and estado["cusum"] == 0.0:
+            # voltou ao normal (ou a média se ajustou ao novo nível): pode avisar de novo
+            estado["em_deriva"] = False
+
+    # no aquecimento o peso é 1/n (média e variância comuns); depois, o alfa fixo
+    estado["leituras"] += 1
+    peso = max(parametros["alfa"], 1 / estado["leituras"])
+    diferenca = x - estado["media"]
+    estado["media"] += peso * diferenca
+    estado["variancia"] = (1 - peso) * (estado["variancia"] + peso * diferenca * diferenca)
+    return disparos
+
+
+def parametros():
+    return {
+        "alfa": config.ANOMALIA_ALFA, "limiar": config.ANOMALIA_LIMIAR,
+        "limiar_nivel": config.ANOMALIA_LIMIAR_NIVEL, "aquecimento": config.ANOMALIA_AQUECIMENTO,
+    }
+
+
+def processar(tabela, linhas, estados, parametros):
+    # linhas com o id da dimensão (já resolvido); devolve os alertas gerados
+    _, _, coluna_id = dimensoes.DIMENSOES[tabela]
+    valor = VALORES[tabela]
+    alertas = []
+    for linha in sorted(linhas, key=lambda l: l["timestamp"]):
+        chave = (linha["usuario_id"], linha[coluna_id])
+        estado = estados.setdefault(chave, novo_estado())
+        for teste, escore, previsto in observar(estado, linha[valor], parametros):
+            alertas.append({
+                "tabela": tabela, "usuario_id": chave[0], "dimensao_id": chave[1], "teste": teste,
+                "tipo": tipo_alerta(tabela, linha["timestamp"], teste), "timestamp": linha["timestamp"],
+                "valor": linha[valor], "esperado": round(previsto, 4), "escore": round(escore, 2),
+            })
+        if estado["ultima_leitura"] is None or linha["timestamp"] > estado["ultima_leitura"]:
+            estado["ultima_leitura"] = linha["timestamp"]
+    return alertas
+
+
+def atualizar(conn, tabela, linhas):
+    # chamado por escrita.gravar, na mesma transação do insert
+    if tabela not in VALORES or not linhas:
+        return 0
+    coluna_id = dimensoes.DIMENSOES[tabela][2]
+    estados = carregar_estados(conn, tabela, {(l["usuario_id"], l[coluna_id]) for l in linhas})
+    alertas = processar(tabela, linhas, estados, parametros())
+    salvar_estados(conn, tabela, estados)
+    if alertas:
+        conn.execute(insert(alerta_tbl), alertas)
+        versoes.incrementar(conn, "alerta")
+    return len(alertas)
+
+
+def reconstruir(conn, tabela, gerar_alertas=False):
+    # refaz o estado relendo as leituras do banco em ordem de tempo (para bancos que
+    # já tinham histórico); por padrão não gera alertas para o passado
+    origem = ORIGENS[tabela]
+    _, _, coluna_id = dimensoes.DIMENSOES[tabela]
+    valor = VALORES[tabela]
+    conn.execute(delete(anomalia_estado_tbl).where(anomalia_estado_tbl.c.tabela == tabela))
+    estados, alertas = {}, []
+    sel = (select(origem.c.usuario_id, origem.c[coluna_id], origem.c[valor], origem.c.timestamp)
+           .order_by(origem.c.timestamp, origem.c.id))
+    resultado = conn.execution_options(stream_results=True).execute(sel)
+    while lote := resultado.fetchmany(LOTE_RECONSTRUCAO):
+        novos = processar(tabela, [linha._asdict() for linha in lote], estados, parametros())
+        if gerar_alertas:
+            alertas.extend(novos)
+    salvar_estados(conn, tabela, estados)
+    if alertas:
+        conn.execute(insert(alerta_tbl), alertas)
+    versoes.incrementar(conn, "alerta")
+    return len(estados), len(alertas)
+
+
+# === CONSULTAS ===
+def selecionar_alertas(tabela=None, usuario_id=None, desde=None, tipo=None, item=None):
+    # o nome da atividade/do equipamento vem da dimensão da tabela de cada alerta
+    a = alerta_tbl.c
+    fonte, nomes = alerta_tbl, []
+    for nome_tabela, (_, dimensao, _) in dimensoes.DIMENSOES.items():
+        fonte = fonte.outerjoin(dimensao, and_(a.tabela == nome_tabela, a.dimensao_id == dimensao.c.id))
+        nomes.append(dimensao.c.nome)
+    nome = func.coalesce(*nomes)
+    sel = (select(a.id, a.tabela, a.usuario_id, nome.label("item"), a.tipo, a.teste,
+                  a.timestamp, a.valor, a.esperado, a.escore)
+           .select_from(fonte))
+    if tabela:
+        sel = sel.where(a.tabela == tabela)
+    if usuario_id is not None:
+        sel = sel.where(a.usuario_id == usuario_id)
+    if desde:
+        sel = sel.where(a.timestamp >= desde)
+    if tipo:
+        sel = sel.where(a.tipo == tipo)
+    if item:
+        sel = sel.where(nome == item)
+    return sel.order_by(a.timestamp.desc(), a.id.desc())
+
+
+def listar(conn, tabela=None, usuario_id=None, desde=None, tipo=None, item=None, limite=100):
+    sel = selecionar_alertas(tabela, usuario_id, desde, tipo, item).limit(limite)
+    return [dict(linha) for linha in conn.execute(sel).mappings()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estado da detecção de anomalias nas leituras")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--reconstruir", action="store_true", help="refaz o estado a partir das leituras do banco")
+    parser.add_argument("--alertas", action="store_true", help="com --reconstruir, grava alertas para o histórico")
+    parser.add_argument("--dias", type=int, default=7, help="sem --reconstruir, lista os alertas desses dias")
+    args = parser.parse_args()
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    if args.reconstruir:
+        for tabela in VALORES:
+            with engine.begin() as conn:
+                series, alertas = reconstruir(conn, tabela, args.alertas)
+            print(f"✅ {tabela}: {series} séries, {alertas} alertas")
+        return
+    with engine.connect() as conn:
+        alertas = listar(conn, desde=datetime.now() - timedelta(days=args.dias), limite=1000)
+    for alerta in alertas:
+        print(f"🚨 {alerta['timestamp']} {alerta['tipo']:<18} usuário {alerta['usuario_id']:<4} {alerta['item']:<20} "
+              f"{alerta['valor']:.2f} (esperado {alerta['esperado']:.2f}, z={alerta['escore']})")
+    print(f"{len(alertas)} alertas nos últimos {args.dias} dias")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,74 +4,423 @@ import os
 # Adiciona o diretório raiz do projeto ao path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Any
+
+from anyio import from_thread, to_thread
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import api.models as models
+from api import agregados, amostragem, anomalias, arquivo, cache_respostas, config, consultas, db, escrita, estoque, eventos, formatos, importacao, metricas, migracoes, previsao, shards
+from api.buffer_escrita import BufferEscrita, FilaCheia
 from api.tables import consumo_agua, consumo_energia, compra_tbl, atividade_tbl, produto_tbl
-from sqlalchemy import create_engine, Table, MetaData
+from sqlalchemy import Table, MetaData
+
+log = logging.getLogger(__name__)
+
+# endpoints usam o engine assíncrono; o síncrono fica para migrações e importação em thread
+engine_async = db.criar_engine_async()
+engine = db.criar_engine()
+# particionamento por residência (opcional): leituras de água/energia em um arquivo por balde de usuario_id
+roteador = shards.Roteador() if config.SHARDS else None
+# bancos de que as respostas de leitura dependem (para os ETags)
+fontes = [engine_async] + (roteador.engines_async if roteador else [])
+buffer = None
+difusor = None
+tarefa_previsoes = None
+
+
+def criar_buffer(engine_async):
+    return BufferEscrita(
+        engine_async, config.BUFFER_MAX_LINHAS, config.BUFFER_INTERVALO_MS, config.BUFFER_CAPACIDADE,
+        config.BUFFER_DURABILIDADE, config.BUFFER_TIMEOUT_FILA_S,
+    )
+
 
+async def manter_previsoes():
+    # único escritor dos modelos de previsão: os dias novos entram aqui, fora das requisições
+    while True:
+        try:
+            await to_thread.run_sync(previsao.atualizar_se_preciso, engine)
+            if roteador:
+                await to_thread.run_sync(roteador.atualizar_previsoes)
+        except Exception:
+            # a tarefa continua: a próxima rodada tenta de novo
+            log.exception("Falha ao atualizar os modelos de previsão")
+        await asyncio.sleep(config.PREVISAO_INTERVALO_S)
 
-DATABASE_URL = "sqlite:///../consumo.db"  
 
-app = FastAPI()
-engine = create_engine(DATABASE_URL)
+@asynccontextmanager
+async def lifespan(app):
+    # a API é quem escreve no banco, então aplica as migrações pendentes ao subir
+    for versao, descricao in migracoes.aplicar_migracoes(engine, pasta_arquivo=config.ARQUIVO_DIR):
+        print(f"🛠️ Migração {versao} aplicada: {descricao}")
+    if roteador:
+        for n, versao, descricao in roteador.preparar():
+            print(f"🛠️ Shard {n:03d}: migração {versao} aplicada: {descricao}")
+    global buffer, difusor, tarefa_previsoes
+    difusor = eventos.Difusor(engine_async, roteador=roteador)
+    await difusor.iniciar()
+    if config.PREVISAO_INTERVALO_S > 0:
+        tarefa_previsoes = asyncio.create_task(manter_previsoes())
+    if config.MODO_ESCRITA == "buffer":
+        buffer = criar_buffer(engine_async)
+        buffer.iniciar()
+        if roteador:
+            # um group commit por shard: residências em arquivos diferentes não esperam umas pelas outras
+            roteador.buffers = [criar_buffer(e) for e in roteador.engines_async]
+            for b in roteador.buffers:
+                b.iniciar()
+    yield
+    if tarefa_previsoes:
+        tarefa_previsoes.cancel()
+        try:
+            await tarefa_previsoes
+        except asyncio.CancelledError:
+            pass
+        tarefa_previsoes = None
+    if buffer:
+        # drena a fila antes de fechar as conexões
+        await buffer.encerrar()
+        buffer = None
+        if roteador:
+            for b in roteador.buffers:
+                await b.encerrar()
+            roteador.buffers = []
+    await difusor.encerrar()
+    difusor = None
+    cache_respostas.fechar_caches()
+    if roteador:
+        await roteador.fechar()
+    await engine_async.dispose()
+    engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 metadata = MetaData()
 
-API_URL = "http://127.0.0.1:8000"
+API_URL = config.API_URL
+
+
+@app.middleware("http")
+async def medir_requisicao(request: Request, call_next):
+    inicio = time.perf_counter()
+    estado = metricas.novo_estado_requisicao()
+    metricas.requisicao_atual.set(estado)
+    status = 500
+    try:
+        resposta = await call_next(request)
+        status = resposta.status_code
+        return resposta
+    finally:
+        # rótulo pelo molde da rota (/agregados/{tabela}), não pelo caminho, para não explodir a cardinalidade
+        rota = getattr(request.scope.get("route"), "path", "desconhecida")
+        metricas.latencia.observar(time.perf_counter() - inicio, metodo=request.method, rota=rota)
+        metricas.requisicoes.inc(metodo=request.method, rota=rota, status=status)
+        if status >= 500:
+            metricas.erros.inc(metodo=request.method, rota=rota)
+        if estado["linhas"]:
+            metricas.linhas_requisicao.inc(estado["linhas"], rota=rota)
+        metricas.observar_etapas(estado, rota)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def exporta_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
+
+
+def particionada(tabela):
+    return roteador is not None and tabela.name in shards.TABELAS
+
+
+async def gravar(tabela, linhas):
+    # devolve {shard: erro} dos arquivos que falharam num lote particionado (os demais gravaram)
+    falhas = {}
+    if particionada(tabela):
+        falhas = await roteador.gravar(tabela, linhas)
+    else:
+        async with engine_async.begin() as conn:
+            await conn.run_sync(escrita.gravar, tabela, linhas)
+    gravadas = [l for l in linhas if roteador.numero(l["usuario_id"]) not in falhas] if falhas else linhas
+    metricas.contar_linhas(len(gravadas))
+    if difusor:
+        difusor.avisar()
+    return falhas
+
+
+async def registrar_leitura(tabela, linha):
+    # leituras avulsas dos sensores: com o buffer ligado, entram no próximo group commit
+    alvo = roteador.buffer_de(linha["usuario_id"]) if particionada(tabela) else buffer
+    if alvo is None:
+        await gravar(tabela, [linha])
+        return {"status": "ok"}
+    try:
+        await alvo.enfileirar(tabela, linha)
+    except FilaCheia as err:
+        raise HTTPException(status_code=503, detail=str(err), headers={"Retry-After": "1"})
+    metricas.contar_linhas(1)
+    return {"status": "ok" if alvo.durabilidade == "flush" else "enfileirado"}
+
+
+async def inserir_lote(tabela, modelo, itens):
+    with metricas.etapa("validacao"):
+        linhas, resultados = models.validar_lote(modelo, itens)
+    falhas = {}
+    if linhas:
+        # uma única transação e um executemany para o lote inteiro (com shards, uma por arquivo)
+        falhas = await gravar(tabela, linhas)
+    if falhas:
+        # só parte dos arquivos gravou: as linhas dos outros saem como "falhou", para o
+        # cliente reenviar apenas elas
+        aceitas = iter(linhas)
+        for r in resultados:
+            if r["status"] == "aceito" and (n := roteador.numero(next(aceitas)["usuario_id"])) in falhas:
+                r.update(status="falhou", erro=falhas[n])
+    aceitos = sum(r["status"] == "aceito" for r in resultados)
+    return {
+        "status": "parcial" if falhas else "ok",
+        "aceitos": aceitos,
+        "rejeitados": len(resultados) - len(linhas),
+        "falhas": len(linhas) - aceitos,
+        "resultados": resultados,
+    }
+
+
+async def listar_consumo(request, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor, limite, stream, formato):
+    formatos.validar(formato)
+    inicio, fim = consultas.sem_fuso(inicio), consultas.sem_fuso(fim)
+    if stream and formato != "linhas":
+        # o stream é sempre NDJSON, uma linha por objeto
+        raise HTTPException(status_code=400, detail=f"stream=true só aceita formato=linhas (NDJSON), não {formato}")
+    try:
+        if cursor:
+            consultas.decodificar_cursor(cursor)
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    # as leituras antigas podem estar no arquivo Parquet: api.arquivo junta as duas partes
+    if stream:
+        # o corpo é enviado depois que o middleware já mediu: as linhas são contadas pelo próprio stream
+        contar = lambda n: metricas.linhas_requisicao.inc(n, rota=f"/{tabela.name}")
+        if particionada(tabela):
+            linhas = roteador.stream_consumo(tabela.name, coluna_filtro, valor_filtro, inicio, fim, cursor, contar)
+        else:
+            linhas = arquivo.stream_consumo(
+                engine_async, tabela.name, coluna_filtro, valor_filtro, inicio, fim, cursor, contar,
+            )
+        return StreamingResponse(linhas, media_type="application/x-ndjson")
+    if particionada(tabela):
+        # todas as residências: cada shard devolve a sua página e as páginas são intercaladas
+        pagina = await roteador.pagina_consumo(tabela.name, coluna_filtro, valor_filtro, inicio, fim, cursor, limite)
+    else:
+        async with engine_async.connect() as conn:
+            pagina = await conn.run_sync(
+                arquivo.pagina_consumo, tabela.name, coluna_filtro, valor_filtro, inicio, fim, cursor, limite
+            )
+    metricas.contar_linhas(len(pagina["dados"]))
+    colunas = consultas.selecionar_consumo(tabela).selected_columns
+    return formatos.responder(request, pagina, formato, metadados={"proximo_cursor": pagina["proximo_cursor"]},
+                              colunas=colunas)
 
 
 # === ENDPOINTS ÁGUA ===
 @app.post("/consumo_agua")
-def cria_consumo_agua(consumo: models.ConsumoAgua):
-    ins = consumo_agua.insert().values(**consumo.model_dump())
-    with engine.begin() as conn:
-        conn.execute(ins)
-    return {"status": "ok"}
+async def cria_consumo_agua(consumo: models.ConsumoAgua):
+    return await registrar_leitura(consumo_agua, consumo.model_dump())
+
+@app.post("/consumo_agua/lote")
+async def cria_consumo_agua_lote(consumos: list[Any]):
+    return await inserir_lote(consumo_agua, models.ConsumoAgua, consumos)
 
 @app.get("/consumo_agua")
-def lista_consumo_agua(atividade: str):
-    sel = consumo_agua.select()
-    if atividade:
-        sel = sel.where(consumo_agua.c.atividade == atividade)
-    with engine.connect() as conn:
-        rows = conn.execute(sel).fetchall()
-    return [dict(row) for row in rows]
+@cache_respostas.em_cache(fontes, *cache_respostas.dependencias("consumo_agua"))
+async def lista_consumo_agua(request: Request, atividade: str | None = None, inicio: datetime | None = None, fim: datetime | None = None,
+                       cursor: str | None = None,
+                       limite: int = Query(consultas.LIMITE_PADRAO, ge=1, le=consultas.LIMITE_MAXIMO),
+                       stream: bool = False, formato: str = "linhas"):
+    return await listar_consumo(request, consumo_agua, "atividade", atividade, inicio, fim, cursor, limite, stream, formato)
 
 # === ENDPOINTS ENERGIA ===
 @app.post("/consumo_energia")
-def cria_consumo_energia(consumo: models.ConsumoEnergia):
-    ins = consumo_energia.insert().values(**consumo.model_dump())
-    with engine.begin() as conn:
-        conn.execute(ins)
-    return {"status": "ok"}
+async def cria_consumo_energia(consumo: models.ConsumoEnergia):
+    return await registrar_leitura(consumo_energia, consumo.model_dump())
+
+@app.post("/consumo_energia/lote")
+async def cria_consumo_energia_lote(consumos: list[Any]):
+    return await inserir_lote(consumo_energia, models.ConsumoEnergia, consumos)
 
 @app.get("/consumo_energia")
-def lista_consumo_energia(equipamento: str):
-    sel = consumo_energia.select()
-    if equipamento:
-        sel = sel.where(consumo_energia.c.equipamento == equipamento)
-    with engine.connect() as conn:
-        rows = conn.execute(sel).fetchall()
-    return [dict(row) for row in rows]
+@cache_respostas.em_cache(fontes, *cache_respostas.dependencias("consumo_energia"))
+async def lista_consumo_energia(request: Request, equipamento: str | None = None, inicio: datetime | None = None, fim: datetime | None = None,
+                          cursor: str | None = None,
+                          limite: int = Query(consultas.LIMITE_PADRAO, ge=1, le=consultas.LIMITE_MAXIMO),
+                          stream: bool = False, formato: str = "linhas"):
+    return await listar_consumo(request, consumo_energia, "equipamento", equipamento, inicio, fim, cursor, limite, stream, formato)
 
 
 # === ENDPOINTS HIGIENE ===
 @app.post("/produto")
-def cria_consumo_higiene(consumo: models.Produto):
-    ins = produto_tbl.insert().values(**consumo.model_dump())
-    with engine.begin() as conn:
-        conn.execute(ins)
+async def cria_consumo_higiene(consumo: models.Produto):
+    await gravar(produto_tbl, [consumo.model_dump()])
     return {"status": "ok"}
 
 @app.post("/compra")
-def cria_compra(consumo: models.Compra):
-    ins = compra_tbl.insert().values(**consumo.model_dump())
-    with engine.begin() as conn:
-        conn.execute(ins)
+async def cria_compra(consumo: models.Compra):
+    await gravar(compra_tbl, [consumo.model_dump()])
     return {"status": "ok"}
 
+@app.post("/compra/lote")
+async def cria_compra_lote(compras: list[Any]):
+    # o carrinho inteiro numa transação: ou todas as compras entram, ou nenhuma
+    with metricas.etapa("validacao"):
+        linhas, resultados = models.validar_lote(models.Compra, compras)
+    if len(linhas) < len(resultados):
+        raise HTTPException(status_code=422, detail=[r for r in resultados if r["status"] == "rejeitado"])
+    await gravar(compra_tbl, linhas)
+    return {"status": "ok", "aceitos": len(linhas)}
+
 @app.post("/consumo_higiene")
-def cria_atividade(consumo: models.Atividade_gasto):
-    ins = atividade_tbl.insert().values(**consumo.model_dump())
-    with engine.begin() as conn:
-        conn.execute(ins)
-    return {"status": "ok"}
\ No newline at end of file
+async def cria_atividade(consumo: models.Atividade_gasto):
+    await gravar(atividade_tbl, [consumo.model_dump()])
+    return {"status": "ok"}
+
+
+# === ESTOQUE ===
+@app.get("/estoque")
+@cache_respostas.em_cache(fontes, "estoque", "produto", extra=lambda kw: [kw["ate"] or date.today()])
+async def lista_estoque(request: Request, ate: date | None = None):
+    async with engine_async.connect() as conn:
+        resultado = await conn.run_sync(estoque.listar, ate)
+    metricas.contar_linhas(len(resultado["produtos"]))
+    return formatos.responder(request, resultado)
+
+@app.get("/estoque/{produto_id}")
+async def detalha_estoque(produto_id: int, ate: date | None = None):
+    async with engine_async.connect() as conn:
+        resultado = await conn.run_sync(estoque.detalhar, produto_id, ate)
+    if resultado is None:
+        raise HTTPException(status_code=404, detail=f"Produto sem estoque: {produto_id}")
+    return resultado
+
+
+# === PREVISÕES ===
+@app.get("/previsoes")
+@cache_respostas.em_cache(fontes, "previsao")
+async def lista_previsoes(request: Request, tabela: str | None = None, usuario_id: int | None = None,
+                          formato: str = "linhas"):
+    formatos.validar(formato, ("linhas", "colunar"))
+    if tabela and tabela not in previsao.SERIES:
+        raise HTTPException(status_code=404, detail=f"Tabela sem previsão: {tabela}")
+    # só lê os modelos: quem os atualiza é manter_previsoes (ou python -m api.previsao)
+    df = await to_thread.run_sync(previsao.previsoes)
+    if roteador:
+        df = await roteador.previsoes(df)
+    if tabela:
+        df = df[df["tabela"] == tabela]
+    if usuario_id is not None:
+        df = df[df["usuario_id"] == usuario_id]
+    df["unidade"] = df["tabela"].map(lambda t: previsao.SERIES[t][1])
+    metricas.contar_linhas(len(df))
+    resposta = {"horizonte_dias": previsao.HORIZONTE_DIAS, "previsoes": df.astype(object).to_dict("records")}
+    return formatos.responder(request, resposta, formato, "previsoes")
+
+
+# === ALERTAS ===
+@app.get("/alertas")
+@cache_respostas.em_cache(fontes, "alerta", "atividade_tipo", "equipamento")
+async def lista_alertas(request: Request, tabela: str | None = None, usuario_id: int | None = None, desde: datetime | None = None,
+                        tipo: str | None = None, item: str | None = None,
+                        limite: int = Query(100, ge=1, le=consultas.LIMITE_MAXIMO), formato: str = "linhas"):
+    formatos.validar(formato, ("linhas", "colunar"))
+    if tabela and tabela not in anomalias.VALORES:
+        raise HTTPException(status_code=404, detail=f"Tabela sem detecção de anomalias: {tabela}")
+    if tipo and tipo not in anomalias.TIPOS:
+        raise HTTPException(status_code=400, detail=f"Tipo de alerta desconhecido: {tipo}")
+    desde = consultas.sem_fuso(desde)
+    if roteador:
+        # os alertas são das leituras, que ficam nos shards
+        alertas = await roteador.listar_alertas(tabela, usuario_id, desde, tipo, item, limite)
+    else:
+        async with engine_async.connect() as conn:
+            alertas = await conn.run_sync(anomalias.listar, tabela, usuario_id, desde, tipo, item, limite)
+    metricas.contar_linhas(len(alertas))
+    return formatos.responder(request, {"alertas": alertas}, formato, "alertas")
+
+
+# === EVENTOS AO VIVO ===
+@app.get("/eventos")
+async def transmite_eventos(request: Request, tabela: list[str] = Query([]),
+                            ultimo_evento: int | None = Header(None, alias="Last-Event-ID")):
+    # Server-Sent Events: "leituras" (linhas novas, com os nomes), "alerta" e "recarregar"
+    desconhecidas = set(tabela) - set(eventos.TABELAS)
+    if desconhecidas:
+        raise HTTPException(status_code=404, detail=f"Tabela sem eventos: {sorted(desconhecidas)}")
+    return StreamingResponse(
+        difusor.transmitir(request, tabela, ultimo_evento), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# === AGREGADOS ===
+@app.get("/agregados/{tabela}")
+@cache_respostas.em_cache(fontes, tabela_param="tabela")
+async def agrega_consumo(request: Request, tabela: str, granularidade: str = "dia", por: list[str] = Query([]),
+                   inicio: datetime | None = None, fim: datetime | None = None,
+                   filtro: list[str] = Query([], description="coluna:valor"),
+                   pontos: int | None = Query(None, ge=4, description="reduz a série para até N pontos"),
+                   largura: int | None = Query(None, ge=1, description="largura do gráfico em px (define os pontos)"),
+                   formato: str = Query("colunar", description="colunar (JSON) ou arrow")):
+    # os agregados já saem em colunas: o formato só escolhe entre JSON e Arrow
+    formatos.validar(formato, ("colunar", "arrow"))
+    if tabela not in agregados.AGREGAVEIS:
+        raise HTTPException(status_code=404, detail=f"Tabela desconhecida: {tabela}")
+    if any(":" not in f for f in filtro):
+        raise HTTPException(status_code=400, detail="Filtros devem estar no formato coluna:valor")
+    filtros = dict(f.split(":", 1) for f in filtro)
+    inicio, fim = consultas.sem_fuso(inicio), consultas.sem_fuso(fim)
+    if largura and not pontos:
+        pontos = amostragem.pontos_para_largura(largura)
+    try:
+        if roteador and tabela in shards.TABELAS:
+            # filtro usuario_id:N consulta só o shard da residência; sem ele, todos e a soma
+            resultado = await roteador.agregar(tabela, granularidade, por, inicio, fim, filtros, pontos)
+        else:
+            async with engine_async.connect() as conn:
+                resultado = await conn.run_sync(
+                    agregados.agregar, tabela, granularidade, por, inicio, fim, filtros, pontos
+                )
+    except ValueError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    metricas.contar_linhas(resultado["linhas"])
+    metadados = {"tabela": tabela, "granularidade": resultado["granularidade"]}
+    return formatos.responder(request, resultado, formato, metadados=metadados)
+
+
+# === IMPORTAÇÃO EM STREAMING ===
+@app.post("/importar/{tabela}")
+async def importa_dados(tabela: str, request: Request, formato: str = "ndjson", importacao_id: str | None = None,
+                        tamanho_chunk: int = Query(importacao.TAMANHO_CHUNK, ge=1)):
+    if tabela not in importacao.TABELAS:
+        raise HTTPException(status_code=404, detail=f"Tabela desconhecida: {tabela}")
+    if formato not in importacao.LEITORES:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {formato}")
+
+    corpo = request.stream().__aiter__()
+
+    def blocos():
+        # lê o corpo aos poucos a partir da thread que grava no banco
+        while True:
+            try:
+                yield from_thread.run(corpo.__anext__)
+            except StopAsyncIteration:
+                return
+
+    resumo = await to_thread.run_sync(
+        importacao.importar, engine, tabela, importacao.linhas_de_blocos(blocos()),
+        formato, importacao_id, tamanho_chunk, None, roteador,
+    )
+    metricas.contar_linhas(resumo["aceitos"])
+    return resumo
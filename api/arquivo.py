@@ -0,0 +1,324 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from api import config, consultas, db, dimensoes, snapshot, versoes
+from api.tables import arquivamento_tbl, consumo_agua, consumo_energia
+
+# Arquivamento das leituras antigas: o que é mais velho que o horizonte sai do banco
+# e vai para Parquet mensal comprimido (<ARQUIVO_DIR>/<tabela>/mes=AAAA-MM/, mesmo
+# formato dos snapshots). Os rollups continuam no banco, então os totais por dia e
+# por mês não mudam. As funções de leitura abaixo juntam banco e arquivo quando o
+# intervalo pedido cruza a fronteira.
+#
+# Cada lote é lido, gravado em Parquet e só então apagado do banco, numa transação
+# curta: as inserções concorrentes não esperam o arquivamento inteiro. Se o processo
+# cair no meio, a próxima execução retoma do mesmo corte; um lote gravado e não
+# apagado é regravado com o mesmo nome, e as leituras descartam as linhas repetidas.
+# Os ids das leituras são AUTOINCREMENT (migração 9): apagar as linhas mais novas não
+# faz o SQLite reusar os ids delas, então um id nunca aparece no banco e no arquivo
+# com leituras diferentes.
+
+ARQUIVAVEIS = {"consumo_agua": consumo_agua, "consumo_energia": consumo_energia}
+
+LINHAS_POR_LOTE = 50_000
+
+
+# === ESTADO ===
+def ler_estado(conn, tabela):
+    linha = conn.execute(select(arquivamento_tbl).where(arquivamento_tbl.c.tabela == tabela)).first()
+    if linha is None:
+        return {"arquivado_ate": None, "corte": None, "linhas": 0}
+    return {"arquivado_ate": linha.arquivado_ate, "corte": linha.corte, "linhas": linha.linhas}
+
+
+def salvar_estado(conn, tabela, estado):
+    ins = insert(arquivamento_tbl).values(tabela=tabela, **estado)
+    conn.execute(ins.on_conflict_do_update(index_elements=[arquivamento_tbl.c.tabela], set_=estado))
+
+
+def fronteira(conn, tabela):
+    # tudo o que pode estar no arquivo é anterior a esta data (None: nada arquivado)
+    estado = ler_estado(conn, tabela)
+    return max(filter(None, [estado["arquivado_ate"], estado["corte"]]), default=None)
+
+
+def corte_para(horizonte_dias, hoje=None):
+    # o corte cai sempre no início de um mês: as partições mensais ficam completas
+    limite = (hoje or datetime.now()) - timedelta(days=horizonte_dias)
+    return datetime(limite.year, limite.month, 1)
+
+
+# === ARQUIVAMENTO ===
+def arquivar(engine, tabela, horizonte_dias=None, linhas_por_lote=LINHAS_POR_LOTE, pasta=None, ao_progresso=None):
+    tbl = ARQUIVAVEIS[tabela]
+    pasta = pasta or config.ARQUIVO_DIR
+    with engine.begin() as conn:
+        estado = ler_estado(conn, tabela)
+        corte = estado["corte"] or corte_para(config.HORIZONTE_ARQUIVO_DIAS if horizonte_dias is None
+                                              else horizonte_dias)
+        if estado["arquivado_ate"] and corte <= estado["arquivado_ate"] and not estado["corte"]:
+            return 0, estado
+        estado["corte"] = corte
+        salvar_estado(conn, tabela, estado)
+
+    movidas = 0
+    while True:
+        # leitura fora da transação de escrita (WAL: não bloqueia quem insere); o Parquet
+        # guarda o nome da atividade/do equipamento, e não o id, para ser lido sem o banco
+        sel = dimensoes.selecionar(tabela, tbl).where(tbl.c.timestamp < corte).order_by(tbl.c.id).limit(linhas_por_lote)
+        with engine.connect() as conn:
+            df = pd.read_sql(sel, conn)
+        if df.empty:
+            break
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        snapshot.gravar_parte(df, tabela, "timestamp", pasta)
+
+        primeiro, ultimo = int(df["id"].min()), int(df["id"].max())
+        with engine.begin() as conn:
+            # os ids só crescem (AUTOINCREMENT): entre primeiro e último, com timestamp < corte,
+            # estão exatamente as linhas lidas
+            conn.execute(delete(tbl).where(tbl.c.id.between(primeiro, ultimo), tbl.c.timestamp < corte))
+            estado["linhas"] += len(df)
+            salvar_estado(conn, tabela, estado)
+            versoes.incrementar(conn, tabela)
+        movidas += len(df)
+        if ao_progresso:
+            ao_progresso(movidas)
+
+    with engine.begin() as conn:
+        estado.update(arquivado_ate=max(filter(None, [estado["arquivado_ate"], corte])), corte=None)
+        salvar_estado(conn, tabela, estado)
+    return movidas, estado
+
+
+# === LEITURA (banco + arquivo) ===
+def ler_consumo(conn, tabela, colunas=None, inicio=None, fim=None, filtros=None, pasta=None):
+    # DataFrame ordenado por (timestamp, id) com as leituras do banco e, se o intervalo
+    # começa antes da fronteira, as do arquivo
+    tbl = ARQUIVAVEIS[tabela]
+    colunas = list(dict.fromkeys(["id", "timestamp", *(colunas or dimensoes.colunas_publicas(tabela, tbl))]))
+    filtros = {c: v for c, v in (filtros or {}).items() if v is not None}
+
+    sel = dimensoes.selecionar(tabela, tbl, colunas)
+    if inicio is not None:
+        sel = sel.where(tbl.c.timestamp >= inicio)
+    if fim is not None:
+        sel = sel.where(tbl.c.timestamp < fim)
+    for coluna, valor in filtros.items():
+        sel = sel.where(dimensoes.filtro(tabela, tbl, coluna, valor))
+    quente = pd.read_sql(sel, conn)
+    quente["timestamp"] = pd.to_datetime(quente["timestamp"])
+
+    limite = fronteira(conn, tabela)
+    if limite is None or (inicio is not None and inicio >= limite):
+        return quente.sort_values(["timestamp", "id"], kind="stable").reset_index(drop=True)
+    fim_frio = min(fim, limite) if fim is not None else limite
+    frio = snapshot.ler_snapshot(tabela, colunas, inicio, fim_frio, filtros, pasta or config.ARQUIVO_DIR)
+    if frio.empty:
+        df = quente
+    elif quente.empty:
+        df = frio
+    else:
+        # um lote gravado no arquivo e ainda não apagado aparece nos dois lados, com a mesma
+        # leitura: a chave é o id junto com o usuário e o instante, não o id sozinho
+        chave = [c for c in ("id", "usuario_id", "timestamp") if c in colunas]
+        df = pd.concat([frio, quente], ignore_index=True).drop_duplicates(chave, keep="last")
+    return df.sort_values(["timestamp", "id"], kind="stable").reset_index(drop=True)
+
+
+def meses(inicio, fim):
+    # [(início, fim)] de cada mês que toca o intervalo
+    inicio = pd.Timestamp(inicio)
+    partidas = pd.date_range(inicio.to_period("M").to_timestamp(), fim, freq="MS", inclusive="left")
+    return [(max(p, inicio), min(p + pd.offsets.MonthBegin(1), pd.Timestamp(fim))) for p in partidas]
+
+
+def primeira_leitura(conn, tabela, pasta=None):
+    tbl = ARQUIVAVEIS[tabela]
+    candidatas = [conn.execute(select(func.min(tbl.c.timestamp))).scalar()]
+    caminho = snapshot.pasta_tabela(tabela, pasta or config.ARQUIVO_DIR)
+    if os.path.exists(caminho):
+        particoes = sorted(n[4:] for n in os.listdir(caminho) if n.startswith("mes="))
+        if particoes:
+            candidatas.append(datetime.strptime(particoes[0], "%Y-%m"))
+    return min(filter(None, candidatas), default=None)
+
+
+def meses_arquivados(conn, tabela, inicio, fim, cursor=None, pasta=None):
+    # meses da parte anterior à fronteira que o intervalo (ou o cursor) ainda alcança
+    limite = fronteira(conn, tabela)
+    ultimo = consultas.decodificar_cursor(cursor) if cursor else None
+    desde = max(filter(None, [inicio, ultimo and ultimo[0]]), default=None) or primeira_leitura(conn, tabela, pasta)
+    if limite is None or desde is None or desde >= limite:
+        return []
+    return [(a.to_pydatetime(), b.to_pydatetime()) for a, b in meses(desde, min(fim, limite) if fim else limite)]
+
+
+def chave_ate(df, chave):
+    # linhas com (timestamp, id) <= chave
+    timestamp, id = chave
+    return df[(df["timestamp"] < timestamp) | ((df["timestamp"] == timestamp) & (df["id"] <= id))]
+
+
+def ler_arquivo(tabela, colunas, inicio, fim, filtros, cursor, limite, pasta=None):
+    # as primeiras `limite` linhas de um mês arquivado depois do cursor, em (timestamp, id):
+    # filtros e cursor vão para o scanner do Parquet e só as melhores ficam na memória
+    caminho = snapshot.pasta_tabela(tabela, pasta or config.ARQUIVO_DIR)
+    if not os.path.isdir(os.path.join(caminho, f"mes={inicio:%Y-%m}")):
+        return pd.DataFrame(columns=colunas)
+    tempo = ds.field("timestamp")
+    filtro = (ds.field("mes") == f"{inicio:%Y-%m}") & (tempo >= pd.Timestamp(inicio)) & (tempo < pd.Timestamp(fim))
+    for coluna, valor in filtros.items():
+        filtro &= ds.field(coluna) == valor
+    if cursor:
+        timestamp, id = consultas.decodificar_cursor(cursor)
+        filtro &= (tempo > pd.Timestamp(timestamp)) | ((tempo == pd.Timestamp(timestamp)) & (ds.field("id") > id))
+
+    ordem = [("timestamp", "ascending"), ("id", "ascending")]
+    melhores = None
+    for lote in ds.dataset(caminho, format="parquet", partitioning="hive").to_batches(columns=colunas, filter=filtro):
+        if not lote.num_rows:
+            continue
+        melhores = pa.Table.from_batches([lote]) if melhores is None else pa.concat_tables(
+            [melhores, pa.Table.from_batches([lote])])
+        if melhores.num_rows > limite:
+            melhores = melhores.sort_by(ordem).slice(0, limite)
+    if melhores is None:
+        return pd.DataFrame(columns=colunas)
+    return melhores.sort_by(ordem).to_pandas()
+
+
+def ler_mes(conn, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor=None, limite=consultas.LIMITE_MAXIMO,
+            pasta=None):
+    # página de um mês anterior à fronteira, com as mesmas colunas (e na mesma ordem) das
+    # páginas do banco. Devolve pelo menos limite + 1 linhas se o mês tiver mais que limite
+    # depois do cursor, e todas as que tiver se não tiver
+    tbl = ARQUIVAVEIS[tabela]
+    colunas = dimensoes.colunas_publicas(tabela, tbl)
+    filtros = {coluna_filtro: valor_filtro} if valor_filtro else {}
+    n = limite + 1
+    frio = ler_arquivo(tabela, colunas, inicio, fim, filtros, cursor, n, pasta)
+    # um lote arquivado e ainda não apagado (ou um arquivamento em andamento) deixa linhas
+    # do mês no banco: as mesmas n primeiras de lá, com as repetidas descartadas
+    sel = consultas.selecionar_consumo(tbl, coluna_filtro, valor_filtro, inicio, fim, cursor).limit(n)
+    quente = pd.read_sql(sel, conn)
+    quente["timestamp"] = pd.to_datetime(quente["timestamp"])
+    partes = [df for df in (frio, quente) if not df.empty]
+    if not partes:
+        return quente
+    df = pd.concat(partes, ignore_index=True).drop_duplicates(["id", "usuario_id", "timestamp"])
+    df = df.sort_values(["timestamp", "id"], kind="stable").reset_index(drop=True)[colunas]
+    # se um dos lados foi cortado em n, só é seguro devolver até a última chave dele:
+    # depois dela pode haver linhas que ele não trouxe
+    cortes = [(lado["timestamp"].iloc[-1], lado["id"].iloc[-1]) for lado in (frio, quente) if len(lado) >= n]
+    return chave_ate(df, min(cortes)) if cortes else df
+
+
+def selecionar_quente(conn, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor=None):
+    # parte posterior à fronteira, lida direto do banco com paginação por cursor
+    limite = fronteira(conn, tabela)
+    if limite is not None:
+        inicio = max(inicio, limite) if inicio else limite
+    return consultas.selecionar_consumo(ARQUIVAVEIS[tabela], coluna_filtro, valor_filtro, inicio, fim, cursor)
+
+
+def pagina_consumo(conn, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor, limite, pasta=None):
+    # mesma resposta de consultas.pagina_consumo, atravessando a fronteira quando preciso
+    linhas = []
+    for mes_inicio, mes_fim in meses_arquivados(conn, tabela, inicio, fim, cursor, pasta):
+        df = ler_mes(conn, tabela, coluna_filtro, valor_filtro, mes_inicio, mes_fim, cursor, limite - len(linhas),
+                     pasta)
+        linhas.extend(df.to_dict("records"))
+        if len(linhas) > limite:
+            break
+    if len(linhas) <= limite:
+        sel = selecionar_quente(conn, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor)
+        linhas.extend(dict(row._mapping) for row in conn.execute(sel.limit(limite + 1 - len(linhas))))
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = consultas.codificar_cursor(linhas[-1]["timestamp"], linhas[-1]["id"])
+    return {"dados": linhas, "proximo_cursor": proximo}
+
+
+async def stream_consumo(engine_async, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor=None,
+                         ao_terminar=None):
+    # NDJSON: primeiro os meses arquivados (um por vez), depois o stream normal do banco
+    enviadas = 0
+    async with engine_async.connect() as conn:
+        for mes_inicio, mes_fim in await conn.run_sync(meses_arquivados, tabela, inicio, fim, cursor):
+            # cada mês em páginas, para não ter o mês inteiro na memória
+            cursor_mes = cursor
+            while True:
+                df = await conn.run_sync(ler_mes, tabela, coluna_filtro, valor_filtro, mes_inicio, mes_fim,
+                                         cursor_mes, consultas.LIMITE_MAXIMO)
+                for linha in df.to_dict("records"):
+                    enviadas += 1
+                    yield json.dumps(linha, default=consultas.para_json) + "\n"
+                if len(df) <= consultas.LIMITE_MAXIMO:
+                    break
+                cursor_mes = consultas.codificar_cursor(df["timestamp"].iloc[-1], int(df["id"].iloc[-1]))
+        sel = await conn.run_sync(selecionar_quente, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor)
+
+    contar = (lambda n: ao_terminar(enviadas + n)) if ao_terminar else None
+    async for linha in consultas.stream_consumo(engine_async, sel, contar):
+        yield linha
+
+
+def bancos_a_arquivar(db_path=None, pasta=None):
+    # [(banco, pasta do arquivo)]: com o particionamento ligado, cada shard na sua pasta
+    if db_path:
+        return [(os.path.abspath(db_path), pasta or config.ARQUIVO_DIR)]
+    if config.SHARDS:
+        from api import shards  # import local: api.shards importa este módulo
+
+        return [(shards.caminho(n), shards.pasta_arquivo(n, pasta)) for n in range(config.SHARDS)]
+    return [(config.DB_PATH, pasta or config.ARQUIVO_DIR)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move leituras antigas para o arquivo Parquet mensal")
+    parser.add_argument("tabelas", nargs="*", help=f"uma ou mais de {sorted(ARQUIVAVEIS)} (padrão: todas)")
+    parser.add_argument("--db", help="banco a arquivar (padrão: o banco único, ou cada shard com CONSUMO_SHARDS)")
+    parser.add_argument("--pasta", help="pasta do arquivo (padrão: CONSUMO_ARQUIVO_DIR, com uma subpasta por shard)")
+    parser.add_argument("--horizonte", type=int, default=config.HORIZONTE_ARQUIVO_DIAS,
+                        help="dias mantidos no banco (o corte é arredondado para o início do mês)")
+    parser.add_argument("--lote", type=int, default=LINHAS_POR_LOTE)
+    parser.add_argument("--vacuum", action="store_true", help="devolve o espaço livre ao disco no fim (bloqueia)")
+    args = parser.parse_args()
+    for tabela in args.tabelas:
+        if tabela not in ARQUIVAVEIS:
+            parser.error(f"tabela não arquivável: {tabela}")
+
+    for caminho, pasta in bancos_a_arquivar(args.db, args.pasta):
+        engine = db.criar_engine(caminho)
+        for tabela in args.tabelas or sorted(ARQUIVAVEIS):
+            inicio = time.perf_counter()
+            movidas, estado = arquivar(engine, tabela, args.horizonte, args.lote, pasta,
+                                       lambda n: print(f"   {tabela}: {n} linhas movidas"))
+            print(f"✅ {os.path.basename(caminho)} {tabela}: {movidas} linhas arquivadas "
+                  f"({time.perf_counter() - inicio:.1f}s), banco a partir de {estado['arquivado_ate']}, "
+                  f"{estado['linhas']} linhas no arquivo")
+        if args.vacuum:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            print(f"✅ VACUUM concluído em {os.path.basename(caminho)}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from collections import defaultdict
+
+from api import escrita, metricas
+
+log = logging.getLogger(__name__)
+
+
+class FilaCheia(Exception):
+    pass
+
+
+class BufferEscrita:
+    # Junta as leituras recebidas em uma fila e grava tudo em uma transação
+    # a cada max_linhas ou intervalo_ms, o que acontecer primeiro.
+
+    def __init__(self, engine_async, max_linhas=500, intervalo_ms=200, capacidade=10000,
+                 durabilidade="flush", timeout_fila=1.0):
+        if durabilidade not in ("flush", "fila"):
+            raise ValueError(f"Durabilidade inválida: {durabilidade}")
+        self.engine_async = engine_async
+        self.max_linhas = max_linhas
+        self.intervalo = intervalo_ms / 1000
+        self.durabilidade = durabilidade
+        self.timeout_fila = timeout_fila
+        self.fila = asyncio.Queue(maxsize=capacidade)
+        self.tarefa = None
+        self.encerrando = False
+        self.gravadas = 0
+        self.falhas = 0
+
+    def iniciar(self):
+        self.tarefa = asyncio.create_task(self.processar())
+
+    async def enfileirar(self, tabela, linha):
+        if self.encerrando:
+            raise FilaCheia("Buffer encerrando")
+        futuro = asyncio.get_running_loop().create_future() if self.durabilidade == "flush" else None
+        try:
+            # backpressure: espera um pouco por espaço na fila e depois desiste
+            await asyncio.wait_for(self.fila.put((tabela, linha, futuro)), self.timeout_fila)
+        except asyncio.TimeoutError:
+            raise FilaCheia("Fila de escrita cheia")
+        if futuro is not None:
+            await futuro
+
+    async def encerrar(self):
+        # None marca o fim: tudo que entrou antes dele ainda é gravado
+        self.encerrando = True
+        await self.fila.put(None)
+        await self.tarefa
+
+    async def processar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.fila.get()
+            if item is None:
+                return
+            lote = [item]
+            prazo = loop.time() + self.intervalo
+            fim = False
+            while len(lote) < self.max_linhas:
+                restante = prazo - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    fim = True
+                    break
+                lote.append(item)
+            await self.gravar(lote)
+            if fim:
+                return
+
+    async def gravar(self, lote):
+        por_tabela = defaultdict(list)
+        for tabela, linha, _ in lote:
+            por_tabela[tabela].append(linha)
+        try:
+            async with self.engine_async.begin() as conn:
+                for tabela, linhas in por_tabela.items():
+                    await conn.run_sync(escrita.gravar, tabela, linhas)
+        except Exception:
+            # se o lote falhar, grava uma a uma para isolar a linha com problema
+            for item in lote:
+                await self.gravar_individual(*item)
+            return
+        self.gravadas += len(lote)
+        for _, _, futuro in lote:
+            if futuro is not None and not futuro.done():
+                futuro.set_result(None)
+
+    async def gravar_individual(self, tabela, linha, futuro):
+        try:
+            async with self.engine_async.begin() as conn:
+                await conn.run_sync(escrita.gravar, tabela, [linha])
+        except Exception as err:
+            self.falhas += 1
+            metricas.falhas_buffer.inc(tabela=tabela.name, durabilidade=self.durabilidade)
+            if futuro is not None and not futuro.done():
+                futuro.set_exception(err)
+            else:
+                # no modo "fila" o cliente já recebeu a resposta: a leitura fica no log para ser reenviada
+                log.error("Leitura do buffer descartada em %s: %s | %s", tabela.name, err, linha)
+            return
+        self.gravadas += 1
+        if futuro is not None and not futuro.done():
+            futuro.set_result(None)
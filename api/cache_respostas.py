@@ -0,0 +1,167 @@
+import functools
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from fastapi.responses import Response
+
+from api import config, dimensoes, formatos, metricas
+from api.versoes import ler_versoes
+
+# GET condicional e cache de respostas dos endpoints de leitura. A versão de cada
+# tabela (versao_tabela, incrementada na mesma transação de toda escrita) mais o
+# caminho e os parâmetros da requisição formam o ETag: se o cliente manda o mesmo em
+# If-None-Match, a resposta é 304 sem ler dado nenhum. As respostas completas ficam
+# num LRU limitado em itens e em bytes, com a chave no mesmo ETag (e na compressão
+# negociada), então uma escrita invalida tudo que dependia da tabela sem varredura.
+# A versão é lida antes dos dados: o corpo guardado é no mínimo tão novo quanto o ETag.
+# Com shards (api.shards), a versão de uma tabela é a soma das versões em cada arquivo.
+
+CABECALHOS_IGNORADOS = {"content-length"}
+
+
+def dependencias(tabela):
+    # a tabela e a dimensão de onde vêm os nomes (atividade/equipamento)
+    if tabela in dimensoes.DIMENSOES:
+        return [tabela, dimensoes.DIMENSOES[tabela][1].name]
+    return [tabela]
+
+
+class CacheRespostas:
+    def __init__(self, engines_async, max_itens=None, max_bytes=None):
+        self.engines_async = list(engines_async)
+        self.max_itens = max_itens or config.CACHE_RESPOSTAS_ITENS
+        self.max_bytes = max_bytes or config.CACHE_RESPOSTAS_MB * 1024 * 1024
+        self.itens = OrderedDict()
+        self.bytes = 0
+        self.trava = threading.Lock()
+        # como na UI: PRAGMA data_version só muda quando outra conexão faz commit, e só
+        # então versao_tabela é relida
+        self.sentinelas = [sqlite3.connect(e.url.database, check_same_thread=False) for e in self.engines_async]
+        self.data_versions = [None] * len(self.sentinelas)
+        self.versoes_por_banco = [{} for _ in self.sentinelas]
+        self.versoes_lidas = {}
+
+    async def versoes(self):
+        mudou = False
+        for i, sentinela in enumerate(self.sentinelas):
+            data_version = sentinela.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self.data_versions[i]:
+                async with self.engines_async[i].connect() as conn:
+                    self.versoes_por_banco[i] = await conn.run_sync(ler_versoes)
+                self.data_versions[i] = data_version
+                mudou = True
+        if mudou:
+            # as versões só crescem: a soma muda sempre que alguma muda
+            versoes = {}
+            for lidas in self.versoes_por_banco:
+                for tabela, versao in lidas.items():
+                    versoes[tabela] = versoes.get(tabela, 0) + versao
+            self.versoes_lidas = versoes
+        return self.versoes_lidas
+
+    def etag(self, request, tabelas, versoes, extra=()):
+        versao = [(t, versoes.get(t, 0)) for t in tabelas]
+        parametros = sorted(request.query_params.multi_items())
+        chave = repr((request.url.path, parametros, versao, tuple(extra)))
+        # fraco: o mesmo conteúdo sai com ou sem compressão
+        return f'W/"{hashlib.sha1(chave.encode()).hexdigest()[:24]}"'
+
+    def obter(self, chave):
+        with self.trava:
+            item = self.itens.get(chave)
+            if item:
+                self.itens.move_to_end(chave)
+            return item
+
+    def guardar(self, chave, corpo, cabecalhos):
+        if len(corpo) > self.max_bytes // 4:
+            # uma resposta enorme tiraria o resto do cache
+            return
+        with self.trava:
+            anterior = self.itens.pop(chave, None)
+            if anterior:
+                self.bytes -= len(anterior[0])
+            self.itens[chave] = (corpo, cabecalhos)
+            self.bytes += len(corpo)
+            while len(self.itens) > self.max_itens or self.bytes > self.max_bytes:
+                _, (descartado, _) = self.itens.popitem(last=False)
+                self.bytes -= len(descartado)
+
+    def limpar(self):
+        with self.trava:
+            self.itens.clear()
+            self.bytes = 0
+
+    def fechar(self):
+        for sentinela in self.sentinelas:
+            sentinela.close()
+
+
+caches = {}
+
+
+def cache_de(engines_async):
+    chave = tuple(engines_async)
+    if chave not in caches:
+        caches[chave] = CacheRespostas(chave)
+    return caches[chave]
+
+
+def fechar_caches():
+    for cache in caches.values():
+        cache.fechar()
+    caches.clear()
+
+
+def nao_modificado(etag, if_none_match):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # comparação fraca: W/"x" e "x" são o mesmo
+    candidatos = {c.strip().removeprefix("W/") for c in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidatos
+
+
+def em_cache(engines_async, *tabelas, tabela_param=None, extra=None):
+    # decora um endpoint de leitura que recebe request. engines_async: os bancos de onde a
+    # resposta pode vir (o central e os shards); tabelas: nomes fixos de que a resposta
+    # depende; tabela_param: argumento com o nome da tabela (ex.: /agregados/{tabela});
+    # extra(kwargs): o que mais muda a resposta sem mudar versão nem parâmetros (ex.: a data de hoje)
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        async def envolvida(**kwargs):
+            if kwargs.get("stream"):
+                # NDJSON em streaming não é guardado
+                return await funcao(**kwargs)
+            cache = cache_de(engines_async)
+            request = kwargs["request"]
+            dependentes = list(tabelas)
+            if tabela_param:
+                dependentes.extend(dependencias(kwargs[tabela_param]))
+            rota = getattr(request.scope.get("route"), "path", request.url.path)
+            etag = cache.etag(request, dependentes, await cache.versoes(), extra(kwargs) if extra else ())
+            cabecalhos = {"ETag": etag, "Vary": "Accept-Encoding"}
+            if nao_modificado(etag, request.headers.get("if-none-match")):
+                metricas.cache_respostas.inc(rota=rota, resultado="nao_modificado")
+                return Response(status_code=304, headers=cabecalhos)
+            chave = (etag, formatos.escolher_codificacao(request.headers.get("accept-encoding")))
+            item = cache.obter(chave)
+            if item:
+                metricas.cache_respostas.inc(rota=rota, resultado="acerto")
+                return Response(item[0], headers=item[1])
+            metricas.cache_respostas.inc(rota=rota, resultado="falha")
+            resposta = await funcao(**kwargs)
+            if type(resposta) is not Response or resposta.status_code != 200:
+                # respostas que não vêm de formatos.responder passam direto
+                return resposta
+            resposta.headers.update(cabecalhos)
+            cache.guardar(chave, resposta.body, {k: v for k, v in resposta.headers.items()
+                                                 if k not in CABECALHOS_IGNORADOS})
+            return resposta
+
+        return envolvida
+
+    return decorador
@@ -0,0 +1,98 @@
+import os
+
+# Configurações lidas do ambiente, com padrões para rodar localmente
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DB_PATH = os.path.abspath(os.environ.get("CONSUMO_DB", os.path.join(BASE_DIR, "consumo.db")))
+
+# SQLite
+JOURNAL_MODE = os.environ.get("CONSUMO_JOURNAL_MODE", "WAL")
+SYNCHRONOUS = os.environ.get("CONSUMO_SYNCHRONOUS", "NORMAL")
+BUSY_TIMEOUT_MS = int(os.environ.get("CONSUMO_BUSY_TIMEOUT_MS", 5000))
+
+# pool de conexões
+POOL_TAMANHO = int(os.environ.get("CONSUMO_POOL_TAMANHO", 5))
+POOL_EXTRA = int(os.environ.get("CONSUMO_POOL_EXTRA", 10))
+POOL_TIMEOUT = float(os.environ.get("CONSUMO_POOL_TIMEOUT", 30))
+POOL_RECICLAR = int(os.environ.get("CONSUMO_POOL_RECICLAR", 3600))
+
+# escrita: "direto" (um commit por requisição) ou "buffer" (group commit em segundo plano)
+MODO_ESCRITA = os.environ.get("CONSUMO_MODO_ESCRITA", "direto")
+BUFFER_MAX_LINHAS = int(os.environ.get("CONSUMO_BUFFER_MAX_LINHAS", 500))
+BUFFER_INTERVALO_MS = int(os.environ.get("CONSUMO_BUFFER_INTERVALO_MS", 200))
+BUFFER_CAPACIDADE = int(os.environ.get("CONSUMO_BUFFER_CAPACIDADE", 10000))
+# "flush": responde depois do commit; "fila": responde assim que a leitura entra na fila
+BUFFER_DURABILIDADE = os.environ.get("CONSUMO_BUFFER_DURABILIDADE", "flush")
+BUFFER_TIMEOUT_FILA_S = float(os.environ.get("CONSUMO_BUFFER_TIMEOUT_FILA_S", 1.0))
+
+# snapshots colunares (Parquet) para leitura analítica
+SNAPSHOT_DIR = os.path.abspath(os.environ.get("CONSUMO_SNAPSHOT_DIR", os.path.join(BASE_DIR, "snapshots")))
+# fonte dos dados brutos nos dashboards: "sqlite" ou "parquet"
+FONTE_UI = os.environ.get("CONSUMO_FONTE_UI", "sqlite")
+
+# métricas: comandos SQL acima deste tempo vão para o log de consultas lentas (0 desliga)
+LIMITE_CONSULTA_LENTA_MS = float(os.environ.get("CONSUMO_LIMITE_CONSULTA_LENTA_MS", 0))
+
+# gráficos de séries temporais: largura assumida (px) para o orçamento de pontos da redução
+LARGURA_GRAFICO_PX = int(os.environ.get("CONSUMO_LARGURA_GRAFICO_PX", 1200))
+
+# arquivamento: leituras mais antigas que o horizonte vão para Parquet mensal comprimido
+ARQUIVO_DIR = os.path.abspath(os.environ.get("CONSUMO_ARQUIVO_DIR", os.path.join(BASE_DIR, "arquivo")))
+HORIZONTE_ARQUIVO_DIAS = int(os.environ.get("CONSUMO_HORIZONTE_ARQUIVO_DIAS", 365))
+
+# previsão: modelos por série, atualizados incrementalmente
+MODELOS_DIR = os.path.abspath(os.environ.get("CONSUMO_MODELOS_DIR", os.path.join(BASE_DIR, "modelos")))
+# intervalo da tarefa da API que atualiza os modelos (0 desliga: python -m api.previsao, ex.: no cron)
+PREVISAO_INTERVALO_S = float(os.environ.get("CONSUMO_PREVISAO_INTERVALO_S", 300))
+
+# importação paralela: processos que fazem parse e validação das fatias do arquivo
+IMPORTACAO_PROCESSOS = int(os.environ.get("CONSUMO_IMPORTACAO_PROCESSOS", os.cpu_count() or 1))
+
+# cliente HTTP da UI de inserção
+API_URL = os.environ.get("CONSUMO_API_URL", "http://127.0.0.1:8000")
+CLIENTE_TIMEOUT_CONEXAO_S = float(os.environ.get("CONSUMO_CLIENTE_TIMEOUT_CONEXAO_S", 3))
+CLIENTE_TIMEOUT_LEITURA_S = float(os.environ.get("CONSUMO_CLIENTE_TIMEOUT_LEITURA_S", 30))
+CLIENTE_TENTATIVAS = int(os.environ.get("CONSUMO_CLIENTE_TENTATIVAS", 3))
+# intervalo mínimo entre os reenvios automáticos da caixa de saída feitos pela UI
+CLIENTE_REENVIO_S = float(os.environ.get("CONSUMO_CLIENTE_REENVIO_S", 60))
+# escritas feitas com a API fora do ar ficam aqui até serem reenviadas
+CAIXA_SAIDA_PATH = os.path.abspath(os.environ.get("CONSUMO_CAIXA_SAIDA", os.path.join(BASE_DIR, "caixa_saida.db")))
+
+# detecção de anomalias: peso da EWMA, escore z de uma leitura e CUSUM de várias que
+# disparam alerta, leituras antes de alertar e horas (0-23) em que consumo de água
+# anômalo conta como vazamento
+ANOMALIA_ALFA = float(os.environ.get("CONSUMO_ANOMALIA_ALFA", 0.05))
+ANOMALIA_LIMIAR = float(os.environ.get("CONSUMO_ANOMALIA_LIMIAR", 4.0))
+ANOMALIA_LIMIAR_NIVEL = float(os.environ.get("CONSUMO_ANOMALIA_LIMIAR_NIVEL", 6.0))
+ANOMALIA_AQUECIMENTO = int(os.environ.get("CONSUMO_ANOMALIA_AQUECIMENTO", 20))
+ANOMALIA_HORAS_NOITE = {int(h) for h in os.environ.get("CONSUMO_ANOMALIA_HORAS_NOITE", "0,1,2,3,4,5").split(",")}
+
+# eventos ao vivo (/eventos, Server-Sent Events): intervalo da vigia do banco, eventos
+# guardados para reconexão, linhas por evento (acima disso o cliente relê do banco),
+# eventos na fila de cada assinante, keep-alive e espera sugerida para reconectar
+EVENTOS_INTERVALO_MS = int(os.environ.get("CONSUMO_EVENTOS_INTERVALO_MS", 500))
+EVENTOS_HISTORICO = int(os.environ.get("CONSUMO_EVENTOS_HISTORICO", 1000))
+EVENTOS_MAX_LINHAS = int(os.environ.get("CONSUMO_EVENTOS_MAX_LINHAS", 2000))
+EVENTOS_FILA = int(os.environ.get("CONSUMO_EVENTOS_FILA", 256))
+EVENTOS_KEEPALIVE_S = float(os.environ.get("CONSUMO_EVENTOS_KEEPALIVE_S", 15))
+EVENTOS_RETRY_MS = int(os.environ.get("CONSUMO_EVENTOS_RETRY_MS", 3000))
+# dashboards no modo ao vivo: de quanto em quanto tempo o painel aplica os eventos recebidos
+UI_AO_VIVO_S = float(os.environ.get("CONSUMO_UI_AO_VIVO_S", 2))
+
+# respostas de leitura: corpos a partir deste tamanho são comprimidos (br se o pacote
+# brotli estiver instalado e o cliente aceitar, senão gzip) e os níveis de cada um
+COMPRESSAO_MIN_BYTES = int(os.environ.get("CONSUMO_COMPRESSAO_MIN_BYTES", 1024))
+COMPRESSAO_NIVEL_GZIP = int(os.environ.get("CONSUMO_COMPRESSAO_NIVEL_GZIP", 5))
+COMPRESSAO_NIVEL_BR = int(os.environ.get("CONSUMO_COMPRESSAO_NIVEL_BR", 4))
+
+# cache de respostas da API (GET condicional com ETag): respostas guardadas e tamanho máximo
+CACHE_RESPOSTAS_ITENS = int(os.environ.get("CONSUMO_CACHE_RESPOSTAS_ITENS", 256))
+CACHE_RESPOSTAS_MB = int(os.environ.get("CONSUMO_CACHE_RESPOSTAS_MB", 64))
+
+# particionamento por residência (api/shards.py): 0 desliga; N > 0 guarda as leituras de
+# água e energia em N arquivos na pasta, pelo usuario_id % N. Só a API (e a importação)
+# passa pelo roteador: a UI lê o banco direto, então com N > 0 os dashboards de água e
+# energia ficam desligados (a inserção e o dashboard de produtos continuam). O arquivo
+# Parquet de cada shard fica em <CONSUMO_ARQUIVO_DIR>/shard_NNN.
+SHARDS = int(os.environ.get("CONSUMO_SHARDS", 0))
+SHARDS_DIR = os.path.abspath(os.environ.get("CONSUMO_SHARDS_DIR", os.path.join(BASE_DIR, "shards")))
@@ -0,0 +1,78 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import tuple_
+
+from api import dimensoes
+
+
+LIMITE_PADRAO = 1000
+LIMITE_MAXIMO = 10000
+LINHAS_POR_LOTE = 1000
+
+
+def sem_fuso(instante):
+    # as leituras são gravadas sem fuso (UTC): um filtro com fuso vira UTC sem fuso, senão
+    # não dá para compará-lo com as datas do banco e do arquivo
+    if instante is None or instante.tzinfo is None:
+        return instante
+    return instante.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# === CURSOR ===
+# o cursor guarda a última chave (timestamp, id) devolvida, codificada em base64
+def codificar_cursor(timestamp, id):
+    bruto = json.dumps([timestamp.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(bruto).decode()
+
+
+def decodificar_cursor(cursor):
+    try:
+        timestamp, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sem_fuso(datetime.fromisoformat(timestamp)), int(id)
+    except (ValueError, TypeError):
+        raise ValueError("Cursor inválido")
+
+
+# === CONSULTAS ===
+def selecionar_consumo(tabela, coluna_filtro=None, valor_filtro=None, inicio=None, fim=None, cursor=None):
+    # a atividade/o equipamento saem pelo nome, como foram enviados
+    sel = dimensoes.selecionar(tabela.name, tabela)
+    if valor_filtro:
+        sel = sel.where(dimensoes.filtro(tabela.name, tabela, coluna_filtro, valor_filtro))
+    if inicio:
+        sel = sel.where(tabela.c.timestamp >= inicio)
+    if fim:
+        sel = sel.where(tabela.c.timestamp < fim)
+    if cursor:
+        sel = sel.where(tuple_(tabela.c.timestamp, tabela.c.id) > decodificar_cursor(cursor))
+    return sel.order_by(tabela.c.timestamp, tabela.c.id)
+
+
+def pagina_consumo(conn, sel, limite):
+    # busca uma linha a mais só para saber se existe próxima página
+    linhas = [dict(row._mapping) for row in conn.execute(sel.limit(limite + 1))]
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = codificar_cursor(linhas[-1]["timestamp"], linhas[-1]["id"])
+    return {"dados": linhas, "proximo_cursor": proximo}
+
+
+def para_json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+async def stream_consumo(engine_async, sel, ao_terminar=None):
+    # as linhas saem em NDJSON conforme são lidas do cursor, sem materializar o resultado
+    enviadas = 0
+    async with engine_async.connect() as conn:
+        resultado = await conn.stream(sel.execution_options(yield_per=LINHAS_POR_LOTE))
+        async for row in resultado:
+            enviadas += 1
+            yield json.dumps(dict(row._mapping), default=para_json) + "\n"
+    if ao_terminar:
+        ao_terminar(enviadas)
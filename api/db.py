@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, event
+
+from api import config, metricas
+
+
+def configurar_sqlite(dbapi_conn, _):
+    # vale para toda conexão nova do pool, síncrona ou assíncrona
+    cursor = dbapi_conn.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config.JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={config.BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def opcoes_pool():
+    return {
+        "pool_size": config.POOL_TAMANHO,
+        "max_overflow": config.POOL_EXTRA,
+        "pool_timeout": config.POOL_TIMEOUT,
+        "pool_recycle": config.POOL_RECICLAR,
+    }
+
+
+def criar_engine(caminho=None):
+    engine = create_engine(
+        f"sqlite:///{caminho or config.DB_PATH}", poolclass=metricas.PoolMedido, **opcoes_pool()
+    )
+    event.listen(engine, "connect", configurar_sqlite)
+    metricas.instrumentar_engine(engine)
+    return engine
+
+
+def criar_engine_async(caminho=None):
+    # import local: só a API precisa do stack assíncrono (greenlet + aiosqlite)
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{caminho or config.DB_PATH}", poolclass=metricas.PoolMedidoAsync, **opcoes_pool()
+    )
+    event.listen(engine.sync_engine, "connect", configurar_sqlite)
+    metricas.instrumentar_engine(engine.sync_engine)
+    return engine
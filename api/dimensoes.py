@@ -0,0 +1,102 @@
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from api import versoes
+from api.tables import atividade_tipo_tbl, equipamento_tbl
+
+# As leituras guardam a atividade/o equipamento como id de uma tabela de dimensão.
+# Para quem usa a API nada muda: as escritas chegam com o nome, que é resolvido aqui
+# (com cache em memória), e as leituras devolvem o nome de novo com um join.
+
+# tabela de leituras -> (coluna com o nome, tabela de dimensão, coluna com o id)
+DIMENSOES = {
+    "consumo_agua": ("atividade", atividade_tipo_tbl, "atividade_id"),
+    "consumo_energia": ("equipamento", equipamento_tbl, "equipamento_id"),
+}
+
+# (banco, dimensão) -> {nome: id}; ids nunca mudam, então o cache só cresce
+ids_em_cache = {}
+trava = threading.Lock()
+
+
+def mapa_ids(conn, dimensao, recarregar=False):
+    chave = (conn.engine.url.database, dimensao.name)
+    with trava:
+        ids = None if recarregar else ids_em_cache.get(chave)
+    if ids is None:
+        # a consulta fica fora da trava: no engine assíncrono ela devolve o controle ao event
+        # loop, e outra escrita (em outro shard, por exemplo) chegaria aqui com a trava presa
+        ids = dict(conn.execute(select(dimensao.c.nome, dimensao.c.id)).all())
+        with trava:
+            ids_em_cache[chave] = ids
+    return ids
+
+
+def resolver(conn, tabela, linhas):
+    # troca o nome pelo id em cada linha (sem alterar as originais); nomes novos são
+    # cadastrados na mesma transação da escrita
+    if tabela not in DIMENSOES:
+        return linhas
+    nome, dimensao, coluna_id = DIMENSOES[tabela]
+    ids = mapa_ids(conn, dimensao)
+    faltando = {linha[nome] for linha in linhas} - ids.keys()
+    if faltando:
+        ids = mapa_ids(conn, dimensao, recarregar=True)
+        faltando -= ids.keys()
+    if faltando:
+        conn.execute(insert(dimensao).on_conflict_do_nothing(), [{"nome": n} for n in sorted(faltando)])
+        novos = dict(conn.execute(select(dimensao.c.nome, dimensao.c.id).where(dimensao.c.nome.in_(faltando))).all())
+        # os ids novos ficam fora do cache até o commit: se a transação voltar, eles não existem
+        ids = {**ids, **novos}
+        versoes.incrementar(conn, dimensao.name)
+    resolvidas = []
+    for linha in linhas:
+        linha = dict(linha)
+        linha[coluna_id] = ids[linha.pop(nome)]
+        resolvidas.append(linha)
+    return resolvidas
+
+
+# === LEITURA ===
+def coluna(tabela, fonte, nome_coluna):
+    # coluna pelo nome público: a da dimensão vira o nome vindo do join
+    if tabela in DIMENSOES and nome_coluna == DIMENSOES[tabela][0]:
+        return DIMENSOES[tabela][1].c.nome.label(nome_coluna)
+    return fonte.c[nome_coluna]
+
+
+def colunas_publicas(tabela, fonte):
+    # colunas da tabela (leituras ou rollup) com o id da dimensão trocado pelo nome
+    if tabela not in DIMENSOES:
+        return list(fonte.c.keys())
+    nome, _, coluna_id = DIMENSOES[tabela]
+    return [nome if c == coluna_id else c for c in fonte.c.keys()]
+
+
+def juntar(tabela, fonte, colunas):
+    # fonte com o join na dimensão, só quando o nome está entre as colunas pedidas
+    if tabela not in DIMENSOES or DIMENSOES[tabela][0] not in colunas:
+        return fonte
+    _, dimensao, coluna_id = DIMENSOES[tabela]
+    return fonte.join(dimensao, fonte.c[coluna_id] == dimensao.c.id)
+
+
+def selecionar(tabela, fonte, colunas=None):
+    # select das colunas públicas (atividade/equipamento pelo nome)
+    colunas = colunas or colunas_publicas(tabela, fonte)
+    return select(*[coluna(tabela, fonte, c) for c in colunas]).select_from(juntar(tabela, fonte, colunas))
+
+
+def filtro(tabela, fonte, nome_coluna, valor):
+    # filtro pelo nome sem join: compara o id com uma subconsulta (usa os índices por id)
+    if tabela in DIMENSOES and nome_coluna == DIMENSOES[tabela][0]:
+        _, dimensao, coluna_id = DIMENSOES[tabela]
+        return fonte.c[coluna_id] == select(dimensao.c.id).where(dimensao.c.nome == valor).scalar_subquery()
+    return fonte.c[nome_coluna] == valor
+
+
+def nomes_por_id(conn, tabela):
+    _, dimensao, _ = DIMENSOES[tabela]
+    return dict(conn.execute(select(dimensao.c.id, dimensao.c.nome).order_by(dimensao.c.id)).all())
@@ -0,0 +1,15 @@
+from api import anomalias, dimensoes, estoque, rollups, versoes
+
+
+# Caminho único de escrita das leituras: o insert e tudo que depende dele
+# (ids das dimensões, rollups, estoque, detecção de anomalias, contador de versão) acontecem na mesma transação.
+def gravar(conn, tabela, linhas):
+    if not linhas:
+        return
+    linhas = dimensoes.resolver(conn, tabela.name, linhas)
+    conn.execute(tabela.insert(), linhas)
+    rollups.atualizar_rollups(conn, tabela.name, linhas)
+    anomalias.atualizar(conn, tabela.name, linhas)
+    if tabela.name in estoque.ORIGENS:
+        estoque.aplicar(conn, tabela.name)
+    versoes.incrementar(conn, tabela.name)
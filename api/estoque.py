@@ -0,0 +1,315 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import bindparam, delete, func, literal, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from api import config, db, versoes
+from api.tables import (
+    atividade_tbl, compra_tbl, estoque_aplicado_tbl, estoque_diario_tbl, estoque_tbl, produto_tbl,
+)
+
+# Estoque dos produtos de higiene mantido por deltas: cada compra soma
+# quantidade x tamanho da embalagem e cada atividade subtrai o consumo, na mesma
+# transação do insert (chamado por escrita.gravar). O estado guarda, por origem,
+# o último id aplicado: aplicar de novo não muda nada, e reconstruir() refaz tudo
+# a partir das tabelas compra e atividade. O cadastro (produto) nunca é alterado:
+# quantidade_restante é o estoque inicial, e o atual e o número de embalagens saem
+# daqui. Um saldo negativo (mais consumo registrado que estoque) não é corrigido na
+# tabela, que é a soma dos eventos: as consultas mostram 0 e marcam saldo_negativo.
+
+ORIGENS = ("produto", "compra", "atividade")
+JANELAS_DIAS = (7, 30, 90)
+
+
+# === MARCAS ===
+def ultimo_aplicado(conn, origem):
+    sel = select(estoque_aplicado_tbl.c.ultimo_id).where(estoque_aplicado_tbl.c.origem == origem)
+    return conn.execute(sel).scalar() or 0
+
+
+def marcar(conn, origem, ultimo_id):
+    ins = insert(estoque_aplicado_tbl).values(origem=origem, ultimo_id=ultimo_id)
+    conn.execute(ins.on_conflict_do_update(
+        index_elements=[estoque_aplicado_tbl.c.origem], set_={"ultimo_id": ins.excluded.ultimo_id},
+    ))
+
+
+# === APLICAÇÃO DOS EVENTOS ===
+def eventos_novos(origem, desde):
+    # eventos com id acima da marca, já somados por produto e dia
+    if origem == "compra":
+        tbl = compra_tbl
+        comprado = func.sum(tbl.c.quantidade * func.coalesce(produto_tbl.c.quantidade_total, 0))
+        consumido = literal(0.0)
+        fonte = tbl.outerjoin(produto_tbl, produto_tbl.c.id == tbl.c.produto_id)
+    else:
+        tbl = atividade_tbl
+        comprado = literal(0.0)
+        consumido = func.sum(tbl.c.consumo)
+        fonte = tbl
+    dia = func.date(tbl.c.data)
+    return (
+        select(tbl.c.produto_id, dia.label("dia"), comprado.label("comprado"), consumido.label("consumido"),
+               func.count().label("eventos"), func.max(tbl.c.id).label("ultimo_id"))
+        .select_from(fonte)
+        .where(tbl.c.id > desde)
+        .group_by(tbl.c.produto_id, dia)
+    )
+
+
+def aplicar(conn, origem):
+    # aplica os eventos de uma origem ainda não aplicados; devolve quantos foram
+    if origem == "produto":
+        return aplicar_produtos(conn)
+    if origem == "compra":
+        # produtos cadastrados e ainda não aplicados (ex.: SQL direto) entram antes: uma compra
+        # já aplicada com o tamanho da embalagem não é somada de novo no cadastro
+        aplicar_produtos(conn)
+    linhas = conn.execute(eventos_novos(origem, ultimo_aplicado(conn, origem))).all()
+    if not linhas:
+        return 0
+
+    por_produto = defaultdict(lambda: {"comprado": 0.0, "consumido": 0.0, "eventos": 0, "dias": []})
+    diario = []
+    for linha in linhas:
+        dia = date.fromisoformat(linha.dia)
+        delta = por_produto[linha.produto_id]
+        delta["comprado"] += linha.comprado
+        delta["consumido"] += linha.consumido
+        delta["eventos"] += linha.eventos
+        if linha.consumido:
+            delta["dias"].append(dia)
+        diario.append({"produto_id": linha.produto_id, "dia": dia,
+                       "comprado": linha.comprado, "consumido": linha.consumido})
+
+    contador = "compras" if origem == "compra" else "consumos"
+    ins = insert(estoque_tbl)
+    conn.execute(ins.on_conflict_do_update(
+        index_elements=[estoque_tbl.c.produto_id],
+        set_={
+            "comprado": estoque_tbl.c.comprado + ins.excluded.comprado,
+            "consumido": estoque_tbl.c.consumido + ins.excluded.consumido,
+            "quantidade": estoque_tbl.c.quantidade + ins.excluded.quantidade,
+            contador: estoque_tbl.c[contador] + ins.excluded[contador],
+            # min/max do SQLite devolvem NULL se um dos lados for NULL
+            "primeiro_consumo": func.coalesce(
+                func.min(estoque_tbl.c.primeiro_consumo, ins.excluded.primeiro_consumo),
+                estoque_tbl.c.primeiro_consumo, ins.excluded.primeiro_consumo),
+            "ultimo_consumo": func.coalesce(
+                func.max(estoque_tbl.c.ultimo_consumo, ins.excluded.ultimo_consumo),
+                estoque_tbl.c.ultimo_consumo, ins.excluded.ultimo_consumo),
+        },
+    ), [
+        {"produto_id": produto_id, "inicial": 0.0, "comprado": d["comprado"], "consumido": d["consumido"],
+         "quantidade": d["comprado"] - d["consumido"], "compras": 0, "consumos": 0, contador: d["eventos"],
+         "primeiro_consumo": min(d["dias"], default=None), "ultimo_consumo": max(d["dias"], default=None)}
+        for produto_id, d in por_produto.items()
+    ])
+
+    ins = insert(estoque_diario_tbl)
+    conn.execute(ins.on_conflict_do_update(
+        index_elements=[estoque_diario_tbl.c.produto_id, estoque_diario_tbl.c.dia],
+        set_={
+            "comprado": estoque_diario_tbl.c.comprado + ins.excluded.comprado,
+            "consumido": estoque_diario_tbl.c.consumido + ins.excluded.consumido,
+        },
+    ), diario)
+
+    marcar(conn, origem, max(linha.ultimo_id for linha in linhas))
+    versoes.incrementar(conn, "estoque")
+    return sum(d["eventos"] for d in por_produto.values())
+
+
+def aplicar_produtos(conn):
+    # produtos novos: a quantidade do cadastro é o estoque inicial
+    novos = conn.execute(
+        select(produto_tbl.c.id, produto_tbl.c.quantidade_restante)
+        .where(produto_tbl.c.id > ultimo_aplicado(conn, "produto"))
+    ).all()
+    if not novos:
+        return 0
+    ins = insert(estoque_tbl)
+    conn.execute(ins.on_conflict_do_update(
+        # eventos que chegaram antes do cadastro: troca o inicial sem perder os deltas
+        index_elements=[estoque_tbl.c.produto_id],
+        set_={
+            "inicial": ins.excluded.inicial,
+            "quantidade": estoque_tbl.c.quantidade - estoque_tbl.c.inicial + ins.excluded.inicial,
+        },
+    ), [
+        {"produto_id": id, "inicial": restante, "comprado": 0.0, "consumido": 0.0, "quantidade": restante,
+         "compras": 0, "consumos": 0}
+        for id, restante in novos
+    ])
+    aplicar_compras_anteriores(conn, [id for id, _ in novos])
+    marcar(conn, "produto", max(id for id, _ in novos))
+    versoes.incrementar(conn, "estoque")
+    return len(novos)
+
+
+def aplicar_compras_anteriores(conn, produto_ids):
+    # compras de um produto ainda não cadastrado entraram sem o tamanho da embalagem (0) e a
+    # marca de compra já passou delas: no cadastro, soma o que elas trouxeram
+    dia = func.date(compra_tbl.c.data)
+    linhas = conn.execute(
+        select(compra_tbl.c.produto_id, dia.label("dia"),
+               func.sum(compra_tbl.c.quantidade * produto_tbl.c.quantidade_total).label("comprado"))
+        .join(produto_tbl, produto_tbl.c.id == compra_tbl.c.produto_id)
+        .where(compra_tbl.c.produto_id.in_(produto_ids), compra_tbl.c.id <= ultimo_aplicado(conn, "compra"))
+        .group_by(compra_tbl.c.produto_id, dia)
+    ).all()
+    if not linhas:
+        return
+    por_produto = defaultdict(float)
+    for linha in linhas:
+        por_produto[linha.produto_id] += linha.comprado
+    conn.execute(
+        update(estoque_tbl)
+        .where(estoque_tbl.c.produto_id == bindparam("pid"))
+        .values(comprado=estoque_tbl.c.comprado + bindparam("delta"),
+                quantidade=estoque_tbl.c.quantidade + bindparam("delta")),
+        [{"pid": id, "delta": comprado} for id, comprado in por_produto.items()],
+    )
+    conn.execute(
+        update(estoque_diario_tbl)
+        .where(estoque_diario_tbl.c.produto_id == bindparam("pid"), estoque_diario_tbl.c.dia == bindparam("d"))
+        .values(comprado=estoque_diario_tbl.c.comprado + bindparam("delta")),
+        [{"pid": linha.produto_id, "d": date.fromisoformat(linha.dia), "delta": linha.comprado} for linha in linhas],
+    )
+
+
+def embalagens(quantidade, tamanho):
+    if not tamanho or quantidade <= 0:
+        return 0
+    return math.ceil(round(quantidade / tamanho, 9))
+
+
+def reconstruir(conn):
+    # refaz o estado do zero a partir do cadastro, de compra e de atividade
+    produtos = conn.execute(select(produto_tbl.c.id, produto_tbl.c.quantidade_restante)).all()
+    for tbl in (estoque_tbl, estoque_diario_tbl, estoque_aplicado_tbl):
+        conn.execute(delete(tbl))
+    if produtos:
+        conn.execute(insert(estoque_tbl), [
+            {"produto_id": id, "inicial": restante, "comprado": 0.0, "consumido": 0.0, "quantidade": restante,
+             "compras": 0, "consumos": 0}
+            for id, restante in produtos
+        ])
+        marcar(conn, "produto", max(id for id, _ in produtos))
+    aplicar(conn, "compra")
+    aplicar(conn, "atividade")
+    versoes.incrementar(conn, "estoque")
+
+
+# === CONSULTAS ===
+def consumo_por_janela(conn, ate, produto_id=None):
+    # {produto_id: {dias: consumido}} lendo só os dias das janelas em estoque_diario
+    resultado = defaultdict(dict)
+    for dias in JANELAS_DIAS:
+        sel = (
+            select(estoque_diario_tbl.c.produto_id, func.sum(estoque_diario_tbl.c.consumido))
+            .where(estoque_diario_tbl.c.dia > ate - timedelta(days=dias), estoque_diario_tbl.c.dia <= ate)
+            .group_by(estoque_diario_tbl.c.produto_id)
+        )
+        if produto_id is not None:
+            sel = sel.where(estoque_diario_tbl.c.produto_id == produto_id)
+        for id, consumido in conn.execute(sel):
+            resultado[id][dias] = consumido
+    return resultado
+
+
+def previsao(quantidade, taxa, ate):
+    if not taxa or quantidade <= 0:
+        return None, None
+    dias = quantidade / taxa
+    return round(dias, 1), (ate + timedelta(days=math.floor(dias))).isoformat()
+
+
+def saldo(quantidade, tamanho):
+    # (quantidade disponível, embalagens, saldo negativo): o que passa de 0 para baixo não existe na prateleira
+    disponivel = max(quantidade, 0.0)
+    return round(disponivel, 6), embalagens(disponivel, tamanho), quantidade < 0
+
+
+def selecionar_estoque():
+    return (
+        select(estoque_tbl, produto_tbl.c.nome, produto_tbl.c.unidade, produto_tbl.c.quantidade_total)
+        .join(produto_tbl, produto_tbl.c.id == estoque_tbl.c.produto_id)
+        .order_by(estoque_tbl.c.produto_id)
+    )
+
+
+def listar(conn, ate=None, janela=30):
+    ate = ate or date.today()
+    consumos = consumo_por_janela(conn, ate)
+    itens = []
+    for linha in conn.execute(selecionar_estoque()).mappings():
+        taxa = consumos.get(linha["produto_id"], {}).get(janela, 0.0) / janela
+        dias, esgota_em = previsao(linha["quantidade"], taxa, ate)
+        quantidade, pacotes, negativo = saldo(linha["quantidade"], linha["quantidade_total"])
+        itens.append({
+            "produto_id": linha["produto_id"], "nome": linha["nome"], "unidade": linha["unidade"],
+            "quantidade": quantidade, "embalagens": pacotes, "saldo_negativo": negativo,
+            f"taxa_diaria_{janela}d": round(taxa, 6), "dias_restantes": dias, "esgota_em": esgota_em,
+        })
+    return {"referencia": ate.isoformat(), "produtos": itens}
+
+
+def detalhar(conn, produto_id, ate=None):
+    ate = ate or date.today()
+    linha = conn.execute(selecionar_estoque().where(estoque_tbl.c.produto_id == produto_id)).mappings().first()
+    if linha is None:
+        return None
+    consumos = consumo_por_janela(conn, ate, produto_id).get(produto_id, {})
+    taxas = {f"{dias}d": round(consumos.get(dias, 0.0) / dias, 6) for dias in JANELAS_DIAS}
+    # média desde o primeiro consumo, direto dos totais (sem ler o histórico)
+    historica = None
+    if linha["primeiro_consumo"] and linha["ultimo_consumo"]:
+        periodo = (linha["ultimo_consumo"] - linha["primeiro_consumo"]).days + 1
+        historica = round(linha["consumido"] / periodo, 6)
+    taxas["historica"] = historica
+    taxa = taxas["30d"] or historica
+    dias, esgota_em = previsao(linha["quantidade"], taxa, ate)
+    quantidade, pacotes, negativo = saldo(linha["quantidade"], linha["quantidade_total"])
+    return {
+        **{chave: linha[chave] for chave in ("produto_id", "nome", "unidade", "quantidade_total",
+                                             "inicial", "comprado", "consumido", "compras", "consumos")},
+        "quantidade": quantidade, "embalagens": pacotes, "saldo_negativo": negativo,
+        # soma dos eventos, sem o corte em 0: mostra quanto consumo foi registrado a mais
+        "saldo": round(linha["quantidade"], 6),
+        "primeiro_consumo": linha["primeiro_consumo"], "ultimo_consumo": linha["ultimo_consumo"],
+        "referencia": ate.isoformat(),
+        "taxa_diaria": taxas,
+        "dias_restantes": dias,
+        "esgota_em": esgota_em,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estoque incremental dos produtos de higiene")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--reconstruir", action="store_true", help="refaz o estoque a partir de compra e atividade")
+    args = parser.parse_args()
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    with engine.begin() as conn:
+        if args.reconstruir:
+            reconstruir(conn)
+            print("✅ Estoque reconstruído")
+        else:
+            # aplica eventos que entraram sem passar pela API (ex.: SQL direto)
+            for origem in ORIGENS:
+                print(f"✅ {origem}: {aplicar(conn, origem)} eventos aplicados")
+
+
+if __name__ == "__main__":
+    main()
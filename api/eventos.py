@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import signal
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import func, select
+
+from api import anomalias, config, dimensoes, shards
+from api.tables import alerta_tbl, consumo_agua, consumo_energia
+
+# Eventos de mudança para os dashboards ao vivo (Server-Sent Events em /eventos).
+# Uma única tarefa vigia o banco: PRAGMA data_version só muda quando alguma outra
+# conexão faz commit, então enquanto nada é gravado a vigia custa um PRAGMA por
+# intervalo. Quando muda, lê só as linhas com id acima do último visto (busca pela
+# chave primária) e publica para todos os assinantes. Assim aparecem também as
+# escritas de outros processos (importação, outro worker da API), e não só as desta.
+# Com o particionamento por residência, cada arquivo de shard é vigiado do mesmo jeito
+# e as linhas saem com o id global (api.shards).
+
+log = logging.getLogger(__name__)
+
+TABELAS = {"consumo_agua": consumo_agua, "consumo_energia": consumo_energia, "alerta": alerta_tbl}
+
+
+def ler_ultimos_ids(conn):
+    return {nome: conn.execute(select(func.coalesce(func.max(tbl.c.id), 0))).scalar()
+            for nome, tbl in TABELAS.items()}
+
+
+def ler_novidades(conn, ultimos_ids, max_linhas):
+    # {tabela: (linhas, ultimo_id, completo)}; completo=False quando passou de max_linhas
+    novidades = {}
+    for nome, tbl in TABELAS.items():
+        if nome == "alerta":
+            sel = anomalias.selecionar_alertas().where(tbl.c.id > ultimos_ids[nome])
+            sel = sel.order_by(None).order_by(tbl.c.id)
+        else:
+            sel = dimensoes.selecionar(nome, tbl).where(tbl.c.id > ultimos_ids[nome]).order_by(tbl.c.id)
+        linhas = [dict(linha) for linha in conn.execute(sel.limit(max_linhas + 1)).mappings()]
+        if not linhas:
+            continue
+        completo = len(linhas) <= max_linhas
+        ultimo_id = linhas[-1]["id"] if completo else conn.execute(select(func.max(tbl.c.id))).scalar()
+        novidades[nome] = (linhas if completo else [], ultimo_id, completo)
+    return novidades
+
+
+def data_version(conn):
+    return conn.exec_driver_sql("PRAGMA data_version").scalar()
+
+
+def filtrar(evento, tabelas):
+    # o evento como o assinante de algumas tabelas deve receber (None se não for para ele)
+    seq, tipo, dados = evento
+    if not tabelas or tipo == "recarregar" and dados["tabela"] is None:
+        return evento
+    if tipo == "alerta":
+        alertas = [a for a in dados["alertas"] if a["tabela"] in tabelas]
+        return (seq, tipo, {"alertas": alertas}) if alertas else None
+    return evento if dados["tabela"] in tabelas else None
+
+
+def formatar(seq, tipo, dados):
+    return f"id: {seq}\nevent: {tipo}\ndata: {json.dumps(dados, default=str, ensure_ascii=False)}\n\n"
+
+
+class Difusor:
+    def __init__(self, engine_async, intervalo_ms=None, historico=None, max_linhas=None, roteador=None):
+        # fontes: o banco central e, se houver, os shards (o n de cada um traduz os ids)
+        self.fontes = [(None, engine_async)] + list(enumerate(roteador.engines_async if roteador else []))
+        self.total_shards = roteador.total if roteador else 0
+        self.intervalo = (intervalo_ms or config.EVENTOS_INTERVALO_MS) / 1000
+        self.max_linhas = max_linhas or config.EVENTOS_MAX_LINHAS
+        # eventos recentes, para quem reconecta com Last-Event-ID não perder nada
+        self.historico = deque(maxlen=historico or config.EVENTOS_HISTORICO)
+        self.assinantes = set()
+        # a sequência começa no relógio: depois de reiniciar a API, um Last-Event-ID antigo
+        # fica abaixo do histórico novo e o cliente é mandado reler tudo
+        self.seq = int(time.time() * 1000)
+        self.acordar = asyncio.Event()
+        self.tarefa = None
+        self.conns = []
+        self.encerrando = False
+
+    async def iniciar(self):
+        # conexões próprias e que nunca escrevem: data_version muda a cada commit de qualquer outra
+        self.ultimos_ids, self.versoes = [], []
+        for _, engine_async in self.fontes:
+            conn = await engine_async.connect()
+            self.conns.append(conn)
+            self.ultimos_ids.append(await conn.run_sync(ler_ultimos_ids))
+            self.versoes.append(await conn.run_sync(data_version))
+            await conn.rollback()
+        self.tarefa = asyncio.create_task(self.vigiar())
+        self.fechar_ao_parar()
+
+    def fechar_ao_parar(self):
+        # o uvicorn só encerra a aplicação depois que as conexões abertas terminam, e uma
+        # transmissão SSE não termina sozinha: no sinal de parada elas são fechadas primeiro
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            anterior = signal.getsignal(sinal)
+            if not callable(anterior):
+                continue
+
+            def tratar(numero, quadro, anterior=anterior):
+                loop.call_soon_threadsafe(self.fechar_transmissoes)
+                anterior(numero, quadro)
+
+            signal.signal(sinal, tratar)
+
+    def fechar_transmissoes(self):
+        self.encerrando = True
+        for fila in list(self.assinantes):
+            self.descartar(fila)
+
+    async def encerrar(self):
+        self.tarefa.cancel()
+        try:
+            await self.tarefa
+        except asyncio.CancelledError:
+            pass
+        self.fechar_transmissoes()
+        for conn in self.conns:
+            await conn.close()
+
+    def avisar(self):
+        # chamado depois de um commit desta API: não espera o próximo intervalo
+        self.acordar.set()
+
+    async def vigiar(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.acordar.wait(), self.intervalo)
+            except asyncio.TimeoutError:
+                pass
+            self.acordar.clear()
+            try:
+                await self.verificar()
+            except Exception:
+                log.exception("Falha ao ler eventos do banco")
+                for conn in self.conns:
+                    await conn.rollback()
+
+    def id_publico(self, id_, shard):
+        return id_ if shard is None or not id_ else shards.id_global(id_, shard, self.total_shards)
+
+    def ids_publicos(self):
+        # último id de cada tabela: o maior entre as fontes
+        ids = list(zip([shard for shard, _ in self.fontes], self.ultimos_ids))
+        return {tabela: max(self.id_publico(ultimos[tabela], shard) for shard, ultimos in ids) for tabela in TABELAS}
+
+    async def verificar(self):
+        for i, (shard, _) in enumerate(self.fontes):
+            await self.verificar_fonte(i, shard)
+
+    async def verificar_fonte(self, i, shard):
+        conn = self.conns[i]
+        versao = await conn.run_sync(data_version)
+        if versao == self.versoes[i]:
+            await conn.rollback()
+            return
+        self.versoes[i] = versao
+        novidades = await conn.run_sync(ler_novidades, self.ultimos_ids[i], self.max_linhas)
+        await conn.rollback()
+        for tabela, (linhas, ultimo_id, completo) in novidades.items():
+            self.ultimos_ids[i][tabela] = ultimo_id
+            if shard is not None:
+                linhas = shards.globalizar(linhas, shard, self.total_shards)
+                ultimo_id = self.id_publico(ultimo_id, shard)
+            if tabela == "alerta":
+                self.publicar("alerta", {"alertas": linhas})
+            elif completo:
+                self.publicar("leituras", {"tabela": tabela, "linhas": linhas})
+            else:
+                # carga grande (importação, por exemplo): quem assina relê do banco
+                self.publicar("recarregar", {"tabela": tabela, "ultimo_id": ultimo_id})
+
+    def publicar(self, tipo, dados):
+        self.seq += 1
+        evento = (self.seq, tipo, dados)
+        self.historico.append(evento)
+        for fila in list(self.assinantes):
+            try:
+                fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # assinante lento: a conexão é encerrada e ele retoma pelo Last-Event-ID
+                self.descartar(fila)
+
+    def descartar(self, fila):
+        self.assinantes.discard(fila)
+        while not fila.empty():
+            fila.get_nowait()
+        fila.put_nowait(None)
+
+    def assinar(self, desde=None):
+        fila = asyncio.Queue(maxsize=config.EVENTOS_FILA)
+        if self.encerrando:
+            fila.put_nowait(None)
+            return fila, []
+        pendentes = []
+        if desde is not None and desde != self.seq:
+            pendentes = [e for e in self.historico if e[0] > desde]
+            if desde > self.seq or not pendentes or pendentes[0][0] > desde + 1:
+                # o histórico não alcança o último evento visto: é preciso reler tudo
+                pendentes = [(self.seq, "recarregar", {"tabela": None})]
+        self.assinantes.add(fila)
+        return fila, pendentes
+
+    async def transmitir(self, request, tabelas=None, desde=None):
+        fila, pendentes = self.assinar(desde)
+        try:
+            yield f"retry: {config.EVENTOS_RETRY_MS}\n\n"
+            if desde is None:
+                # primeira conexão: o último id de cada tabela marca de onde os eventos partem
+                yield formatar(self.seq, "inicio", {"ultimos_ids": self.ids_publicos()})
+            for evento in pendentes:
+                if evento := filtrar(evento, tabelas):
+                    yield formatar(*evento)
+            while True:
+                try:
+                    evento = await asyncio.wait_for(fila.get(), config.EVENTOS_KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    # comentário SSE: mantém a conexão viva atrás de proxies
+                    yield ": ping\n\n"
+                    continue
+                if evento is None:
+                    return
+                if evento := filtrar(evento, tabelas):
+                    yield formatar(*evento)
+        finally:
+            self.assinantes.discard(fila)
@@ -0,0 +1,142 @@
+import gzip
+from datetime import date, datetime
+
+import numpy as np
+import orjson
+import pyarrow as pa
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from api import config, metricas
+
+try:
+    import brotli
+except ImportError:
+    # opcional: sem o pacote, só gzip é oferecido
+    brotli = None
+
+# Formatos das respostas de leitura da API:
+# - "linhas": o formato de sempre, uma lista de objetos (as chaves se repetem em toda linha);
+# - "colunar": as mesmas listas viram {coluna: [valores]}, cada chave aparece uma vez;
+# - "arrow": Arrow IPC (stream), para quem lê direto em pandas/polars/pyarrow.
+# O JSON é gerado pelo orjson (bem mais rápido que o encoder padrão do FastAPI, que
+# passa cada valor pelo jsonable_encoder) e o corpo é comprimido com br ou gzip
+# conforme o Accept-Encoding do cliente.
+
+FORMATOS = ("linhas", "colunar", "arrow")
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+OPCOES_JSON = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+TIPOS_ARROW = {int: pa.int64(), float: pa.float64(), str: pa.string(), bool: pa.bool_(),
+               datetime: pa.timestamp("us"), date: pa.date32()}
+
+
+def padrao(valor):
+    # o que o orjson não serializa sozinho: Timestamp do pandas (subclasse de datetime) e escalares numpy
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def validar(formato, permitidos=FORMATOS):
+    if formato not in permitidos:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {formato} (use {', '.join(permitidos)})")
+    return formato
+
+
+def colunar(linhas, colunas=None):
+    # lista de dicts -> {coluna: [valores]}; as colunas vêm da primeira linha se não forem dadas
+    colunas = colunas or (list(linhas[0]) if linhas else [])
+    return {coluna: [linha[coluna] for linha in linhas] for coluna in colunas}
+
+
+def esquema_arrow(colunas):
+    # schema das colunas do select (SQLAlchemy): uma página vazia ainda diz quais colunas e tipos teria
+    campos = []
+    for coluna in colunas:
+        try:
+            tipo = TIPOS_ARROW.get(coluna.type.python_type, pa.null())
+        except NotImplementedError:
+            tipo = pa.null()
+        campos.append(pa.field(coluna.name, tipo))
+    return pa.schema(campos)
+
+
+def para_json(conteudo):
+    return orjson.dumps(conteudo, default=padrao, option=OPCOES_JSON)
+
+
+def para_arrow(dados, metadados=None, esquema=None):
+    # dados colunares -> bytes de um stream Arrow IPC; metadados vão no schema. O esquema
+    # dado só é usado sem linhas: com elas os tipos vêm dos próprios valores
+    vazio = not any(len(valores) for valores in dados.values())
+    tabela = pa.table(dados, schema=esquema) if esquema is not None and vazio else pa.table(dados)
+    if metadados:
+        tabela = tabela.replace_schema_metadata({k: str(v) for k, v in metadados.items() if v is not None})
+    saida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(saida, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return saida.getvalue().to_pybytes()
+
+
+def codificacoes_aceitas(accept_encoding):
+    # {codificação: q} do cabeçalho Accept-Encoding
+    aceitas = {}
+    for parte in (accept_encoding or "").split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        if not nome:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            chave, _, valor = parametro.strip().partition("=")
+            if chave == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        aceitas[nome.strip().lower()] = q
+    return aceitas
+
+
+def escolher_codificacao(accept_encoding):
+    aceitas = codificacoes_aceitas(accept_encoding)
+    disponiveis = (["br"] if brotli else []) + ["gzip"]
+    candidatas = [(aceitas.get(c, aceitas.get("*", 0.0)), -i, c) for i, c in enumerate(disponiveis)]
+    q, _, codificacao = max(candidatas)
+    return codificacao if q > 0 else None
+
+
+def comprimir(corpo, codificacao):
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=config.COMPRESSAO_NIVEL_BR)
+    return gzip.compress(corpo, compresslevel=config.COMPRESSAO_NIVEL_GZIP, mtime=0)
+
+
+def responder(request, conteudo, formato="linhas", chave="dados", metadados=None, colunas=None):
+    # conteudo é a resposta como a API sempre devolveu; chave aponta a lista de linhas
+    # (ou, nos agregados, o dict que já é colunar) que muda conforme o formato; colunas
+    # (as do select) mantêm nomes e tipos quando a lista vem vazia
+    cabecalhos = {"Vary": "Accept-Encoding"}
+    nomes = [coluna.name for coluna in colunas] if colunas is not None else None
+    with metricas.etapa("serializacao"):
+        if formato == "arrow":
+            dados = conteudo[chave]
+            esquema = esquema_arrow(colunas) if colunas is not None else None
+            corpo = para_arrow(dados if isinstance(dados, dict) else colunar(dados, nomes), metadados, esquema)
+            tipo = TIPO_ARROW
+            for nome, valor in (metadados or {}).items():
+                if valor is not None:
+                    cabecalhos[f"X-{nome.replace('_', '-').title()}"] = str(valor)
+        else:
+            if formato == "colunar" and isinstance(conteudo[chave], list):
+                conteudo = {**conteudo, chave: colunar(conteudo[chave], nomes)}
+            corpo = para_json(conteudo)
+            tipo = "application/json"
+    if len(corpo) >= config.COMPRESSAO_MIN_BYTES:
+        codificacao = escolher_codificacao(request.headers.get("accept-encoding"))
+        if codificacao:
+            with metricas.etapa("compressao"):
+                corpo = comprimir(corpo, codificacao)
+            cabecalhos["Content-Encoding"] = codificacao
+    return Response(corpo, media_type=tipo, headers=cabecalhos)
@@ -0,0 +1,224 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import codecs
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+import api.models as models
+from api import config, db, escrita, metricas
+from api.tables import consumo_agua, consumo_energia, compra_tbl, atividade_tbl, produto_tbl, importacao_tbl
+
+
+TABELAS = {
+    "consumo_agua": (consumo_agua, models.ConsumoAgua),
+    "consumo_energia": (consumo_energia, models.ConsumoEnergia),
+    "produto": (produto_tbl, models.Produto),
+    "compra": (compra_tbl, models.Compra),
+    "atividade": (atividade_tbl, models.Atividade_gasto),
+}
+
+TAMANHO_CHUNK = 5000
+MAX_ERROS = 100
+
+
+# === PIPELINE DE LEITURA ===
+def linhas_de_blocos(blocos, encoding="utf-8"):
+    # transforma blocos de bytes (corpo HTTP em streaming) em linhas de texto
+    decoder = codecs.getincrementaldecoder(encoding)()
+    resto = ""
+    for bloco in blocos:
+        texto = resto + decoder.decode(bloco)
+        linhas = texto.splitlines(keepends=True)
+        resto = linhas.pop() if linhas and not linhas[-1].endswith(("\n", "\r")) else ""
+        yield from linhas
+    resto += decoder.decode(b"", final=True)
+    if resto:
+        yield resto
+
+
+def ler_ndjson(linhas):
+    for linha in linhas:
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield json.loads(linha)
+        except json.JSONDecodeError:
+            # a validação rejeita a linha e ela aparece no relatório de erros
+            yield linha
+
+
+def ler_csv(linhas):
+    for registro in csv.DictReader(linhas):
+        yield {coluna: valor for coluna, valor in registro.items() if valor not in (None, "")}
+
+
+LEITORES = {"ndjson": ler_ndjson, "csv": ler_csv}
+
+
+def em_chunks(registros, tamanho):
+    while True:
+        chunk = list(islice(registros, tamanho))
+        if not chunk:
+            return
+        yield chunk
+
+
+# === PROGRESSO ===
+def progresso(conn, importacao_id):
+    linhas = conn.execute(
+        select(importacao_tbl.c.linhas).where(importacao_tbl.c.id == importacao_id)
+    ).scalar()
+    return linhas or 0
+
+
+def linhas_processadas(engine, importacao_id):
+    with engine.connect() as conn:
+        return progresso(conn, importacao_id)
+
+
+def indices_validos(inicio, total, rejeicoes):
+    # posição no arquivo de cada linha aceita de um chunk, na ordem das válidas
+    rejeitadas = {r["indice"] for r in rejeicoes}
+    return [inicio + i for i in range(total) if i not in rejeitadas]
+
+
+def salvar_progresso(conn, importacao_id, tabela, linhas, aceitos, rejeitados):
+    valores = {
+        "linhas": linhas,
+        "aceitos": aceitos,
+        "rejeitados": rejeitados,
+        "atualizado_em": datetime.now(),
+    }
+    ins = insert(importacao_tbl).values(id=importacao_id, tabela=tabela, **valores)
+    conn.execute(ins.on_conflict_do_update(
+        index_elements=[importacao_tbl.c.id],
+        set_={
+            "linhas": valores["linhas"],
+            "aceitos": importacao_tbl.c.aceitos + aceitos,
+            "rejeitados": importacao_tbl.c.rejeitados + rejeitados,
+            "atualizado_em": valores["atualizado_em"],
+        },
+    ))
+
+
+# === IMPORTAÇÃO ===
+def gravar_chunk(conn, tbl, linhas, roteador=None, importacao_id=None, indices=None, fim=None):
+    # com o particionamento por residência (api.shards), as leituras vão para o arquivo de
+    # cada uma e o progresso central fica na transação do banco central: se o processo cair
+    # entre os commits, retomar repete aquele chunk, e cada shard pula as linhas (pelos
+    # indices no arquivo) que o progresso dele diz que já gravou
+    if roteador:
+        roteador.gravar_sync(conn, tbl, linhas, importacao_id, indices, fim)
+    else:
+        escrita.gravar(conn, tbl, linhas)
+
+
+def importar(engine, tabela, linhas, formato="ndjson", importacao_id=None,
+             tamanho_chunk=TAMANHO_CHUNK, ao_progresso=None, roteador=None):
+    if tamanho_chunk < 1:
+        # com 0 nenhum chunk seria lido e o arquivo inteiro seria descartado sem erro
+        raise ValueError(f"tamanho_chunk precisa ser positivo: {tamanho_chunk}")
+    tbl, modelo = TABELAS[tabela]
+    importacao_tbl.create(engine, checkfirst=True)
+    if roteador:
+        roteador.preparar_importacao()
+
+    # ao retomar, pula as linhas que já foram gravadas em chunks anteriores
+    inicio_linhas = linhas_processadas(engine, importacao_id) if importacao_id else 0
+    registros = islice(LEITORES[formato](linhas), inicio_linhas, None)
+
+    processadas, aceitos, rejeitados, erros = inicio_linhas, 0, 0, []
+    inicio = time.perf_counter()
+    for chunk in em_chunks(registros, tamanho_chunk):
+        with metricas.etapa("validacao"):
+            validas, resultados = models.validar_lote(modelo, chunk)
+        with engine.begin() as conn:
+            gravar_chunk(conn, tbl, validas, roteador, importacao_id,
+                         [processadas + r["indice"] for r in resultados if r["status"] == "aceito"],
+                         processadas + len(chunk))
+            if importacao_id:
+                salvar_progresso(conn, importacao_id, tabela, processadas + len(chunk),
+                                 len(validas), len(chunk) - len(validas))
+
+        for r in resultados:
+            if r["status"] == "rejeitado" and len(erros) < MAX_ERROS:
+                erros.append({**r, "indice": processadas + r["indice"]})
+        processadas += len(chunk)
+        aceitos += len(validas)
+        rejeitados += len(chunk) - len(validas)
+
+        if ao_progresso:
+            ao_progresso(processadas, aceitos, rejeitados, time.perf_counter() - inicio)
+
+    duracao = time.perf_counter() - inicio
+    return {
+        "status": "ok",
+        "tabela": tabela,
+        "importacao_id": importacao_id,
+        "retomado_de": inicio_linhas,
+        "linhas": processadas,
+        "aceitos": aceitos,
+        "rejeitados": rejeitados,
+        "segundos": round(duracao, 3),
+        "linhas_por_segundo": round((aceitos + rejeitados) / duracao, 1) if duracao else None,
+        "erros": erros,
+    }
+
+
+# === CLI ===
+def roteador_da_configuracao():
+    if not config.SHARDS:
+        return None
+    from api import shards  # import local: só com o particionamento ligado
+
+    roteador = shards.Roteador()
+    roteador.preparar()
+    return roteador
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa arquivos NDJSON/CSV para o banco de consumo")
+    parser.add_argument("tabela", choices=sorted(TABELAS))
+    parser.add_argument("arquivo")
+    parser.add_argument("--formato", choices=sorted(LEITORES), help="padrão: pela extensão do arquivo")
+    parser.add_argument("--chunk", type=int, default=TAMANHO_CHUNK)
+    parser.add_argument("--id", help="identificador da importação (padrão: tabela + caminho do arquivo)")
+    parser.add_argument("--db", default=config.DB_PATH)
+    args = parser.parse_args()
+    if args.chunk < 1:
+        parser.error("--chunk precisa ser positivo")
+
+    formato = args.formato or ("csv" if args.arquivo.lower().endswith(".csv") else "ndjson")
+    importacao_id = args.id or f"{args.tabela}:{os.path.abspath(args.arquivo)}"
+    engine = db.criar_engine(os.path.abspath(args.db))
+    roteador = roteador_da_configuracao()
+
+    def mostrar(processadas, aceitos, rejeitados, segundos):
+        taxa = (aceitos + rejeitados) / segundos if segundos else 0
+        print(f"{processadas} linhas | {aceitos} aceitas | {rejeitados} rejeitadas | {taxa:.0f} linhas/s")
+
+    with open(args.arquivo, newline="", encoding="utf-8") as f:
+        resumo = importar(engine, args.tabela, f, formato, importacao_id, args.chunk, mostrar, roteador)
+
+    if resumo["retomado_de"]:
+        print(f"Retomado a partir da linha {resumo['retomado_de']}")
+    for erro in resumo["erros"]:
+        print(f"linha {erro['indice']}: {erro['erro']}")
+    print(f"✅ {resumo['aceitos']} linhas importadas em {resumo['segundos']}s "
+          f"({resumo['linhas_por_segundo']} linhas/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import io
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import api.models as models
+from api import config, db, importacao
+from api.tables import importacao_tbl
+
+# Importação de arquivos grandes usando todos os núcleos: o arquivo é dividido em
+# fatias de bytes (cortadas sempre no fim de uma linha), processos trabalhadores
+# fazem o parse e a validação pydantic de cada fatia, e o processo principal é o
+# único escritor, gravando as fatias na ordem do arquivo. O número de fatias em
+# andamento é limitado para que o arquivo nunca fique inteiro na memória.
+# No CSV as fatias são cortadas por linha: campos com quebra de linha dentro de
+# aspas não são suportados (use importacao.py nesses arquivos).
+
+TAMANHO_FATIA = 4 * 1024 * 1024  # bytes
+
+
+def fatias(caminho, tamanho_fatia, inicio=0):
+    total = os.path.getsize(caminho)
+    with open(caminho, "rb") as f:
+        while inicio < total:
+            f.seek(min(inicio + tamanho_fatia, total))
+            f.readline()  # avança até o fim da linha em que o corte caiu
+            fim = f.tell()
+            yield inicio, fim
+            inicio = fim
+
+
+def processar_fatia(caminho, tabela, formato, inicio, fim, cabecalho=""):
+    # roda no processo trabalhador: lê, faz o parse e valida a fatia
+    with open(caminho, "rb") as f:
+        f.seek(inicio)
+        dados = f.read(fim - inicio)
+    texto = io.StringIO(cabecalho + dados.decode("utf-8"), newline="")
+    registros = list(importacao.LEITORES[formato](texto))
+    validas, resultados = models.validar_lote(importacao.TABELAS[tabela][1], registros)
+    return len(registros), validas, [r for r in resultados if r["status"] == "rejeitado"]
+
+
+def importar_paralelo(engine, tabela, caminho, formato="ndjson", importacao_id=None, processos=None,
+                      tamanho_fatia=TAMANHO_FATIA, max_em_voo=None, ao_progresso=None, roteador=None):
+    tbl, _ = importacao.TABELAS[tabela]
+    importacao_tbl.create(engine, checkfirst=True)
+    if roteador:
+        roteador.preparar_importacao()
+    processos = processos or config.IMPORTACAO_PROCESSOS
+    max_em_voo = max_em_voo or 2 * processos
+
+    cabecalho, inicio_dados = "", 0
+    if formato == "csv":
+        # cada fatia do CSV é lida com o cabeçalho do arquivo na frente
+        with open(caminho, "rb") as f:
+            cabecalho = f.readline().decode("utf-8")
+            inicio_dados = f.tell()
+
+    # ao retomar, os registros já gravados são descartados (o parse das fatias é refeito)
+    inicio_linhas = importacao.linhas_processadas(engine, importacao_id) if importacao_id else 0
+
+    processadas, aceitos, rejeitados, erros = 0, 0, 0, []
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(processos) as pool:
+        pendentes = deque()
+        proximas = fatias(caminho, tamanho_fatia, inicio_dados)
+
+        def enviar():
+            for de, ate in islice(proximas, max_em_voo - len(pendentes)):
+                pendentes.append(pool.submit(processar_fatia, caminho, tabela, formato, de, ate, cabecalho))
+
+        enviar()
+        while pendentes:
+            # sempre a fatia mais antiga: a gravação segue a ordem do arquivo
+            total, validas, rejeicoes = pendentes.popleft().result()
+            enviar()
+
+            indices = importacao.indices_validos(processadas, total, rejeicoes)
+            pular = min(max(inicio_linhas - processadas, 0), total)
+            if pular:
+                validas = validas[pular - sum(r["indice"] < pular for r in rejeicoes):]
+                rejeicoes = [r for r in rejeicoes if r["indice"] >= pular]
+                indices = indices[len(indices) - len(validas):]
+            if pular < total:
+                with engine.begin() as conn:
+                    importacao.gravar_chunk(conn, tbl, validas, roteador, importacao_id, indices, processadas + total)
+                    if importacao_id:
+                        importacao.salvar_progresso(conn, importacao_id, tabela, processadas + total,
+                                                    len(validas), len(rejeicoes))
+
+            for r in rejeicoes:
+                if len(erros) < importacao.MAX_ERROS:
+                    erros.append({**r, "indice": processadas + r["indice"]})
+            processadas += total
+            aceitos += len(validas)
+            rejeitados += len(rejeicoes)
+
+            if ao_progresso:
+                ao_progresso(processadas, aceitos, rejeitados, time.perf_counter() - inicio)
+
+    duracao = time.perf_counter() - inicio
+    return {
+        "status": "ok",
+        "tabela": tabela,
+        "importacao_id": importacao_id,
+        "retomado_de": inicio_linhas,
+        "linhas": processadas,
+        "aceitos": aceitos,
+        "rejeitados": rejeitados,
+        "processos": processos,
+        "segundos": round(duracao, 3),
+        "linhas_por_segundo": round((aceitos + rejeitados) / duracao, 1) if duracao else None,
+        "erros": erros,
+    }
+
+
+# === CLI ===
+def main():
+    parser = argparse.ArgumentParser(description="Importa arquivos NDJSON/CSV grandes usando vários processos")
+    parser.add_argument("tabela", choices=sorted(importacao.TABELAS))
+    parser.add_argument("arquivo")
+    parser.add_argument("--formato", choices=sorted(importacao.LEITORES), help="padrão: pela extensão do arquivo")
+    parser.add_argument("--processos", type=int, default=config.IMPORTACAO_PROCESSOS)
+    parser.add_argument("--fatia", type=int, default=TAMANHO_FATIA, help="tamanho de cada fatia em bytes")
+    parser.add_argument("--em-voo", type=int, help="máximo de fatias em andamento (padrão: 2 x processos)")
+    parser.add_argument("--id", help="identificador da importação (padrão: tabela + caminho do arquivo)")
+    parser.add_argument("--db", default=config.DB_PATH)
+    args = parser.parse_args()
+    if args.processos < 1 or args.fatia < 1 or (args.em_voo is not None and args.em_voo < 1):
+        parser.error("--processos, --fatia e --em-voo precisam ser positivos")
+
+    formato = args.formato or ("csv" if args.arquivo.lower().endswith(".csv") else "ndjson")
+    importacao_id = args.id or f"{args.tabela}:{os.path.abspath(args.arquivo)}"
+    engine = db.criar_engine(os.path.abspath(args.db))
+    roteador = importacao.roteador_da_configuracao()
+
+    def mostrar(processadas, aceitos, rejeitados, segundos):
+        taxa = (aceitos + rejeitados) / segundos if segundos else 0
+        print(f"{processadas} linhas | {aceitos} aceitas | {rejeitados} rejeitadas | {taxa:.0f} linhas/s")
+
+    resumo = importar_paralelo(engine, args.tabela, args.arquivo, formato, importacao_id,
+                               args.processos, args.fatia, args.em_voo, mostrar, roteador)
+
+    if resumo["retomado_de"]:
+        print(f"Retomado a partir da linha {resumo['retomado_de']}")
+    for erro in resumo["erros"]:
+        print(f"linha {erro['indice']}: {erro['erro']}")
+    print(f"✅ {resumo['aceitos']} linhas importadas em {resumo['segundos']}s com {resumo['processos']} processos "
+          f"({resumo['linhas_por_segundo']} linhas/s)")
+
+
+if __name__ == "__main__":
+    main()
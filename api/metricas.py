@@ -0,0 +1,229 @@
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from api import config
+
+# Métricas em memória no formato texto do Prometheus, sem dependência externa.
+# A API expõe em /metrics; a UI usa o mesmo registro no painel de tempos.
+
+log = logging.getLogger(__name__)
+
+BALDES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registro = []
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.valores = defaultdict(float)
+        self.trava = threading.Lock()
+        registro.append(self)
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        with self.trava:
+            self.valores[chave] += valor
+
+    def linhas(self):
+        with self.trava:
+            itens = sorted(self.valores.items())
+        return [f"{self.nome}{formatar_rotulos(self.rotulos, chave)} {valor:g}" for chave, valor in itens]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), baldes=BALDES_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.baldes = tuple(baldes)
+        # chave -> [contagem por balde..., soma, total]
+        self.valores = {}
+        self.trava = threading.Lock()
+        registro.append(self)
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(str(rotulos[r]) for r in self.rotulos)
+        with self.trava:
+            contagens = self.valores.setdefault(chave, [0] * len(self.baldes) + [0.0, 0])
+            for i, limite in enumerate(self.baldes):
+                if valor <= limite:
+                    contagens[i] += 1
+            contagens[-2] += valor
+            contagens[-1] += 1
+
+    def resumo(self):
+        # {rótulos: (total, soma)}, usado pelo painel da UI
+        with self.trava:
+            return {chave: (c[-1], c[-2]) for chave, c in self.valores.items()}
+
+    def linhas(self):
+        with self.trava:
+            itens = sorted((chave, list(c)) for chave, c in self.valores.items())
+        limites = [f"{b:g}" for b in self.baldes] + ["+Inf"]
+        saida = []
+        for chave, contagens in itens:
+            # as contagens por balde já são acumuladas (le = menor ou igual)
+            for limite, contagem in zip(limites, contagens[:len(self.baldes)] + [contagens[-1]]):
+                saida.append(f"{self.nome}_bucket{formatar_rotulos(self.rotulos + ('le',), chave + (limite,))} {contagem}")
+            rotulos = formatar_rotulos(self.rotulos, chave)
+            saida.append(f"{self.nome}_sum{rotulos} {contagens[-2]:.6f}")
+            saida.append(f"{self.nome}_count{rotulos} {contagens[-1]}")
+        return saida
+
+
+def escapar(valor):
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def formatar_rotulos(nomes, valores):
+    if not nomes:
+        return ""
+    return "{" + ",".join(f'{nome}="{escapar(valor)}"' for nome, valor in zip(nomes, valores)) + "}"
+
+
+def exportar():
+    saida = []
+    for metrica in registro:
+        saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        saida.extend(metrica.linhas())
+    return "\n".join(saida) + "\n"
+
+
+# === REQUISIÇÕES (preenchidas pelo middleware da API) ===
+requisicoes = Contador("consumo_requisicoes_total", "Requisições atendidas", ("metodo", "rota", "status"))
+latencia = Histograma("consumo_requisicao_segundos", "Latência das requisições até os cabeçalhos", ("metodo", "rota"))
+erros = Contador("consumo_requisicao_erros_total", "Requisições com exceção ou status 5xx", ("metodo", "rota"))
+linhas_requisicao = Contador("consumo_requisicao_linhas_total", "Linhas lidas ou gravadas pelos endpoints", ("rota",))
+# GET condicional: 304 (nao_modificado), servida do cache (acerto) ou lida do banco (falha)
+cache_respostas = Contador("consumo_cache_respostas_total", "Respostas de leitura por resultado do cache",
+                           ("rota", "resultado"))
+# leituras do buffer de escrita que falharam (no modo "fila" o cliente já recebeu a resposta)
+falhas_buffer = Contador("consumo_buffer_falhas_total", "Leituras do buffer de escrita que não foram gravadas",
+                         ("tabela", "durabilidade"))
+# etapas dentro da requisição: validacao (lotes), serializacao (JSON/Arrow) e compressao;
+# o tempo no banco está em consumo_sql_segundos
+etapas = Histograma("consumo_requisicao_etapa_segundos", "Tempo de cada etapa das requisições",
+                    ("rota", "etapa"))
+# o middleware cria um estado por requisição; os endpoints somam as linhas e os tempos das etapas nele
+requisicao_atual = ContextVar("requisicao_atual", default=None)
+
+
+def novo_estado_requisicao():
+    return {"linhas": 0, "etapas": defaultdict(float)}
+
+
+def contar_linhas(quantidade):
+    estado = requisicao_atual.get()
+    if estado is not None:
+        estado["linhas"] += quantidade
+
+
+@contextmanager
+def etapa(nome):
+    # soma o tempo da etapa na requisição atual; o middleware observa no fim, já com a rota
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        estado = requisicao_atual.get()
+        if estado is not None:
+            estado["etapas"][nome] += time.perf_counter() - inicio
+
+
+def observar_etapas(estado, rota):
+    for nome, segundos in estado["etapas"].items():
+        etapas.observar(segundos, rota=rota, etapa=nome)
+
+
+# === BANCO (ganchos do SQLAlchemy) ===
+consultas = Histograma("consumo_sql_segundos", "Tempo de execução dos comandos SQL", ("operacao", "tabela"))
+erros_sql = Contador("consumo_sql_erros_total", "Comandos SQL que falharam", ("operacao", "tabela"))
+linhas_sql = Contador("consumo_sql_linhas_total", "Linhas afetadas por INSERT/UPDATE/DELETE", ("operacao", "tabela"))
+espera_pool = Histograma("consumo_pool_espera_segundos", "Espera para obter uma conexão do pool", ("engine",))
+
+# === UI (Streamlit) ===
+consultas_ui = Histograma("consumo_ui_consulta_segundos", "Consultas da UI, incluindo a conversão para DataFrame",
+                          ("consulta",))
+renders_ui = Histograma("consumo_ui_render_segundos", "Tempo de execução de cada página da UI", ("pagina",))
+
+
+PADRAO_SQL = re.compile(
+    r"^\s*(?:(SELECT)\b.*?\bFROM\s+\"?(\w+)|(INSERT)\s+(?:OR\s+\w+\s+)?INTO\s+\"?(\w+)"
+    r"|(UPDATE)\s+\"?(\w+)|(DELETE)\s+FROM\s+\"?(\w+)|(\w+))",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def classificar(sql):
+    # (operação, tabela principal): rótulos de cardinalidade baixa, em vez do SQL inteiro
+    encontrado = PADRAO_SQL.match(sql)
+    if not encontrado:
+        return "outro", ""
+    grupos = [g for g in encontrado.groups() if g]
+    operacao = grupos[0].upper()
+    return operacao, grupos[1] if len(grupos) > 1 else ""
+
+
+def antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inicio_sql", []).append(time.perf_counter())
+
+
+def depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    segundos = time.perf_counter() - conn.info["inicio_sql"].pop()
+    operacao, tabela = classificar(statement)
+    consultas.observar(segundos, operacao=operacao, tabela=tabela)
+    if operacao in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount > 0:
+        linhas_sql.inc(cursor.rowcount, operacao=operacao, tabela=tabela)
+    if config.LIMITE_CONSULTA_LENTA_MS and segundos * 1000 >= config.LIMITE_CONSULTA_LENTA_MS:
+        log.warning("Consulta lenta (%.1f ms): %s", segundos * 1000, " ".join(statement.split())[:500])
+
+
+def ao_falhar(contexto):
+    conn = contexto.connection
+    if conn is not None and conn.info.get("inicio_sql"):
+        conn.info["inicio_sql"].pop()
+    operacao, tabela = classificar(contexto.statement or "")
+    erros_sql.inc(operacao=operacao, tabela=tabela)
+
+
+class MedeEspera:
+    # _do_get é onde o pool bloqueia esperando uma conexão livre (ou abre uma nova)
+    nome_engine = "sync"
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            espera_pool.observar(time.perf_counter() - inicio, engine=self.nome_engine)
+
+
+class PoolMedido(MedeEspera, QueuePool):
+    pass
+
+
+class PoolMedidoAsync(MedeEspera, AsyncAdaptedQueuePool):
+    nome_engine = "async"
+
+
+def instrumentar_engine(engine):
+    # recebe o engine síncrono (para o assíncrono, engine.sync_engine)
+    event.listen(engine, "before_cursor_execute", antes_de_executar)
+    event.listen(engine, "after_cursor_execute", depois_de_executar)
+    event.listen(engine, "handle_error", ao_falhar)
@@ -0,0 +1,497 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import math
+from collections import defaultdict
+
+from api import config, db
+
+
+# A versão do esquema fica em PRAGMA user_version, no próprio arquivo do banco.
+# Cada migração roda em uma transação junto com a atualização da versão.
+# As migrações não chamam o código dos outros módulos: o que elas fazem com os dados
+# fica escrito aqui, no esquema da própria versão, e não muda quando aqueles módulos mudam.
+
+
+def colunas(conn, tabela):
+    return [linha[1] for linha in conn.exec_driver_sql(f"PRAGMA table_info({tabela})")]
+
+
+def incrementar_versoes(conn, *tabelas):
+    for tabela in tabelas:
+        conn.exec_driver_sql(
+            "INSERT INTO versao_tabela (tabela, versao) VALUES (?, 1) "
+            "ON CONFLICT (tabela) DO UPDATE SET versao = versao + 1", (tabela,))
+
+
+def recriar_tabela(conn, tabela, ddl, colunas_copiadas, ordem):
+    # SQLite não adiciona PRIMARY KEY com ALTER TABLE: cria a nova tabela, copia e renomeia
+    nova = f"{tabela}_nova"
+    conn.exec_driver_sql(ddl.format(tabela=nova))
+    lista = ", ".join(colunas_copiadas)
+    conn.exec_driver_sql(f"INSERT INTO {nova} ({lista}) SELECT {lista} FROM {tabela} ORDER BY {ordem}")
+    conn.exec_driver_sql(f"DROP TABLE {tabela}")
+    conn.exec_driver_sql(f"ALTER TABLE {nova} RENAME TO {tabela}")
+
+
+DDL_PRODUTO = """CREATE TABLE IF NOT EXISTS {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY,
+    nome VARCHAR NOT NULL,
+    unidade VARCHAR NOT NULL,
+    quantidade_restante FLOAT NOT NULL,
+    quantidade_total FLOAT NOT NULL,
+    quantidade_estoque INTEGER NOT NULL,
+    preco_unitario FLOAT NOT NULL,
+    data_compra DATE NOT NULL
+)"""
+
+DDL_COMPRA = """CREATE TABLE IF NOT EXISTS {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    produto_id INTEGER NOT NULL,
+    produto_nome VARCHAR NOT NULL,
+    quantidade FLOAT NOT NULL,
+    gasto_total FLOAT NOT NULL,
+    data DATE NOT NULL
+)"""
+
+DDL_ATIVIDADE = """CREATE TABLE IF NOT EXISTS {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    produto_id INTEGER NOT NULL,
+    produto_nome INTEGER NOT NULL,
+    atividade VARCHAR NOT NULL,
+    porcentagem_gasto FLOAT NOT NULL,
+    consumo FLOAT NOT NULL,
+    data DATE NOT NULL
+)"""
+
+DDL_CONSUMO_AGUA = """CREATE TABLE IF NOT EXISTS {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    atividade VARCHAR NOT NULL,
+    volume_litros FLOAT NOT NULL,
+    timestamp DATETIME NOT NULL
+)"""
+
+DDL_CONSUMO_ENERGIA = """CREATE TABLE IF NOT EXISTS {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    equipamento VARCHAR NOT NULL,
+    potencia_w FLOAT NOT NULL,
+    gasto_h FLOAT NOT NULL,
+    timestamp DATETIME NOT NULL
+)"""
+
+
+# === MIGRAÇÕES ===
+def m001_chaves_primarias(conn):
+    for tabela, ddl in [("produto", DDL_PRODUTO), ("compra", DDL_COMPRA), ("atividade", DDL_ATIVIDADE)]:
+        conn.exec_driver_sql(ddl.format(tabela=tabela))
+
+    consumos = [
+        ("consumo_agua", DDL_CONSUMO_AGUA, ["usuario_id", "atividade", "volume_litros", "timestamp"]),
+        ("consumo_energia", DDL_CONSUMO_ENERGIA, ["usuario_id", "equipamento", "potencia_w", "gasto_h", "timestamp"]),
+    ]
+    for tabela, ddl, copiadas in consumos:
+        existentes = colunas(conn, tabela)
+        if not existentes:
+            conn.exec_driver_sql(ddl.format(tabela=tabela))
+        elif "id" not in existentes:
+            recriar_tabela(conn, tabela, ddl, copiadas, "timestamp")
+
+
+def m002_indices_series_temporais(conn):
+    indices = [
+        ("ix_consumo_agua_timestamp", "consumo_agua", "timestamp"),
+        ("ix_consumo_agua_atividade_timestamp", "consumo_agua", "atividade, timestamp"),
+        ("ix_consumo_agua_usuario_timestamp", "consumo_agua", "usuario_id, timestamp"),
+        ("ix_consumo_energia_timestamp", "consumo_energia", "timestamp"),
+        ("ix_consumo_energia_equipamento_timestamp", "consumo_energia", "equipamento, timestamp"),
+        ("ix_consumo_energia_usuario_timestamp", "consumo_energia", "usuario_id, timestamp"),
+        ("ix_compra_produto_id", "compra", "produto_id"),
+        ("ix_compra_data", "compra", "data"),
+        ("ix_atividade_produto_id", "atividade", "produto_id"),
+        ("ix_atividade_data", "atividade", "data"),
+    ]
+    for nome, tabela, cols in indices:
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({cols})")
+    conn.exec_driver_sql("ANALYZE")
+
+
+def m003_rollups(conn):
+    for tabela, dimensao, valor in [("rollup_agua", "atividade", "volume_litros"),
+                                    ("rollup_energia", "equipamento", "gasto_h")]:
+        conn.exec_driver_sql(f"""CREATE TABLE IF NOT EXISTS {tabela} (
+    granularidade VARCHAR NOT NULL,
+    periodo DATE NOT NULL,
+    usuario_id INTEGER NOT NULL,
+    {dimensao} VARCHAR NOT NULL,
+    {valor} FLOAT NOT NULL,
+    leituras INTEGER NOT NULL,
+    PRIMARY KEY (granularidade, periodo, usuario_id, {dimensao})
+)""")
+    # SQL próprio (e não rollups.reconstruir_rollups): o esquema das leituras aqui ainda é o da versão 2
+    for tabela, origem, dimensao, valor in [("rollup_agua", "consumo_agua", "atividade", "volume_litros"),
+                                            ("rollup_energia", "consumo_energia", "equipamento", "gasto_h")]:
+        for granularidade, periodo in [("dia", "date(timestamp)"), ("mes", "date(timestamp, 'start of month')")]:
+            conn.exec_driver_sql(f"""INSERT INTO {tabela} (granularidade, periodo, usuario_id, {dimensao}, {valor}, leituras)
+SELECT '{granularidade}', {periodo}, usuario_id, {dimensao}, sum({valor}), count(*)
+FROM {origem} GROUP BY {periodo}, usuario_id, {dimensao}""")
+
+
+def m004_versao_tabela(conn):
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS versao_tabela (
+    tabela VARCHAR NOT NULL PRIMARY KEY,
+    versao INTEGER NOT NULL
+)""")
+
+
+def m005_arquivamento(conn):
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS arquivamento (
+    tabela VARCHAR NOT NULL PRIMARY KEY,
+    arquivado_ate DATETIME,
+    corte DATETIME,
+    linhas INTEGER NOT NULL
+)""")
+
+
+def m006_estoque(conn):
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS estoque (
+    produto_id INTEGER NOT NULL PRIMARY KEY,
+    inicial FLOAT NOT NULL,
+    comprado FLOAT NOT NULL,
+    consumido FLOAT NOT NULL,
+    quantidade FLOAT NOT NULL,
+    compras INTEGER NOT NULL,
+    consumos INTEGER NOT NULL,
+    primeiro_consumo DATE,
+    ultimo_consumo DATE
+)""")
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS estoque_diario (
+    produto_id INTEGER NOT NULL,
+    dia DATE NOT NULL,
+    comprado FLOAT NOT NULL,
+    consumido FLOAT NOT NULL,
+    PRIMARY KEY (produto_id, dia)
+)""")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_estoque_diario_dia ON estoque_diario (dia)")
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS estoque_aplicado (
+    origem VARCHAR NOT NULL PRIMARY KEY,
+    ultimo_id INTEGER NOT NULL
+)""")
+    # quantidade_restante ainda é a do cadastro: vira o estoque inicial de cada produto.
+    # Compras somam quantidade x tamanho da embalagem (de um produto já cadastrado) e
+    # atividades subtraem o consumo (mesmo estado que api/estoque.py mantinha na versão 6)
+    conn.exec_driver_sql("""INSERT INTO estoque_diario (produto_id, dia, comprado, consumido)
+SELECT produto_id, dia, sum(comprado), sum(consumido) FROM (
+    SELECT c.produto_id, date(c.data) AS dia, c.quantidade * coalesce(p.quantidade_total, 0.0) AS comprado,
+           0.0 AS consumido
+    FROM compra c LEFT JOIN produto p ON p.id = c.produto_id
+    UNION ALL
+    SELECT produto_id, date(data), 0.0, consumo FROM atividade
+) GROUP BY produto_id, dia""")
+    conn.exec_driver_sql("""INSERT INTO estoque (produto_id, inicial, comprado, consumido, quantidade, compras, consumos,
+                     primeiro_consumo, ultimo_consumo)
+SELECT i.produto_id, coalesce(p.quantidade_restante, 0.0), coalesce(d.comprado, 0.0), coalesce(d.consumido, 0.0),
+       coalesce(p.quantidade_restante, 0.0) + coalesce(d.comprado, 0.0) - coalesce(d.consumido, 0.0),
+       (SELECT count(*) FROM compra c WHERE c.produto_id = i.produto_id),
+       (SELECT count(*) FROM atividade a WHERE a.produto_id = i.produto_id),
+       d.primeiro_consumo, d.ultimo_consumo
+FROM (SELECT id AS produto_id FROM produto UNION SELECT produto_id FROM compra UNION SELECT produto_id FROM atividade) i
+LEFT JOIN produto p ON p.id = i.produto_id
+LEFT JOIN (
+    SELECT produto_id, sum(comprado) AS comprado, sum(consumido) AS consumido,
+           min(CASE WHEN consumido THEN dia END) AS primeiro_consumo,
+           max(CASE WHEN consumido THEN dia END) AS ultimo_consumo
+    FROM estoque_diario GROUP BY produto_id
+) d ON d.produto_id = i.produto_id""")
+    for origem in ("produto", "compra", "atividade"):
+        conn.exec_driver_sql(f"INSERT INTO estoque_aplicado (origem, ultimo_id) SELECT '{origem}', coalesce(max(id), 0) FROM {origem}")
+    # o cadastro (produto) não é alterado: o estoque derivado fica só nas tabelas acima
+    incrementar_versoes(conn, "estoque")
+
+
+DDL_ATIVIDADE_V7 = """CREATE TABLE {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL,
+    produto_id INTEGER NOT NULL,
+    produto_nome VARCHAR NOT NULL,
+    atividade VARCHAR NOT NULL,
+    porcentagem_gasto FLOAT NOT NULL,
+    consumo FLOAT NOT NULL,
+    data DATE NOT NULL
+)"""
+
+
+def m007_dimensoes(conn):
+    # (dimensão, leituras, rollup, coluna do nome, coluna somada no rollup, colunas das leituras, índices);
+    # na lista de colunas, None marca onde entra o id da dimensão
+    normalizadas = [
+        ("atividade_tipo", "consumo_agua", "rollup_agua", "atividade", "volume_litros",
+         ["id INTEGER NOT NULL PRIMARY KEY", "usuario_id INTEGER NOT NULL", None,
+          "volume_litros FLOAT NOT NULL", "timestamp DATETIME NOT NULL"],
+         [("ix_consumo_agua_timestamp", "timestamp"),
+          ("ix_consumo_agua_atividade_timestamp", "atividade_id, timestamp"),
+          ("ix_consumo_agua_usuario_timestamp", "usuario_id, timestamp")]),
+        ("equipamento", "consumo_energia", "rollup_energia", "equipamento", "gasto_h",
+         ["id INTEGER NOT NULL PRIMARY KEY", "usuario_id INTEGER NOT NULL", None,
+          "potencia_w FLOAT NOT NULL", "gasto_h FLOAT NOT NULL", "timestamp DATETIME NOT NULL"],
+         [("ix_consumo_energia_timestamp", "timestamp"),
+          ("ix_consumo_energia_equipamento_timestamp", "equipamento_id, timestamp"),
+          ("ix_consumo_energia_usuario_timestamp", "usuario_id, timestamp")]),
+    ]
+    for dimensao, leituras, rollup, nome, valor, definicao_leituras, indices in normalizadas:
+        conn.exec_driver_sql(f"""CREATE TABLE IF NOT EXISTS {dimensao} (
+    id INTEGER NOT NULL PRIMARY KEY,
+    nome VARCHAR NOT NULL UNIQUE
+)""")
+        # os nomes das leituras já arquivadas só existem no rollup
+        conn.exec_driver_sql(f"""INSERT OR IGNORE INTO {dimensao} (nome)
+SELECT {nome} FROM {leituras} UNION SELECT {nome} FROM {rollup} ORDER BY 1""")
+
+        id_dimensao = f"{nome}_id INTEGER NOT NULL REFERENCES {dimensao} (id)"
+        definicao_rollup = ["granularidade VARCHAR NOT NULL", "periodo DATE NOT NULL", "usuario_id INTEGER NOT NULL",
+                            None, f"{valor} FLOAT NOT NULL", "leituras INTEGER NOT NULL"]
+        for tabela, definicao, chave in [(leituras, definicao_leituras, None),
+                                         (rollup, definicao_rollup, f"granularidade, periodo, usuario_id, {nome}_id")]:
+            definicao = [id_dimensao if d is None else d for d in definicao]
+            destino = [d.split()[0] for d in definicao]
+            origem = ["d.id" if c == f"{nome}_id" else f"t.{c}" for c in destino]
+            if chave:
+                definicao.append(f"PRIMARY KEY ({chave})")
+            conn.exec_driver_sql(f"CREATE TABLE {tabela}_nova (\n    " + ",\n    ".join(definicao) + "\n)")
+            # os ids das leituras são mantidos: cursores e partes já arquivadas continuam valendo
+            conn.exec_driver_sql(
+                f"INSERT INTO {tabela}_nova ({', '.join(destino)}) SELECT {', '.join(origem)} "
+                f"FROM {tabela} t JOIN {dimensao} d ON d.nome = t.{nome}"
+            )
+            conn.exec_driver_sql(f"DROP TABLE {tabela}")
+            conn.exec_driver_sql(f"ALTER TABLE {tabela}_nova RENAME TO {tabela}")
+        for indice, cols in indices:
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {indice} ON {leituras} ({cols})")
+
+    # atividade.produto_nome estava declarada INTEGER: nomes numéricos viravam números
+    recriar_tabela(conn, "atividade", DDL_ATIVIDADE_V7, ["id", "usuario_id", "produto_id", "produto_nome", "atividade",
+                                                         "porcentagem_gasto", "consumo", "data"], "id")
+    conn.exec_driver_sql("UPDATE atividade SET produto_nome = CAST(produto_nome AS TEXT)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_atividade_produto_id ON atividade (produto_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_atividade_data ON atividade (data)")
+    conn.exec_driver_sql("ANALYZE")
+
+
+def m008_anomalias(conn):
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS anomalia_estado (
+    tabela VARCHAR NOT NULL,
+    usuario_id INTEGER NOT NULL,
+    dimensao_id INTEGER NOT NULL,
+    leituras INTEGER NOT NULL,
+    media FLOAT NOT NULL,
+    variancia FLOAT NOT NULL,
+    cusum FLOAT NOT NULL,
+    em_deriva BOOLEAN NOT NULL,
+    ultima_leitura DATETIME NOT NULL,
+    PRIMARY KEY (tabela, usuario_id, dimensao_id)
+)""")
+    conn.exec_driver_sql("""CREATE TABLE IF NOT EXISTS alerta (
+    id INTEGER NOT NULL PRIMARY KEY,
+    tabela VARCHAR NOT NULL,
+    usuario_id INTEGER NOT NULL,
+    dimensao_id INTEGER NOT NULL,
+    tipo VARCHAR NOT NULL,
+    teste VARCHAR NOT NULL,
+    timestamp DATETIME NOT NULL,
+    valor FLOAT NOT NULL,
+    esperado FLOAT NOT NULL,
+    escore FLOAT NOT NULL
+)""")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_alerta_timestamp ON alerta (timestamp)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_alerta_usuario_timestamp ON alerta (usuario_id, timestamp)")
+    # o histórico já gravado é lido uma vez aqui, sem gerar alertas para o passado;
+    # depois o estado só é atualizado a cada escrita (api/anomalias.py)
+    for tabela, dimensao, valor in [("consumo_agua", "atividade_id", "volume_litros"),
+                                    ("consumo_energia", "equipamento_id", "gasto_h")]:
+        estados = defaultdict(lambda: {"leituras": 0, "media": 0.0, "variancia": 0.0, "cusum": 0.0,
+                                       "em_deriva": False, "ultima_leitura": None})
+        resultado = conn.exec_driver_sql(
+            f"SELECT usuario_id, {dimensao}, {valor}, timestamp FROM {tabela} ORDER BY timestamp, id")
+        while lote := resultado.fetchmany(50_000):
+            for usuario_id, dimensao_id, v, timestamp in lote:
+                estado = estados[(usuario_id, dimensao_id)]
+                m008_observar(estado, v)
+                if estado["ultima_leitura"] is None or timestamp > estado["ultima_leitura"]:
+                    estado["ultima_leitura"] = timestamp
+        if estados:
+            conn.exec_driver_sql(
+                "INSERT INTO anomalia_estado (tabela, usuario_id, dimensao_id, leituras, media, variancia, cusum, "
+                "em_deriva, ultima_leitura) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(tabela, u, d, e["leituras"], e["media"], e["variancia"], e["cusum"], e["em_deriva"],
+                  e["ultima_leitura"]) for (u, d), e in estados.items()],
+            )
+    incrementar_versoes(conn, "alerta")
+
+
+def m008_observar(estado, valor):
+    # EWMA do log do valor e CUSUM do escore, como na versão 8 de api/anomalias.py
+    # parâmetros fixos, os padrões de quando a migração foi escrita: mudar a configuração
+    # depois não pode mudar o que uma migração já aplicada produz
+    piso, desvio_minimo, folga = 1e-3, 0.05, 0.5
+    aquecimento, limiar, limiar_nivel, alfa = 20, 4.0, 6.0, 0.05
+    x = math.log(max(valor, 0.0) + piso)
+    desvio = max(math.sqrt(estado["variancia"]), desvio_minimo)
+    escore = (x - estado["media"]) / desvio
+    if estado["leituras"] >= aquecimento:
+        if escore > limiar:
+            escore = limiar
+            x = estado["media"] + escore * desvio
+        estado["cusum"] = max(0.0, estado["cusum"] + escore - folga)
+        if estado["cusum"] > limiar_nivel and not estado["em_deriva"]:
+            estado["em_deriva"] = True
+        elif estado["em_deriva"] and estado["cusum"] == 0.0:
+            estado["em_deriva"] = False
+    estado["leituras"] += 1
+    peso = max(alfa, 1 / estado["leituras"])
+    diferenca = x - estado["media"]
+    estado["media"] += peso * diferenca
+    estado["variancia"] = (1 - peso) * (estado["variancia"] + peso * diferenca * diferenca)
+
+
+DDL_LEITURAS_V9 = {
+    "consumo_agua": ("""CREATE TABLE {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    usuario_id INTEGER NOT NULL,
+    atividade_id INTEGER NOT NULL REFERENCES atividade_tipo (id),
+    volume_litros FLOAT NOT NULL,
+    timestamp DATETIME NOT NULL
+)""", [("ix_consumo_agua_timestamp", "timestamp"),
+       ("ix_consumo_agua_atividade_timestamp", "atividade_id, timestamp"),
+       ("ix_consumo_agua_usuario_timestamp", "usuario_id, timestamp")]),
+    "consumo_energia": ("""CREATE TABLE {tabela} (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    usuario_id INTEGER NOT NULL,
+    equipamento_id INTEGER NOT NULL REFERENCES equipamento (id),
+    potencia_w FLOAT NOT NULL,
+    gasto_h FLOAT NOT NULL,
+    timestamp DATETIME NOT NULL
+)""", [("ix_consumo_energia_timestamp", "timestamp"),
+       ("ix_consumo_energia_equipamento_timestamp", "equipamento_id, timestamp"),
+       ("ix_consumo_energia_usuario_timestamp", "usuario_id, timestamp")]),
+}
+
+
+def maior_id_arquivado(tabela, pasta):
+    # as partes do arquivo se chamam parte-<primeiro id>-<último id>.parquet (mes=AAAA-MM/)
+    maior = 0
+    raiz = os.path.join(pasta, tabela)
+    if not os.path.isdir(raiz):
+        return maior
+    for particao in os.listdir(raiz):
+        if not particao.startswith("mes="):
+            continue
+        for nome in os.listdir(os.path.join(raiz, particao)):
+            if nome.startswith("parte-") and nome.endswith(".parquet"):
+                maior = max(maior, int(nome[:-len(".parquet")].split("-")[2]))
+    return maior
+
+
+def m009_ids_sem_reuso(conn):
+    # sem AUTOINCREMENT o SQLite reusa os ids mais altos depois que eles são apagados, e o
+    # arquivamento apaga as leituras antigas: a próxima leitura receberia o id de uma que
+    # está no Parquet. Com AUTOINCREMENT o maior id fica em sqlite_sequence e nunca volta;
+    # a sequência começa acima do maior id do banco e do arquivo. A pasta do arquivo é a
+    # deste banco, passada por quem aplica as migrações (nunca a da configuração do momento)
+    pasta = conn.info.get("pasta_arquivo")
+    for tabela, (ddl, indices) in DDL_LEITURAS_V9.items():
+        arquivadas = conn.exec_driver_sql("SELECT linhas FROM arquivamento WHERE tabela = ?", (tabela,)).scalar()
+        if arquivadas and pasta is None:
+            raise RuntimeError(f"{tabela} tem {arquivadas} leituras arquivadas: informe a pasta do arquivo "
+                               f"deste banco (python -m api.migracoes --pasta-arquivo)")
+        recriar_tabela(conn, tabela, ddl, colunas(conn, tabela), "id")
+        for indice, cols in indices:
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {indice} ON {tabela} ({cols})")
+        maior = max(conn.exec_driver_sql(f"SELECT coalesce(max(id), 0) FROM {tabela}").scalar(),
+                    maior_id_arquivado(tabela, pasta) if pasta else 0)
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (tabela,))
+        conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (tabela, maior))
+
+
+MIGRACOES = [
+    (1, "chaves primárias em consumo_agua e consumo_energia", m001_chaves_primarias),
+    (2, "índices de série temporal", m002_indices_series_temporais),
+    (3, "rollups diários e mensais", m003_rollups),
+    (4, "contador de versão por tabela", m004_versao_tabela),
+    (5, "estado do arquivamento de leituras antigas", m005_arquivamento),
+    (6, "estoque incremental dos produtos de higiene", m006_estoque),
+    (7, "tabelas de dimensão para atividade e equipamento", m007_dimensoes),
+    (8, "estado da detecção de anomalias e alertas", m008_anomalias),
+    (9, "ids das leituras nunca reusados (AUTOINCREMENT)", m009_ids_sem_reuso),
+]
+
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+
+
+def versao_atual(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def aplicar_migracoes(engine, ate=VERSAO_ESQUEMA, pasta_arquivo=None):
+    # pasta_arquivo: o arquivo Parquet deste banco (api/arquivo.py), usado pela migração 9
+    aplicadas = []
+    for versao, descricao, migracao in MIGRACOES:
+        if versao > ate or versao <= versao_atual(engine):
+            continue
+        with engine.connect() as conn:
+            # BEGIN explícito: o driver sqlite3 não abre transação sozinho antes de DDL
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            # relida já com a trava de escrita: outro processo (outro worker, o preparo de um
+            # shard) pode ter aplicado esta versão entre a leitura acima e o BEGIN
+            if conn.exec_driver_sql("PRAGMA user_version").scalar() >= versao:
+                conn.rollback()
+                continue
+            conn.info["pasta_arquivo"] = pasta_arquivo
+            migracao(conn)
+            conn.info.pop("pasta_arquivo")
+            conn.exec_driver_sql(f"PRAGMA user_version = {versao}")
+            conn.commit()
+        aplicadas.append((versao, descricao))
+    return aplicadas
+
+
+def verificar_versao(engine):
+    # devolve uma mensagem de aviso se o banco estiver desatualizado
+    versao = versao_atual(engine)
+    if versao < VERSAO_ESQUEMA:
+        return (f"Esquema do banco na versão {versao}, esperado {VERSAO_ESQUEMA}. "
+                f"Rode: python -m api.migracoes")
+    if versao > VERSAO_ESQUEMA:
+        return f"Esquema do banco na versão {versao}, mais nova que a do código ({VERSAO_ESQUEMA})."
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica as migrações de esquema do banco de consumo")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--ate", type=int, default=VERSAO_ESQUEMA, help="versão alvo")
+    parser.add_argument("--pasta-arquivo", default=config.ARQUIVO_DIR,
+                        help="arquivo Parquet das leituras antigas deste banco (python -m api.arquivo --pasta)")
+    parser.add_argument("--status", action="store_true", help="só mostra a versão atual")
+    args = parser.parse_args()
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    if args.status:
+        print(f"Versão atual: {versao_atual(engine)} (código: {VERSAO_ESQUEMA})")
+        return
+    aplicadas = aplicar_migracoes(engine, args.ate, os.path.abspath(args.pasta_arquivo))
+    for versao, descricao in aplicadas:
+        print(f"✅ {versao}: {descricao}")
+    if not aplicadas:
+        print(f"Nada a fazer, banco na versão {versao_atual(engine)}")
+
+
+if __name__ == "__main__":
+    main()
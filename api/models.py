@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
 
 class ConsumoAgua(BaseModel):
@@ -41,4 +41,15 @@ class Atividade_gasto(BaseModel):
     consumo: float
     data: datetime
 
- 
\ No newline at end of file
+
+def validar_lote(modelo, itens):
+    # valida cada item separadamente para que uma linha ruim não derrube o lote todo
+    linhas, resultados = [], []
+    for indice, item in enumerate(itens):
+        try:
+            linhas.append(modelo.model_validate(item).model_dump())
+            resultados.append({"indice": indice, "status": "aceito"})
+        except ValidationError as err:
+            erro = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors())
+            resultados.append({"indice": indice, "status": "rejeitado", "erro": erro})
+    return linhas, resultados
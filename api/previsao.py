@@ -0,0 +1,260 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import pickle
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDRegressor
+from sqlalchemy import func, select
+
+from api import config, db, versoes
+from api.rollups import ROLLUPS
+from api.tables import compra_tbl
+
+# Previsão do consumo dos próximos dias, um modelo linear por série (tabela, usuário),
+# treinado sobre os totais diários. Os modelos ficam num arquivo e são atualizados
+# com partial_fit só com os dias novos: nada é retreinado sobre o histórico inteiro.
+# O ponto de partida é o nível recente (média dos últimos dias); o modelo aprende a
+# correção sobre ele a partir do dia da semana e do próprio nível. Tudo é dividido pela
+# escala da série para que o SGD funcione em séries de tamanhos diferentes.
+# Os modelos têm um único escritor (a tarefa periódica da API ou python -m api.previsao);
+# as leituras (GET /previsoes, dashboards) só carregam o arquivo.
+
+# tabela -> (coluna prevista, unidade)
+SERIES = {
+    "consumo_agua": ("volume_litros", "L"),
+    "consumo_energia": ("gasto_h", "kWh"),
+    "compra": ("gasto_total", "R$"),
+}
+
+VERSAO_MODELO = 1  # muda junto com as features: modelos gravados com outra versão são descartados
+JANELA_NIVEL = 28
+HORIZONTE_DIAS = 30
+
+ARQUIVO_MODELOS = "previsao.pkl"
+
+# caminho do arquivo de modelos -> (mtime do arquivo, previsões já calculadas)
+em_memoria = {}
+# caminho do arquivo de modelos -> (dia, versões das séries) da última verificação do escritor
+verificados = {}
+
+
+def caminho_modelos(pasta=None):
+    return os.path.join(pasta or config.MODELOS_DIR, ARQUIVO_MODELOS)
+
+
+def estado_vazio():
+    return {"versao_modelo": VERSAO_MODELO, "tabelas": {
+        tabela: {"ultimo_dia": None, "series": {}} for tabela in SERIES
+    }}
+
+
+def carregar_modelos(pasta=None):
+    caminho = caminho_modelos(pasta)
+    if not os.path.exists(caminho):
+        return estado_vazio()
+    with open(caminho, "rb") as f:
+        estado = pickle.load(f)
+    return estado if estado.get("versao_modelo") == VERSAO_MODELO else estado_vazio()
+
+
+def salvar_modelos(estado, pasta=None):
+    caminho = caminho_modelos(pasta)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    # temporário por processo e troca atômica: quem lê nunca vê um arquivo pela metade
+    temporario = os.path.join(os.path.dirname(caminho), f".{ARQUIVO_MODELOS}.{os.getpid()}.tmp")
+    with open(temporario, "wb") as f:
+        pickle.dump(estado, f)
+    os.replace(temporario, caminho)
+
+
+def totais_diarios(conn, tabela, desde=None):
+    # só dias completos (antes de hoje); desde: último dia já incorporado aos modelos
+    if tabela in ROLLUPS:
+        tbl, _, valor = ROLLUPS[tabela]
+        dia = tbl.c.periodo
+        sel = (
+            select(tbl.c.usuario_id, dia.label("dia"), func.sum(tbl.c[valor]).label("total"))
+            .where(tbl.c.granularidade == "dia", dia < func.date("now"))
+        )
+        if desde:
+            sel = sel.where(dia > desde)
+        usuario = tbl.c.usuario_id
+    else:
+        dia = func.date(compra_tbl.c.data)
+        sel = (
+            select(compra_tbl.c.usuario_id, dia.label("dia"), func.sum(compra_tbl.c.gasto_total).label("total"))
+            .where(dia < func.date("now"))
+        )
+        if desde:
+            sel = sel.where(dia > desde.isoformat())
+        usuario = compra_tbl.c.usuario_id
+    df = pd.read_sql(sel.group_by(usuario, dia), conn)
+    df["dia"] = pd.to_datetime(df["dia"]).dt.date
+    return df
+
+
+def dias_da_semana(dias):
+    return np.eye(7)[[d.weekday() for d in dias]]
+
+
+def niveis(historico, inicio, n):
+    # média dos JANELA_NIVEL valores anteriores a cada posição inicio..inicio+n-1
+    acumulado = np.concatenate(([0.0], np.cumsum(historico)))
+    fins = np.arange(inicio, inicio + n)
+    inicios = np.maximum(fins - JANELA_NIVEL, 0)
+    return (acumulado[fins] - acumulado[inicios]) / np.maximum(fins - inicios, 1)
+
+
+def nova_serie(valores):
+    media = float(np.mean(valores))
+    return {
+        "modelo": SGDRegressor(loss="huber", epsilon=1.0, learning_rate="constant", eta0=0.01, alpha=1e-4, random_state=0),
+        "escala": media if media > 0 else 1.0,
+        "recentes": np.zeros(0),
+        "dias": 0,
+    }
+
+
+def treinar_serie(serie, dias, valores):
+    # dias consecutivos com o total de cada um (zero onde não houve consumo)
+    historico = np.concatenate((serie["recentes"], valores))
+    nivel = niveis(historico, len(serie["recentes"]), len(valores)) / serie["escala"]
+    x = np.column_stack((dias_da_semana(dias), nivel))
+    serie["modelo"].partial_fit(x, valores / serie["escala"] - nivel)
+    serie["recentes"] = historico[-JANELA_NIVEL:]
+    serie["dias"] += len(valores)
+
+
+def atualizar_tabela(conn, tabela, estado):
+    ultimo_dia = estado["ultimo_dia"]
+    novos = totais_diarios(conn, tabela, ultimo_dia)
+    if novos.empty:
+        return 0
+    fim = novos["dia"].max()
+    # todas as séries andam até o mesmo dia: quem não consumiu nada recebe zeros
+    grade = pd.date_range(ultimo_dia + timedelta(days=1) if ultimo_dia else novos["dia"].min(), fim).date
+    tabela_dias = novos.pivot_table(index="usuario_id", columns="dia", values="total", aggfunc="sum")
+    usuarios = set(tabela_dias.index) | set(estado["series"])
+    tabela_dias = tabela_dias.reindex(index=sorted(usuarios), columns=grade, fill_value=0).fillna(0)
+    for usuario_id, linha in tabela_dias.iterrows():
+        valores = linha.to_numpy(dtype=float)
+        serie = estado["series"].get(usuario_id)
+        if serie is None:
+            # série nova começa no seu primeiro dia com consumo
+            com_consumo = np.flatnonzero(valores)
+            if not len(com_consumo):
+                continue
+            primeiro = com_consumo[0]
+            serie = estado["series"][usuario_id] = nova_serie(valores[primeiro:])
+            treinar_serie(serie, grade[primeiro:], valores[primeiro:])
+        else:
+            treinar_serie(serie, grade, valores)
+    estado["ultimo_dia"] = fim
+    return len(grade)
+
+
+def atualizar(engine, pasta=None, refazer=False):
+    # incorpora os dias novos; as leituras que chegam atrasadas para um dia já
+    # incorporado só entram com --refazer. O arquivo só é regravado se algo mudou, e a
+    # versão "previsao" (caches e ETags) sobe depois, numa transação própria
+    estado = estado_vazio() if refazer else carregar_modelos(pasta)
+    with engine.connect() as conn:
+        novos = {tabela: atualizar_tabela(conn, tabela, estado["tabelas"][tabela]) for tabela in SERIES}
+    if any(novos.values()) or refazer:
+        salvar_modelos(estado, pasta)
+        with engine.begin() as conn:
+            versoes.incrementar(conn, "previsao")
+    return estado, novos
+
+
+def atualizar_se_preciso(engine, pasta=None):
+    # chamado periodicamente pelo escritor: só relê os totais quando chegou dado novo
+    # ou virou o dia (o dia de ontem ficou completo)
+    with engine.connect() as conn:
+        atuais = versoes.ler_versoes(conn)
+    marca = (date.today(), tuple(atuais.get(t, 0) for t in SERIES))
+    caminho = caminho_modelos(pasta)
+    if verificados.get(caminho) == marca:
+        return None
+    _, novos = atualizar(engine, pasta)
+    verificados[caminho] = marca
+    return novos
+
+
+def prever_todos(estado, horizonte=HORIZONTE_DIAS):
+    # pontua todas as séries de todas as tabelas de uma vez: coeficientes empilhados
+    # numa matriz (séries x features) contra as features de cada dia do horizonte
+    chaves, pesos, interceptos, escalas, niveis_atuais, inicios = [], [], [], [], [], []
+    for tabela, dados in estado["tabelas"].items():
+        if not dados["ultimo_dia"]:
+            continue
+        for usuario_id, serie in dados["series"].items():
+            chaves.append((tabela, usuario_id))
+            pesos.append(serie["modelo"].coef_)
+            interceptos.append(serie["modelo"].intercept_[0])
+            escalas.append(serie["escala"])
+            niveis_atuais.append(serie["recentes"].mean() / serie["escala"])
+            inicios.append(dados["ultimo_dia"] + timedelta(days=1))
+    if not chaves:
+        return pd.DataFrame(columns=["tabela", "usuario_id", "inicio", "fim", "previsto", "media_recente"])
+
+    pesos = np.asarray(pesos)
+    escalas = np.asarray(escalas)
+    niveis_atuais = np.asarray(niveis_atuais)
+    # o dia da semana do primeiro dia do horizonte define o das demais posições
+    deslocamento = np.array([d.weekday() for d in inicios])
+    semana = (deslocamento[:, None] + np.arange(horizonte)) % 7
+    diario = (niveis_atuais[:, None] + np.take_along_axis(pesos[:, :7], semana, axis=1)
+              + pesos[:, 7:] * niveis_atuais[:, None] + np.asarray(interceptos)[:, None])
+    diario = np.clip(diario, 0, None) * escalas[:, None]
+
+    resultado = pd.DataFrame(chaves, columns=["tabela", "usuario_id"])
+    resultado["inicio"] = inicios
+    resultado["fim"] = [d + timedelta(days=horizonte - 1) for d in inicios]
+    resultado["previsto"] = diario.sum(axis=1)
+    resultado["media_recente"] = niveis_atuais * escalas * horizonte
+    return resultado
+
+
+def previsoes(pasta=None):
+    # só lê os modelos gravados; a pontuação é refeita quando o arquivo muda
+    caminho = caminho_modelos(pasta)
+    mtime = os.stat(caminho).st_mtime_ns if os.path.exists(caminho) else None
+    item = em_memoria.get(caminho)
+    if item is None or item[0] != mtime:
+        item = em_memoria[caminho] = (mtime, prever_todos(carregar_modelos(pasta)))
+    return item[1].copy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Atualiza os modelos de previsão de consumo")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--pasta", default=config.MODELOS_DIR)
+    parser.add_argument("--refazer", action="store_true", help="descarta os modelos e treina do zero")
+    args = parser.parse_args()
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    inicio = time.perf_counter()
+    estado, novos = atualizar(engine, args.pasta, args.refazer)
+    print(f"✅ modelos atualizados em {time.perf_counter() - inicio:.1f}s")
+    for tabela, dias in novos.items():
+        dados = estado["tabelas"][tabela]
+        print(f"   {tabela}: {len(dados['series'])} séries, +{dias} dias (até {dados['ultimo_dia']})")
+
+    resultado = prever_todos(estado)
+    for tabela, grupo in resultado.groupby("tabela"):
+        unidade = SERIES[tabela][1]
+        print(f"🔮 {tabela}: {grupo['previsto'].sum():.1f} {unidade} previstos em {HORIZONTE_DIAS} dias "
+              f"(ritmo recente: {grupo['media_recente'].sum():.1f} {unidade})")
+
+
+if __name__ == "__main__":
+    main()
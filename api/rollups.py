@@ -0,0 +1,114 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import delete, func, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert
+
+from api import config, db, versoes
+from api.tables import consumo_agua, consumo_energia, rollup_agua_tbl, rollup_energia_tbl
+
+
+# tabela de origem -> (tabela de rollup, coluna de dimensão, coluna somada)
+# a dimensão é o id (api/dimensoes.py); o nome vem de um join na leitura
+ROLLUPS = {
+    "consumo_agua": (rollup_agua_tbl, "atividade_id", "volume_litros"),
+    "consumo_energia": (rollup_energia_tbl, "equipamento_id", "gasto_h"),
+}
+
+ORIGENS = {"consumo_agua": consumo_agua, "consumo_energia": consumo_energia}
+
+GRANULARIDADES = ("dia", "mes")
+
+
+def periodos(timestamp):
+    dia = timestamp.date()
+    return (("dia", dia), ("mes", dia.replace(day=1)))
+
+
+def atualizar_rollups(conn, tabela, linhas):
+    # chamado na mesma transação do insert das leituras
+    if tabela not in ROLLUPS:
+        return
+    tbl, dimensao, valor = ROLLUPS[tabela]
+
+    # agrega o lote em memória antes do upsert: N leituras viram poucas linhas de rollup
+    acumulado = defaultdict(lambda: [0.0, 0])
+    for linha in linhas:
+        for granularidade, periodo in periodos(linha["timestamp"]):
+            chave = (granularidade, periodo, linha["usuario_id"], linha[dimensao])
+            acumulado[chave][0] += linha[valor]
+            acumulado[chave][1] += 1
+    if not acumulado:
+        return
+
+    ins = insert(tbl)
+    upsert = ins.on_conflict_do_update(
+        index_elements=[c for c in tbl.primary_key.columns],
+        set_={
+            valor: tbl.c[valor] + ins.excluded[valor],
+            "leituras": tbl.c.leituras + ins.excluded.leituras,
+        },
+    )
+    conn.execute(upsert, [
+        {"granularidade": g, "periodo": p, "usuario_id": u, dimensao: d, valor: total, "leituras": n}
+        for (g, p, u, d), (total, n) in acumulado.items()
+    ])
+
+
+def reconstruir_rollups(conn, tabela, desde=None):
+    # desde: recalcula só os períodos a partir dessa data (os anteriores podem já estar arquivados)
+    tbl, dimensao, valor = ROLLUPS[tabela]
+    origem = ORIGENS[tabela]
+    dia = func.date(origem.c.timestamp)
+    mes = func.date(origem.c.timestamp, "start of month")
+
+    def agregado(granularidade, periodo):
+        sel = (
+            select(
+                literal(granularidade), periodo, origem.c.usuario_id, origem.c[dimensao],
+                func.sum(origem.c[valor]), func.count(),
+            )
+            .group_by(periodo, origem.c.usuario_id, origem.c[dimensao])
+        )
+        return sel.where(origem.c.timestamp >= desde) if desde else sel
+
+    conn.execute(delete(tbl).where(tbl.c.periodo >= desde.date()) if desde else delete(tbl))
+    conn.execute(tbl.insert().from_select(
+        ["granularidade", "periodo", "usuario_id", dimensao, valor, "leituras"],
+        union_all(agregado("dia", dia), agregado("mes", mes)),
+    ))
+
+
+def main():
+    from api import arquivo  # import local: arquivo depende do pyarrow, desnecessário no caminho de escrita
+
+    parser = argparse.ArgumentParser(description="Recalcula as tabelas de rollup a partir das leituras")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("tabelas", nargs="*", help=f"uma ou mais de {sorted(ROLLUPS)} (padrão: todas)")
+    args = parser.parse_args()
+    for tabela in args.tabelas:
+        if tabela not in ROLLUPS:
+            parser.error(f"tabela sem rollup: {tabela}")
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    for tabela in args.tabelas or sorted(ROLLUPS):
+        with engine.begin() as conn:
+            estado = arquivo.ler_estado(conn, tabela)
+            if estado["corte"]:
+                print(f"⚠️ {tabela}: arquivamento em andamento, rode python -m api.arquivo antes")
+                continue
+            # os períodos já arquivados só existem no rollup: não são recalculados
+            reconstruir_rollups(conn, tabela, estado["arquivado_ate"])
+            versoes.incrementar(conn, tabela)
+            total = conn.execute(select(func.count()).select_from(ROLLUPS[tabela][0])).scalar()
+        print(f"✅ {tabela}: {total} linhas de rollup")
+
+
+if __name__ == "__main__":
+    main()
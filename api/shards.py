@@ -0,0 +1,401 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import asyncio
+import glob
+import heapq
+import json
+import logging
+import time
+
+import pandas as pd
+from sqlalchemy import func, inspect, select
+
+from api import agregados, amostragem, anomalias, arquivo, config, consultas, db, dimensoes, escrita, importacao, migracoes, previsao, rollups, versoes
+from api.tables import alerta_tbl, arquivamento_tbl, consumo_agua, consumo_energia, importacao_tbl
+
+# Particionamento por residência (opcional, CONSUMO_SHARDS > 0): as leituras de água e
+# energia, e o que deriva delas (rollups, estado das anomalias, alertas), ficam em N
+# arquivos SQLite, um por balde de usuario_id (usuario_id % N; com N maior que o maior
+# id, cada residência tem o seu). Cada arquivo tem o esquema completo e passa pelo
+# mesmo escrita.gravar, então residências em arquivos diferentes gravam em paralelo,
+# sem disputar o lock de escrita. Produtos, compras e estoque continuam no consumo.db.
+# Leituras de uma residência vão direto ao arquivo dela; as que atravessam todas
+# (listas, agregados, alertas) consultam os arquivos em paralelo e juntam o resultado.
+#
+# Um lote com várias residências é gravado com uma transação por arquivo, então não é
+# atômico: Roteador.gravar devolve os arquivos que falharam e o /lote responde por linha.
+#
+# Os ids das linhas são de cada arquivo; para fora eles saem como id * N + shard, que é
+# único, mantém a ordem dentro do arquivo e permite traduzir o cursor de volta. Pelo
+# mesmo motivo cada arquivo tem a sua pasta de arquivo Parquet (<ARQUIVO_DIR>/shard_NNN).
+
+log = logging.getLogger(__name__)
+
+TABELAS = {"consumo_agua": consumo_agua, "consumo_energia": consumo_energia}
+LOTE_REBALANCEAMENTO = 20_000
+
+
+def caminho(n, pasta=None):
+    return os.path.join(pasta or config.SHARDS_DIR, f"consumo_{n:03d}.db")
+
+
+def pasta_arquivo(n, pasta=None):
+    # leituras arquivadas do shard n (ids locais: não podem dividir a pasta com outro arquivo)
+    return os.path.join(pasta or config.ARQUIVO_DIR, f"shard_{n:03d}")
+
+
+def numero(usuario_id, total):
+    return int(usuario_id) % total
+
+
+def particionar(linhas, total):
+    partes = {}
+    for linha in linhas:
+        partes.setdefault(numero(linha["usuario_id"], total), []).append(linha)
+    return partes
+
+
+# === IDS E CURSORES ===
+def id_global(id_local, n, total):
+    return id_local * total + n
+
+
+def globalizar(linhas, n, total):
+    return [{**linha, "id": id_global(linha["id"], n, total)} for linha in linhas]
+
+
+def cursor_local(cursor, n, total):
+    # (timestamp, id global) -> (timestamp, id local) com a mesma comparação estrita:
+    # id * total + n > g  <=>  id > (g - n) // total
+    if not cursor:
+        return None
+    timestamp, id_ = consultas.decodificar_cursor(cursor)
+    return consultas.codificar_cursor(timestamp, (id_ - n) // total)
+
+
+# === JUNÇÃO DOS RESULTADOS ===
+def juntar_paginas(paginas, limite):
+    # páginas já com ids globais, cada uma ordenada por (timestamp, id)
+    linhas = list(heapq.merge(*[p["dados"] for p in paginas], key=lambda l: (l["timestamp"], l["id"])))
+    proximo = None
+    if len(linhas) > limite or (linhas and any(p["proximo_cursor"] for p in paginas)):
+        linhas = linhas[:limite]
+        proximo = consultas.codificar_cursor(linhas[-1]["timestamp"], linhas[-1]["id"])
+    return {"dados": linhas, "proximo_cursor": proximo}
+
+
+def juntar_agregados(resultados, por, pontos):
+    # somas e contagens são aditivas: concatena os grupos de cada arquivo e soma de novo
+    colunas = resultados[0]["colunas"]
+    tabela, granularidade = resultados[0]["tabela"], resultados[0]["granularidade"]
+    _, _, medidas, _ = agregados.AGREGAVEIS[tabela]
+    partes = [pd.DataFrame(r["dados"], columns=colunas) for r in resultados if r["linhas"]]
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=colunas)
+    chaves = [c for c in colunas if c not in ("leituras", *medidas)]
+    if chaves and len(df):
+        df = df.groupby(chaves, dropna=False, sort=True).sum(min_count=1).reset_index()[colunas]
+    elif len(df):
+        df = df.sum(min_count=1).to_frame().T[colunas]
+    if "leituras" in df and len(df):
+        df["leituras"] = df["leituras"].astype("int64")
+    dados = {c: df[c].astype(object).where(df[c].notna(), None).tolist() for c in colunas}
+    if pontos and granularidade != "total":
+        dados = amostragem.reduzir_colunar(dados, "periodo", medidas[0], pontos, list(por))
+    return {
+        "tabela": tabela,
+        "granularidade": granularidade,
+        "linhas": len(dados[colunas[0]]) if colunas else 0,
+        "colunas": colunas,
+        "dados": dados,
+    }
+
+
+def juntar_alertas(listas, limite):
+    # cada lista vem em ordem decrescente de (timestamp, id)
+    alertas = heapq.merge(*listas, key=lambda a: (a["timestamp"], a["id"]), reverse=True)
+    return [a for _, a in zip(range(limite), alertas)]
+
+
+class Roteador:
+    def __init__(self, total=None, pasta=None):
+        self.total = total or config.SHARDS
+        self.pasta = pasta or config.SHARDS_DIR
+        self.caminhos = [caminho(n, self.pasta) for n in range(self.total)]
+        # os engines só abrem o arquivo na primeira conexão
+        self.engines = [db.criar_engine(c) for c in self.caminhos]
+        self.engines_async = [db.criar_engine_async(c) for c in self.caminhos]
+        self.buffers = []
+
+    def preparar(self):
+        # cria os arquivos que faltam e aplica as migrações em todos
+        os.makedirs(self.pasta, exist_ok=True)
+        aplicadas = []
+        for n, engine in enumerate(self.engines):
+            aplicadas.extend((n, versao, descricao) for versao, descricao
+                             in migracoes.aplicar_migracoes(engine, pasta_arquivo=pasta_arquivo(n)))
+        return aplicadas
+
+    def preparar_importacao(self):
+        # cada arquivo guarda o progresso das importações nele (gravar_sync)
+        for engine in self.engines:
+            importacao_tbl.create(engine, checkfirst=True)
+
+    def numero(self, usuario_id):
+        return numero(usuario_id, self.total)
+
+    def buffer_de(self, usuario_id):
+        return self.buffers[self.numero(usuario_id)] if self.buffers else None
+
+    # === ESCRITA ===
+    async def gravar(self, tabela, linhas):
+        # uma transação por arquivo, todas ao mesmo tempo: o lote NÃO é atômico. Se só parte
+        # dos arquivos falhar, os outros já fizeram commit; devolve {shard: erro} das falhas
+        # para quem chamou responder linha a linha (reenviar o lote inteiro duplicaria as
+        # gravadas). Se todos falharem nada foi gravado e o erro sobe como antes
+        async def gravar_parte(n, parte):
+            async with self.engines_async[n].begin() as conn:
+                await conn.run_sync(escrita.gravar, tabela, parte)
+
+        partes = particionar(linhas, self.total)
+        resultados = await asyncio.gather(*[gravar_parte(n, parte) for n, parte in partes.items()],
+                                          return_exceptions=True)
+        falhas = {n: r for n, r in zip(partes, resultados) if isinstance(r, BaseException)}
+        for erro in falhas.values():
+            if not isinstance(erro, Exception) or len(falhas) == len(partes):
+                raise erro
+        for n, erro in falhas.items():
+            log.warning("Falha ao gravar %d linhas de %s no shard %d: %s", len(partes[n]), tabela.name, n, erro)
+        return {n: str(erro) for n, erro in falhas.items()}
+
+    def gravar_sync(self, conn_central, tabela, linhas, importacao_id=None, indices=None, fim=None):
+        # para a importação (síncrona): o que não é particionado vai para o banco central.
+        # Também um commit por arquivo: uma falha no meio deixa os anteriores gravados. Com
+        # importacao_id, cada arquivo guarda até onde já gravou (fim, na mesma transação das
+        # linhas) e, ao retomar, pula as linhas (indices: posição de cada uma no arquivo de
+        # entrada) que já tem; assim um chunk repetido não é gravado duas vezes
+        if tabela.name not in TABELAS:
+            escrita.gravar(conn_central, tabela, linhas)
+            return
+        indices = range(len(linhas)) if indices is None else indices
+        fim = len(linhas) if fim is None else fim
+        partes = {}
+        for indice, linha in zip(indices, linhas):
+            partes.setdefault(self.numero(linha["usuario_id"]), []).append((indice, linha))
+        for n, parte in partes.items():
+            with self.engines[n].begin() as conn:
+                gravadas = importacao.progresso(conn, importacao_id) if importacao_id else 0
+                parte = [linha for indice, linha in parte if indice >= gravadas]
+                if parte:
+                    escrita.gravar(conn, tabela, parte)
+                if importacao_id:
+                    importacao.salvar_progresso(conn, importacao_id, tabela.name, max(fim, gravadas), len(parte), 0)
+
+    # === LEITURA ===
+    async def em_todos(self, funcao, *args, argumentos=None):
+        # funcao(conn, *args) em cada arquivo, em paralelo; argumentos(n) dá args próprios por arquivo
+        async def consultar(n, engine):
+            async with engine.connect() as conn:
+                return await conn.run_sync(funcao, *(argumentos(n) if argumentos else args))
+
+        return await asyncio.gather(*[consultar(n, e) for n, e in enumerate(self.engines_async)])
+
+    async def em_um(self, usuario_id, funcao, *args):
+        async with self.engines_async[self.numero(usuario_id)].connect() as conn:
+            return await conn.run_sync(funcao, *args)
+
+    async def pagina_consumo(self, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor, limite):
+        def argumentos(n):
+            return (tabela, coluna_filtro, valor_filtro, inicio, fim, cursor_local(cursor, n, self.total), limite,
+                    pasta_arquivo(n))
+
+        paginas = await self.em_todos(arquivo.pagina_consumo, argumentos=argumentos)
+        for n, pagina in enumerate(paginas):
+            pagina["dados"] = globalizar(pagina["dados"], n, self.total)
+        return juntar_paginas(paginas, limite)
+
+    async def stream_consumo(self, tabela, coluna_filtro, valor_filtro, inicio, fim, cursor=None, ao_terminar=None):
+        # NDJSON em ordem: páginas da junção, no máximo LIMITE_MAXIMO linhas por arquivo na memória
+        enviadas = 0
+        while True:
+            pagina = await self.pagina_consumo(tabela, coluna_filtro, valor_filtro, inicio, fim, cursor,
+                                               consultas.LIMITE_MAXIMO)
+            for linha in pagina["dados"]:
+                yield json.dumps(linha, default=consultas.para_json) + "\n"
+            enviadas += len(pagina["dados"])
+            cursor = pagina["proximo_cursor"]
+            if not cursor:
+                break
+        if ao_terminar:
+            ao_terminar(enviadas)
+
+    async def agregar(self, tabela, granularidade, por, inicio, fim, filtros, pontos):
+        if "usuario_id" in filtros:
+            # uma residência: só o arquivo dela
+            if not filtros["usuario_id"].lstrip("-").isdigit():
+                raise ValueError(f"usuario_id inválido: {filtros['usuario_id']}")
+            usuario_id = int(filtros["usuario_id"])
+            return await self.em_um(usuario_id, agregados.agregar, tabela, granularidade, por, inicio, fim, filtros,
+                                    pontos, pasta_arquivo(self.numero(usuario_id)))
+        # a redução de pontos só depois de somar os arquivos
+        resultados = await self.em_todos(agregados.agregar, argumentos=lambda n: (
+            tabela, granularidade, por, inicio, fim, filtros, None, pasta_arquivo(n)))
+        return juntar_agregados(resultados, por, pontos)
+
+    async def listar_alertas(self, tabela, usuario_id, desde, tipo, item, limite):
+        if usuario_id is not None:
+            alertas = await self.em_um(usuario_id, anomalias.listar, tabela, usuario_id, desde, tipo, item, limite)
+            return globalizar(alertas, self.numero(usuario_id), self.total)
+        listas = await self.em_todos(anomalias.listar, tabela, usuario_id, desde, tipo, item, limite)
+        return juntar_alertas([globalizar(a, n, self.total) for n, a in enumerate(listas)], limite)
+
+    def pasta_modelos(self, n):
+        return os.path.join(config.MODELOS_DIR, f"shard_{n:03d}")
+
+    def atualizar_previsoes(self):
+        # escritor dos modelos de cada shard (a tarefa periódica da API, numa thread)
+        return [previsao.atualizar_se_preciso(e, self.pasta_modelos(n)) for n, e in enumerate(self.engines)]
+
+    async def previsoes(self, central):
+        # água e energia vêm dos modelos de cada shard (as séries de uma residência só existem
+        # num deles); do banco central fica só o resto
+        dfs = await asyncio.gather(*[asyncio.to_thread(previsao.previsoes, self.pasta_modelos(n))
+                                     for n in range(self.total)])
+        partes = [central[~central["tabela"].isin(list(TABELAS))]] + [df[df["tabela"].isin(list(TABELAS))] for df in dfs]
+        return pd.concat(partes, ignore_index=True)
+
+    async def fechar(self):
+        for engine in self.engines_async:
+            await engine.dispose()
+        for engine in self.engines:
+            engine.dispose()
+
+
+# === REBALANCEAMENTO ===
+def origens_atuais():
+    # o layout em uso: os arquivos da pasta de shards, ou o banco único se ainda não há shards
+    arquivos = sorted(glob.glob(os.path.join(config.SHARDS_DIR, "consumo_*.db")))
+    return arquivos or [config.DB_PATH]
+
+
+def copiar_leituras(conn_origem, tabela, destinos, total, ao_lote=None):
+    tbl = TABELAS[tabela]
+    colunas = [c for c in dimensoes.colunas_publicas(tabela, tbl) if c != "id"]
+    sel = dimensoes.selecionar(tabela, tbl, colunas).order_by(tbl.c.timestamp, tbl.c.id)
+    resultado = conn_origem.execution_options(stream_results=True).execute(sel)
+    copiadas = 0
+    while lote := resultado.fetchmany(LOTE_REBALANCEAMENTO):
+        for n, parte in particionar([dict(l._mapping) for l in lote], total).items():
+            with destinos[n].begin() as conn:
+                # só o insert: rollups e anomalias são refeitos no fim, sem alertas para o passado
+                conn.execute(tbl.insert(), dimensoes.resolver(conn, tabela, parte))
+        copiadas += len(lote)
+        if ao_lote:
+            ao_lote(copiadas)
+    return copiadas
+
+
+def copiar_alertas(conn_origem, tabela, destinos, total):
+    nome, _, coluna_id = dimensoes.DIMENSOES[tabela]
+    alertas = [dict(a) for a in conn_origem.execute(anomalias.selecionar_alertas(tabela)).mappings()]
+    for n, parte in particionar(alertas, total).items():
+        with destinos[n].begin() as conn:
+            linhas = dimensoes.resolver(conn, tabela, [
+                {**{k: v for k, v in a.items() if k not in ("id", "item")}, nome: a["item"]} for a in parte])
+            conn.execute(alerta_tbl.insert(), [
+                {**{k: v for k, v in l.items() if k != coluna_id}, "dimensao_id": l[coluna_id]} for l in linhas])
+    return len(alertas)
+
+
+def tabelas_arquivadas(conn):
+    # tabelas com leituras no arquivo Parquet (ou com um arquivamento pela metade)
+    if not inspect(conn).has_table(arquivamento_tbl.name):
+        return []
+    estados = conn.execute(select(arquivamento_tbl)).all()
+    return [e.tabela for e in estados if e.linhas or e.corte or e.arquivado_ate]
+
+
+def rebalancear(origens, destino, total, ao_progresso=None):
+    # só as leituras do banco são copiadas: o que já foi para o Parquet (com ids e rollups
+    # do arquivo de origem) ficaria de fora, então origens com arquivo são recusadas
+    for origem in origens:
+        engine_origem = db.criar_engine(origem)
+        with engine_origem.connect() as conn:
+            arquivadas = tabelas_arquivadas(conn)
+        engine_origem.dispose()
+        if arquivadas:
+            raise ValueError(f"{origem} tem leituras arquivadas em Parquet ({', '.join(arquivadas)}): "
+                             "o rebalanceamento só move o que está no banco, rebalanceie antes de arquivar")
+    os.makedirs(destino, exist_ok=True)
+    ocupados = [c for c in glob.glob(os.path.join(destino, "consumo_*.db"))]
+    if ocupados:
+        raise ValueError(f"A pasta de destino já tem shards: {destino}")
+    roteador = Roteador(total, destino)
+    roteador.preparar()
+    resumo = {tabela: {"leituras": 0, "alertas": 0} for tabela in TABELAS}
+    try:
+        for origem in origens:
+            engine_origem = db.criar_engine(origem)
+            with engine_origem.connect() as conn:
+                for tabela in TABELAS:
+                    progresso = (lambda n, t=tabela: ao_progresso(origem, t, n)) if ao_progresso else None
+                    resumo[tabela]["leituras"] += copiar_leituras(conn, tabela, roteador.engines, total, progresso)
+                    resumo[tabela]["alertas"] += copiar_alertas(conn, tabela, roteador.engines, total)
+            engine_origem.dispose()
+        for engine in roteador.engines:
+            with engine.begin() as conn:
+                for tabela in TABELAS:
+                    rollups.reconstruir_rollups(conn, tabela)
+                    anomalias.reconstruir(conn, tabela)
+                    versoes.incrementar(conn, tabela)
+        por_shard = []
+        for engine in roteador.engines:
+            with engine.connect() as conn:
+                por_shard.append({t: conn.execute(select(func.count()).select_from(tbl)).scalar()
+                                  for t, tbl in TABELAS.items()})
+        resumo["por_shard"] = por_shard
+    finally:
+        for engine in roteador.engines:
+            engine.dispose()
+    return resumo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redistribui as leituras de água e energia em arquivos por residência")
+    parser.add_argument("--shards", type=int, default=config.SHARDS or None, help="número de arquivos (baldes de usuario_id)")
+    parser.add_argument("--origem", nargs="+", help="bancos de origem (padrão: os shards atuais, ou o banco único)")
+    parser.add_argument("--destino", help="pasta nova para os shards (padrão: <CONSUMO_SHARDS_DIR>_<N>)")
+    args = parser.parse_args()
+    if not args.shards or args.shards < 1:
+        parser.error("informe --shards N (ou CONSUMO_SHARDS)")
+
+    origens = [os.path.abspath(o) for o in args.origem] if args.origem else origens_atuais()
+    destino = os.path.abspath(args.destino or f"{config.SHARDS_DIR}_{args.shards}")
+    if any(os.path.dirname(o) == destino for o in origens):
+        parser.error("o destino precisa ser uma pasta diferente da dos shards de origem")
+
+    print(f"🔀 {len(origens)} origem(ns) -> {args.shards} shards em {destino}")
+    inicio = time.perf_counter()
+
+    def mostrar(origem, tabela, copiadas):
+        print(f"   {os.path.basename(origem)} {tabela}: {copiadas} leituras", end="\r")
+
+    try:
+        resumo = rebalancear(origens, destino, args.shards, mostrar)
+    except ValueError as err:
+        print(f"❌ {err}")
+        sys.exit(1)
+    print()
+    for tabela in TABELAS:
+        print(f"✅ {tabela}: {resumo[tabela]['leituras']} leituras, {resumo[tabela]['alertas']} alertas")
+    for n, contagens in enumerate(resumo["por_shard"]):
+        print(f"   shard {n:03d}: " + ", ".join(f"{t} {c}" for t, c in contagens.items()))
+    print(f"⏱️ {time.perf_counter() - inicio:.1f}s. Para usar: CONSUMO_SHARDS={args.shards} CONSUMO_SHARDS_DIR={destino}")
+
+
+if __name__ == "__main__":
+    main()
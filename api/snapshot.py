@@ -0,0 +1,143 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from api import config, db, dimensoes
+from api.tables import consumo_agua, consumo_energia, compra_tbl, atividade_tbl, produto_tbl
+
+# Exporta as tabelas para arquivos Parquet particionados por mês
+# (<pasta>/<tabela>/mes=AAAA-MM/parte-<primeiro id>-<último id>.parquet).
+# As tabelas de leituras só recebem inserts, então cada exportação grava apenas
+# os ids maiores que o último exportado. produto é pequena e muda, então é regravada.
+
+# tabela -> (Table, coluna de tempo, incremental)
+SNAPSHOTS = {
+    "consumo_agua": (consumo_agua, "timestamp", True),
+    "consumo_energia": (consumo_energia, "timestamp", True),
+    "compra": (compra_tbl, "data", True),
+    "atividade": (atividade_tbl, "data", True),
+    "produto": (produto_tbl, "data_compra", False),
+}
+
+LINHAS_POR_PARTE = 200_000
+COMPRESSAO = "zstd"
+
+
+def pasta_tabela(tabela, pasta=None):
+    return os.path.join(pasta or config.SNAPSHOT_DIR, tabela)
+
+
+def ler_estado(tabela, pasta=None):
+    caminho = os.path.join(pasta_tabela(tabela, pasta), "_estado.json")
+    if not os.path.exists(caminho):
+        return {"ultimo_id": 0, "linhas": 0}
+    with open(caminho) as f:
+        return json.load(f)
+
+
+def salvar_estado(tabela, estado, pasta=None):
+    # grava em arquivo temporário e troca, para nunca deixar um estado pela metade
+    caminho = os.path.join(pasta_tabela(tabela, pasta), "_estado.json")
+    with open(caminho + ".tmp", "w") as f:
+        json.dump(estado, f)
+    os.replace(caminho + ".tmp", caminho)
+
+
+def gravar_parte(df, tabela, tempo, pasta=None):
+    df = df.assign(mes=df[tempo].dt.strftime("%Y-%m"))
+    primeiro, ultimo = int(df["id"].min()), int(df["id"].max())
+    for mes, grupo in df.groupby("mes"):
+        destino = os.path.join(pasta_tabela(tabela, pasta), f"mes={mes}")
+        os.makedirs(destino, exist_ok=True)
+        # nome determinístico: repetir uma exportação interrompida sobrescreve a mesma parte
+        nome = f"parte-{primeiro:012d}-{ultimo:012d}.parquet"
+        # o temporário começa com "." para ser ignorado pelos leitores enquanto é escrito
+        temporario = os.path.join(destino, f".{nome}.tmp")
+        tabela_arrow = pa.Table.from_pandas(grupo.drop(columns="mes"), preserve_index=False)
+        pq.write_table(tabela_arrow, temporario, compression=COMPRESSAO)
+        os.replace(temporario, os.path.join(destino, nome))
+
+
+def exportar(engine, tabela, pasta=None, linhas_por_parte=LINHAS_POR_PARTE):
+    tbl, tempo, incremental = SNAPSHOTS[tabela]
+    os.makedirs(pasta_tabela(tabela, pasta), exist_ok=True)
+    estado = ler_estado(tabela, pasta) if incremental else {"ultimo_id": 0, "linhas": 0}
+    if not incremental:
+        for raiz, _, arquivos in os.walk(pasta_tabela(tabela, pasta)):
+            for arquivo in arquivos:
+                if arquivo.endswith(".parquet"):
+                    os.remove(os.path.join(raiz, arquivo))
+
+    # atividade/equipamento vão pelo nome: o Parquet já guarda strings repetidas como dicionário
+    sel = dimensoes.selecionar(tabela, tbl).where(tbl.c.id > estado["ultimo_id"]).order_by(tbl.c.id)
+    novas = 0
+    with engine.connect() as conn:
+        for df in pd.read_sql(sel, conn, chunksize=linhas_por_parte):
+            if df.empty:
+                continue
+            df[tempo] = pd.to_datetime(df[tempo])
+            gravar_parte(df, tabela, tempo, pasta)
+            novas += len(df)
+            # o estado avança a cada parte: uma interrupção retoma da última parte gravada
+            estado = {"ultimo_id": int(df["id"].max()), "linhas": estado["linhas"] + len(df)}
+            salvar_estado(tabela, estado, pasta)
+    if not incremental:
+        salvar_estado(tabela, estado, pasta)
+    return novas, estado
+
+
+def ler_snapshot(tabela, colunas=None, inicio=None, fim=None, filtros=None, pasta=None):
+    # lê só as colunas e os meses pedidos; os arquivos são abertos com memory map
+    _, tempo, _ = SNAPSHOTS[tabela]
+    condicoes = []
+    if inicio is not None:
+        inicio = pd.Timestamp(inicio)
+        condicoes += [("mes", ">=", inicio.strftime("%Y-%m")), (tempo, ">=", inicio)]
+    if fim is not None:
+        fim = pd.Timestamp(fim)
+        condicoes += [("mes", "<=", fim.strftime("%Y-%m")), (tempo, "<", fim)]
+    for coluna, valor in (filtros or {}).items():
+        condicoes.append((coluna, "==", valor))
+
+    caminho = pasta_tabela(tabela, pasta)
+    if not os.path.exists(caminho) or not any(n.startswith("mes=") for n in os.listdir(caminho)):
+        return pd.DataFrame(columns=colunas or [])
+    tabela_arrow = pq.read_table(
+        caminho, columns=colunas, filters=condicoes or None,
+        memory_map=True, partitioning="hive",
+    )
+    df = tabela_arrow.to_pandas()
+    if "mes" in df.columns and (colunas is None or "mes" not in colunas):
+        df = df.drop(columns="mes")
+    return df.sort_values(tempo, kind="stable").reset_index(drop=True) if tempo in df.columns else df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta snapshots Parquet incrementais das tabelas")
+    parser.add_argument("tabelas", nargs="*", help=f"uma ou mais de {sorted(SNAPSHOTS)} (padrão: todas)")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--pasta", default=config.SNAPSHOT_DIR)
+    args = parser.parse_args()
+    for tabela in args.tabelas:
+        if tabela not in SNAPSHOTS:
+            parser.error(f"tabela desconhecida: {tabela}")
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    for tabela in args.tabelas or sorted(SNAPSHOTS):
+        inicio = time.perf_counter()
+        novas, estado = exportar(engine, tabela, args.pasta)
+        print(f"✅ {tabela}: {novas} linhas novas, {estado['linhas']} no snapshot "
+              f"({time.perf_counter() - inicio:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, Date, MetaData, Table, DateTime
+from sqlalchemy import Column, Integer, Float, String, Date, MetaData, Table, DateTime, Index, ForeignKey, Boolean
 
 
 metadata = MetaData()
@@ -26,6 +26,8 @@ compra_tbl = Table(
     Column("quantidade", Float, nullable=False),
     Column("gasto_total", Float, nullable=False),
     Column("data", Date, nullable=False),
+    Index("ix_compra_produto_id", "produto_id"),
+    Index("ix_compra_data", "data"),
 )
 
 atividade_tbl = Table(
@@ -33,11 +35,26 @@ atividade_tbl = Table(
     Column("id", Integer, primary_key=True),
     Column("usuario_id", Integer, nullable=False),
     Column("produto_id", Integer, nullable=False),
-    Column("produto_nome", Integer, nullable=False),
+    Column("produto_nome", String, nullable=False),
     Column("atividade", String, nullable=False),
     Column("porcentagem_gasto", Float, nullable=False),
     Column("consumo", Float, nullable=False),
     Column("data", Date, nullable=False),
+    Index("ix_atividade_produto_id", "produto_id"),
+    Index("ix_atividade_data", "data"),
+)
+
+# dimensões: nomes das atividades (água) e dos equipamentos (energia), referenciados por id nas leituras
+atividade_tipo_tbl = Table(
+    "atividade_tipo", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nome", String, nullable=False, unique=True),
+)
+
+equipamento_tbl = Table(
+    "equipamento", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("nome", String, nullable=False, unique=True),
 )
 
 # agua
@@ -45,9 +62,14 @@ consumo_agua = Table(
     "consumo_agua", metadata,
     Column("id", Integer, primary_key=True),
     Column("usuario_id", Integer, nullable=False),
-    Column("atividade", String, nullable=False),
+    Column("atividade_id", Integer, ForeignKey("atividade_tipo.id"), nullable=False),
     Column("volume_litros", Float, nullable=False),
     Column("timestamp", DateTime, nullable=False),
+    Index("ix_consumo_agua_timestamp", "timestamp"),
+    Index("ix_consumo_agua_atividade_timestamp", "atividade_id", "timestamp"),
+    Index("ix_consumo_agua_usuario_timestamp", "usuario_id", "timestamp"),
+    # ids nunca reusados, mesmo depois que as leituras mais novas são apagadas (migração 9)
+    sqlite_autoincrement=True,
 )
 
 #energia 
@@ -55,8 +77,134 @@ consumo_energia = Table(
     "consumo_energia", metadata,
     Column("id", Integer, primary_key=True),
     Column("usuario_id", Integer, nullable=False),
-    Column("equipamento", String, nullable=False),
+    Column("equipamento_id", Integer, ForeignKey("equipamento.id"), nullable=False),
     Column("potencia_w", Float, nullable=False),
     Column("gasto_h", Float, nullable=False),
     Column("timestamp", DateTime, nullable=False),
-)
\ No newline at end of file
+    Index("ix_consumo_energia_timestamp", "timestamp"),
+    Index("ix_consumo_energia_equipamento_timestamp", "equipamento_id", "timestamp"),
+    Index("ix_consumo_energia_usuario_timestamp", "usuario_id", "timestamp"),
+    # ids nunca reusados, mesmo depois que as leituras mais novas são apagadas (migração 9)
+    sqlite_autoincrement=True,
+)
+
+# controle de importações em lote (permite retomar do último chunk gravado)
+importacao_tbl = Table(
+    "importacao", metadata,
+    Column("id", String, primary_key=True),
+    Column("tabela", String, nullable=False),
+    Column("linhas", Integer, nullable=False),
+    Column("aceitos", Integer, nullable=False),
+    Column("rejeitados", Integer, nullable=False),
+    Column("atualizado_em", DateTime, nullable=False),
+)
+
+
+# totais diários e mensais por usuário e atividade/equipamento
+# granularidade: "dia" ou "mes" (período = primeiro dia do mês)
+rollup_agua_tbl = Table(
+    "rollup_agua", metadata,
+    Column("granularidade", String, primary_key=True),
+    Column("periodo", Date, primary_key=True),
+    Column("usuario_id", Integer, primary_key=True),
+    Column("atividade_id", Integer, primary_key=True),
+    Column("volume_litros", Float, nullable=False),
+    Column("leituras", Integer, nullable=False),
+)
+
+rollup_energia_tbl = Table(
+    "rollup_energia", metadata,
+    Column("granularidade", String, primary_key=True),
+    Column("periodo", Date, primary_key=True),
+    Column("usuario_id", Integer, primary_key=True),
+    Column("equipamento_id", Integer, primary_key=True),
+    Column("gasto_h", Float, nullable=False),
+    Column("leituras", Integer, nullable=False),
+)
+
+
+# contador de alterações por tabela, incrementado a cada escrita (invalida caches)
+versao_tabela_tbl = Table(
+    "versao_tabela", metadata,
+    Column("tabela", String, primary_key=True),
+    Column("versao", Integer, nullable=False),
+)
+
+
+# arquivamento das leituras antigas em Parquet (api/arquivo.py)
+# arquivado_ate: tudo antes dessa data já saiu do banco; corte: arquivamento em andamento
+arquivamento_tbl = Table(
+    "arquivamento", metadata,
+    Column("tabela", String, primary_key=True),
+    Column("arquivado_ate", DateTime, nullable=True),
+    Column("corte", DateTime, nullable=True),
+    Column("linhas", Integer, nullable=False),
+)
+
+
+# estoque dos produtos de higiene, atualizado a cada compra/atividade (api/estoque.py)
+# quantidades na unidade do produto: quantidade = inicial + comprado - consumido
+estoque_tbl = Table(
+    "estoque", metadata,
+    Column("produto_id", Integer, primary_key=True),
+    Column("inicial", Float, nullable=False),
+    Column("comprado", Float, nullable=False),
+    Column("consumido", Float, nullable=False),
+    Column("quantidade", Float, nullable=False),
+    Column("compras", Integer, nullable=False),
+    Column("consumos", Integer, nullable=False),
+    Column("primeiro_consumo", Date, nullable=True),
+    Column("ultimo_consumo", Date, nullable=True),
+)
+
+# totais por produto e dia: a taxa de consumo lê só os dias da janela
+estoque_diario_tbl = Table(
+    "estoque_diario", metadata,
+    Column("produto_id", Integer, primary_key=True),
+    Column("dia", Date, primary_key=True),
+    Column("comprado", Float, nullable=False),
+    Column("consumido", Float, nullable=False),
+    Index("ix_estoque_diario_dia", "dia"),
+)
+
+# último id de cada tabela de eventos já aplicado ao estoque
+estoque_aplicado_tbl = Table(
+    "estoque_aplicado", metadata,
+    Column("origem", String, primary_key=True),
+    Column("ultimo_id", Integer, nullable=False),
+)
+
+
+# detecção de anomalias nas leituras (api/anomalias.py)
+# estado por série (tabela, usuário, atividade/equipamento): média e variância
+# móveis exponenciais do log do valor e o CUSUM para mudanças de nível,
+# atualizadas a cada leitura
+anomalia_estado_tbl = Table(
+    "anomalia_estado", metadata,
+    Column("tabela", String, primary_key=True),
+    Column("usuario_id", Integer, primary_key=True),
+    Column("dimensao_id", Integer, primary_key=True),
+    Column("leituras", Integer, nullable=False),
+    Column("media", Float, nullable=False),
+    Column("variancia", Float, nullable=False),
+    Column("cusum", Float, nullable=False),
+    Column("em_deriva", Boolean, nullable=False),
+    Column("ultima_leitura", DateTime, nullable=False),
+)
+
+# tipo: vazamento, consumo_alto ou falha_equipamento; teste: pico (uma leitura) ou nivel (mudança persistente)
+alerta_tbl = Table(
+    "alerta", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("tabela", String, nullable=False),
+    Column("usuario_id", Integer, nullable=False),
+    Column("dimensao_id", Integer, nullable=False),
+    Column("tipo", String, nullable=False),
+    Column("teste", String, nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+    Column("valor", Float, nullable=False),
+    Column("esperado", Float, nullable=False),
+    Column("escore", Float, nullable=False),
+    Index("ix_alerta_timestamp", "timestamp"),
+    Index("ix_alerta_usuario_timestamp", "usuario_id", "timestamp"),
+)
@@ -0,0 +1,20 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from api.tables import versao_tabela_tbl
+
+
+def incrementar(conn, *tabelas):
+    # chamado na mesma transação da escrita: quem lê a versão nova vê os dados novos
+    ins = insert(versao_tabela_tbl)
+    conn.execute(
+        ins.on_conflict_do_update(
+            index_elements=[versao_tabela_tbl.c.tabela],
+            set_={"versao": versao_tabela_tbl.c.versao + 1},
+        ),
+        [{"tabela": tabela, "versao": 1} for tabela in tabelas],
+    )
+
+
+def ler_versoes(conn):
+    return dict(conn.execute(select(versao_tabela_tbl.c.tabela, versao_tabela_tbl.c.versao)).all())
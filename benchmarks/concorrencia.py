@@ -0,0 +1,124 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from api import config, shards
+
+# Sobe a API com uvicorn em uma cópia do banco e mede a vazão com leitores e
+# escritores concorrentes, para cada journal_mode pedido (ex.: WAL vs DELETE).
+
+
+def esperar_api(url, processo, timeout=30):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError("uvicorn terminou antes de responder")
+        try:
+            requests.get(f"{url}/agregados/consumo_agua", params={"granularidade": "total"}, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("API não respondeu a tempo")
+
+
+def trabalhador(url, fim, proporcao_escrita, semente):
+    aleatorio = random.Random(semente)
+    sessao = requests.Session()
+    leituras, escritas, erros = [], [], 0
+    while time.time() < fim:
+        escrever = aleatorio.random() < proporcao_escrita
+        inicio = time.perf_counter()
+        try:
+            if escrever:
+                resposta = sessao.post(f"{url}/consumo_agua", json={
+                    "usuario_id": aleatorio.randint(1, 50),
+                    "atividade": aleatorio.choice(["banho", "descarga", "lavar_louca"]),
+                    "volume_litros": round(aleatorio.uniform(0.5, 60), 2),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }, timeout=30)
+            else:
+                resposta = sessao.get(f"{url}/consumo_agua", params={"limite": 100}, timeout=30)
+            resposta.raise_for_status()
+        except requests.RequestException:
+            erros += 1
+            continue
+        (escritas if escrever else leituras).append(time.perf_counter() - inicio)
+    return leituras, escritas, erros
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    return statistics.quantiles(valores, n=100)[p - 1] * 1000 if len(valores) > 1 else valores[0] * 1000
+
+
+def rodar(banco, modo, porta, clientes, segundos, proporcao_escrita, total_shards=0):
+    with tempfile.TemporaryDirectory() as pasta:
+        copia = os.path.join(pasta, "consumo.db")
+        shutil.copy(banco, copia)
+        env = {**os.environ, "CONSUMO_DB": copia, "CONSUMO_JOURNAL_MODE": modo,
+               "CONSUMO_MODELOS_DIR": os.path.join(pasta, "modelos")}
+        if total_shards:
+            # as leituras da cópia são divididas em arquivos por residência antes de subir a API
+            pasta_shards = os.path.join(pasta, "shards")
+            shards.rebalancear([copia], pasta_shards, total_shards)
+            env.update({"CONSUMO_SHARDS": str(total_shards), "CONSUMO_SHARDS_DIR": pasta_shards})
+        processo = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.app:app", "--port", str(porta), "--log-level", "warning"],
+            cwd=config.BASE_DIR, env=env,
+        )
+        url = f"http://127.0.0.1:{porta}"
+        try:
+            esperar_api(url, processo)
+            fim = time.time() + segundos
+            with ThreadPoolExecutor(clientes) as executor:
+                resultados = list(executor.map(
+                    lambda i: trabalhador(url, fim, proporcao_escrita, i), range(clientes)
+                ))
+        finally:
+            processo.terminate()
+            processo.wait()
+
+    leituras = [t for r in resultados for t in r[0]]
+    escritas = [t for r in resultados for t in r[1]]
+    erros = sum(r[2] for r in resultados)
+    total = len(leituras) + len(escritas)
+    print(f"== journal_mode={modo} | {total_shards or 'sem'} shards | {clientes} clientes | {segundos}s | "
+          f"{proporcao_escrita:.0%} escritas")
+    print(f"   {total / segundos:.1f} req/s ({len(leituras)} leituras, {len(escritas)} escritas, {erros} erros)")
+    print(f"   leitura p50={percentil(leituras, 50):.1f}ms p95={percentil(leituras, 95):.1f}ms")
+    print(f"   escrita p50={percentil(escritas, 50):.1f}ms p95={percentil(escritas, 95):.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de leitores e escritores concorrentes na API")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--modos", nargs="+", default=["WAL", "DELETE"])
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--segundos", type=int, default=10)
+    parser.add_argument("--escritas", type=float, default=0.3, help="proporção de requisições de escrita")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0],
+                        help="número de shards por residência a comparar (0: banco único)")
+    args = parser.parse_args()
+
+    for modo in args.modos:
+        for total_shards in args.shards:
+            rodar(args.db, modo, args.porta, args.clientes, args.segundos, args.escritas, total_shards)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+from api import anomalias, db, estoque, rollups, versoes
+from api.migracoes import aplicar_migracoes
+
+# Gera um banco sintético com as cinco tabelas em escala configurável.
+# Tudo sai de um gerador com semente: a mesma semente produz o mesmo banco.
+
+# atividade -> (litros médios, desvio, vezes por pessoa por dia, horários de pico)
+ATIVIDADES_AGUA = {
+    "banho": (45.0, 15.0, 1.0, (7, 20)),
+    "descarga": (6.0, 1.0, 5.0, ()),
+    "escovar_dentes": (1.0, 0.5, 2.5, (7, 22)),
+    "lavar_maos": (1.2, 0.5, 6.0, ()),
+    "lavar_rosto": (1.5, 0.5, 1.5, (7, 22)),
+    "lavar_louca": (20.0, 8.0, 0.8, (13, 20)),
+    "lavar_alimentos": (4.0, 2.0, 0.6, (11, 18)),
+    "agua_cozinhar": (2.5, 1.0, 0.8, (11, 18)),
+    "garrafa_agua": (1.5, 0.3, 1.2, ()),
+    "lavar_roupa": (110.0, 25.0, 0.08, (10,)),
+    "tanque": (30.0, 10.0, 0.05, (10,)),
+    "limpeza_casa": (40.0, 15.0, 0.06, (9,)),
+}
+
+# equipamento -> (potência W, horas médias por uso, usos por casa por dia, horários de pico)
+EQUIPAMENTOS = {
+    "geladeira": (90.0, 24.0, 1.0, ()),
+    "chuveiro_eletrico": (5500.0, 0.25, 2.5, (7, 20)),
+    "microondas": (1150.0, 0.1, 2.0, (12, 19)),
+    "televisao_42_polegadas": (120.0, 3.0, 1.0, (20,)),
+    "televisao_30_polegadas": (80.0, 2.0, 0.5, (21,)),
+    "iluminacao_casa": (60.0, 5.0, 1.0, (19,)),
+    "carregador_smartphone": (10.0, 2.0, 2.0, (23,)),
+    "maquina_lavar_roupa": (500.0, 1.0, 0.2, (10,)),
+    "computador": (200.0, 4.0, 0.7, (14,)),
+}
+
+# produto -> (unidade, quantidade por embalagem, preço, atividade, % gasta por uso, usos por pessoa por dia)
+PRODUTOS = {
+    "rolo_papel": ("m", 30.0, 2.49, "cagar", 2.0, 1.2),
+    "pasta_dente": ("g", 90.0, 4.5, "escovar_dentes", 1.5, 2.5),
+    "sabonete": ("g", 85.0, 3.49, "banho", 2.0, 1.0),
+    "shampoo": ("ml", 350.0, 18.9, "banho", 3.0, 0.6),
+    "condicionador": ("ml", 350.0, 19.9, "banho", 3.0, 0.4),
+    "desodorante": ("ml", 150.0, 14.5, "passar_desodorante", 1.0, 1.0),
+    "detergente": ("ml", 500.0, 2.99, "lavar_louca", 2.0, 0.8),
+    "sabao_po": ("g", 1600.0, 24.9, "lavar_roupa", 6.0, 0.08),
+    "amaciante": ("ml", 2000.0, 16.9, "lavar_roupa", 5.0, 0.08),
+    "cotonete": ("un", 150.0, 6.9, "limpar_ouvidos", 1.3, 0.4),
+    "lenco_papel": ("un", 50.0, 3.5, "assoar_nariz", 4.0, 0.5),
+    "desinfetante": ("ml", 1000.0, 8.9, "limpar_casa", 5.0, 0.06),
+    "agua_sanitaria": ("ml", 1000.0, 4.5, "limpar_casa", 5.0, 0.06),
+    "fio_dental": ("m", 50.0, 7.9, "escovar_dentes", 1.0, 0.8),
+    "sabonete_liquido": ("ml", 250.0, 9.9, "lavar_maos", 0.5, 3.0),
+    "esponja": ("un", 1.0, 1.5, "lavar_louca", 3.0, 0.8),
+}
+
+DIAS_POR_LOTE = 30
+
+
+def horarios(rng, n, picos):
+    # horas do dia em segundos: em torno dos picos quando existem, uniformes caso contrário
+    if not picos:
+        return rng.integers(0, 86400, n)
+    centro = np.asarray(picos)[rng.integers(0, len(picos), n)] * 3600
+    return np.clip(centro + rng.normal(0, 3600, n), 0, 86399).astype(np.int64)
+
+
+def textos_de_data(inicio, dias, segundos):
+    instantes = np.datetime64(inicio, "s") + dias.astype("timedelta64[D]") + segundos.astype("timedelta64[s]")
+    # mesmo formato que o SQLAlchemy grava para DateTime no SQLite
+    return np.char.replace(np.datetime_as_string(instantes, unit="us"), "T", " ")
+
+
+def eventos(rng, taxa_por_casa, dias):
+    # número de eventos por (casa, dia) ~ Poisson; devolve o índice da casa e o dia de cada evento
+    contagens = rng.poisson(np.repeat(taxa_por_casa[:, None], dias, axis=1))
+    casas, dias_evento = np.nonzero(contagens)
+    repeticoes = contagens[casas, dias_evento]
+    return np.repeat(casas, repeticoes), np.repeat(dias_evento, repeticoes)
+
+
+def gerar_leituras(rng, pessoas, inicio, dia_inicial, dias, catalogo, por_pessoa):
+    linhas = []
+    for nome, (media, desvio, taxa, picos) in catalogo.items():
+        taxa_por_casa = taxa * pessoas if por_pessoa else np.full(len(pessoas), taxa, dtype=float)
+        casas, dias_evento = eventos(rng, taxa_por_casa, dias)
+        if not len(casas):
+            continue
+        valores = np.round(np.abs(rng.normal(media, desvio, len(casas))) + 0.01, 2)
+        instantes = textos_de_data(inicio, dia_inicial + dias_evento, horarios(rng, len(casas), picos))
+        linhas.append((casas + 1, nome, valores, instantes))
+    return linhas
+
+
+def inserir(conn, sql, colunas):
+    conn.exec_driver_sql(sql, list(zip(*colunas)))
+
+
+def gerar(engine, domicilios, dias, inicio, semente, ao_progresso=None):
+    rng = np.random.default_rng(semente)
+    pessoas = rng.integers(1, 6, domicilios)
+    totais = {"consumo_agua": 0, "consumo_energia": 0, "produto": 0, "compra": 0, "atividade": 0}
+
+    produtos = list(PRODUTOS.items())
+    with engine.begin() as conn:
+        inserir(conn, "INSERT INTO produto (id, nome, unidade, quantidade_restante, quantidade_total, "
+                      "quantidade_estoque, preco_unitario, data_compra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [list(range(1, len(produtos) + 1)), [n for n, _ in produtos], [p[0] for _, p in produtos],
+                 [p[1] for _, p in produtos], [p[1] for _, p in produtos], [1] * len(produtos),
+                 [p[2] for _, p in produtos], [inicio.isoformat()] * len(produtos)])
+        # tabelas de dimensão: as leituras guardam só o id
+        inserir(conn, "INSERT INTO atividade_tipo (id, nome) VALUES (?, ?)",
+                [list(range(1, len(ATIVIDADES_AGUA) + 1)), list(ATIVIDADES_AGUA)])
+        inserir(conn, "INSERT INTO equipamento (id, nome) VALUES (?, ?)",
+                [list(range(1, len(EQUIPAMENTOS) + 1)), list(EQUIPAMENTOS)])
+    totais["produto"] = len(produtos)
+    id_atividade = {nome: i for i, nome in enumerate(ATIVIDADES_AGUA, 1)}
+    id_equipamento = {nome: i for i, nome in enumerate(EQUIPAMENTOS, 1)}
+
+    for dia_inicial in range(0, dias, DIAS_POR_LOTE):
+        bloco = min(DIAS_POR_LOTE, dias - dia_inicial)
+        with engine.begin() as conn:
+            for casas, nome, litros, instantes in gerar_leituras(
+                    rng, pessoas, inicio, dia_inicial, bloco, ATIVIDADES_AGUA, True):
+                inserir(conn, "INSERT INTO consumo_agua (usuario_id, atividade_id, volume_litros, timestamp) "
+                              "VALUES (?, ?, ?, ?)",
+                        [casas.tolist(), [id_atividade[nome]] * len(casas), litros.tolist(), instantes.tolist()])
+                totais["consumo_agua"] += len(casas)
+
+            catalogo_energia = {n: (h, h * 0.3, t, p) for n, (_, h, t, p) in EQUIPAMENTOS.items()}
+            for casas, nome, horas, instantes in gerar_leituras(
+                    rng, pessoas, inicio, dia_inicial, bloco, catalogo_energia, False):
+                potencia = EQUIPAMENTOS[nome][0]
+                inserir(conn, "INSERT INTO consumo_energia (usuario_id, equipamento_id, potencia_w, gasto_h, "
+                              "timestamp) VALUES (?, ?, ?, ?, ?)",
+                        [casas.tolist(), [id_equipamento[nome]] * len(casas), [potencia] * len(casas),
+                         np.round(potencia * horas / 1000, 3).tolist(), instantes.tolist()])
+                totais["consumo_energia"] += len(casas)
+
+            for produto_id, (nome, (unidade, quantidade, preco, atividade, pct, taxa)) in enumerate(produtos, 1):
+                casas, dias_evento = eventos(rng, taxa * pessoas, bloco)
+                if len(casas):
+                    porcentagem = np.round(np.abs(rng.normal(pct, pct * 0.3, len(casas))) + 0.01, 3)
+                    datas = np.datetime_as_string(
+                        np.datetime64(inicio, "D") + (dia_inicial + dias_evento).astype("timedelta64[D]"))
+                    inserir(conn, "INSERT INTO atividade (usuario_id, produto_id, produto_nome, atividade, "
+                                  "porcentagem_gasto, consumo, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            [(casas + 1).tolist(), [produto_id] * len(casas), [nome] * len(casas),
+                             [atividade] * len(casas), porcentagem.tolist(),
+                             np.round(porcentagem * quantidade / 100, 3).tolist(), datas.tolist()])
+                    totais["atividade"] += len(casas)
+
+                # compras: em média uma embalagem a cada (100 / (pct * taxa * pessoas)) dias
+                taxa_compra = np.minimum(pct * taxa * pessoas / 100, 1.0)
+                casas, dias_evento = eventos(rng, taxa_compra, bloco)
+                if len(casas):
+                    unidades = rng.integers(1, 4, len(casas)).astype(float)
+                    datas = np.datetime_as_string(
+                        np.datetime64(inicio, "D") + (dia_inicial + dias_evento).astype("timedelta64[D]"))
+                    inserir(conn, "INSERT INTO compra (usuario_id, produto_id, produto_nome, quantidade, "
+                                  "gasto_total, data) VALUES (?, ?, ?, ?, ?, ?)",
+                            [(casas + 1).tolist(), [produto_id] * len(casas), [nome] * len(casas),
+                             unidades.tolist(), np.round(unidades * preco, 2).tolist(), datas.tolist()])
+                    totais["compra"] += len(casas)
+
+        if ao_progresso:
+            ao_progresso(dia_inicial + bloco, totais)
+
+    # as leituras entraram direto por SQL, então rollups, estoque, estado das anomalias e versões são refeitos no fim
+    with engine.begin() as conn:
+        for tabela in rollups.ROLLUPS:
+            rollups.reconstruir_rollups(conn, tabela)
+        estoque.reconstruir(conn)
+        for tabela in anomalias.VALORES:
+            anomalias.reconstruir(conn, tabela)
+        versoes.incrementar(conn, *totais)
+    return totais
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um banco sintético de consumo")
+    parser.add_argument("--db", required=True, help="arquivo de saída (não use o consumo.db de verdade)")
+    parser.add_argument("--domicilios", type=int, default=20)
+    parser.add_argument("--dias", type=int, default=180)
+    parser.add_argument("--inicio", type=date.fromisoformat, default=date(2025, 1, 1))
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--sobrescrever", action="store_true")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.sobrescrever:
+            parser.error(f"{args.db} já existe (use --sobrescrever)")
+        os.remove(args.db)
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    aplicar_migracoes(engine)
+    inicio = time.perf_counter()
+
+    def mostrar(dias_feitos, totais):
+        leituras = totais["consumo_agua"] + totais["consumo_energia"]
+        print(f"{dias_feitos}/{args.dias} dias | {leituras} leituras | "
+              f"{leituras / (time.perf_counter() - inicio):.0f} leituras/s")
+
+    totais = gerar(engine, args.domicilios, args.dias, args.inicio, args.semente, mostrar)
+    print(f"✅ {args.db} gerado em {time.perf_counter() - inicio:.1f}s")
+    for tabela, total in totais.items():
+        print(f"   {tabela}: {total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from api import db, importacao, importacao_paralela
+from api.migracoes import aplicar_migracoes
+
+# Mede a importação de um arquivo NDJSON sintético com a importação serial
+# (importacao.py) e com a paralela para vários números de processos, cada uma
+# num banco novo, e mostra a aceleração em relação a 1 processo.
+
+ATIVIDADES = ["banho", "descarga", "escovar_dentes", "lavar_maos", "lavar_louca", "lavar_roupa"]
+
+
+def gerar_arquivo(caminho, linhas, semente, proporcao_invalidas=0.01):
+    aleatorio = random.Random(semente)
+    inicio = datetime(2025, 1, 1)
+    with open(caminho, "w", encoding="utf-8") as f:
+        for i in range(linhas):
+            registro = {
+                "usuario_id": aleatorio.randint(1, 200),
+                "atividade": aleatorio.choice(ATIVIDADES),
+                "volume_litros": round(aleatorio.uniform(0.5, 120), 2),
+                "timestamp": (inicio + timedelta(seconds=i * 7)).isoformat(),
+            }
+            if aleatorio.random() < proporcao_invalidas:
+                registro["volume_litros"] = "muito"
+            f.write(json.dumps(registro) + "\n")
+
+
+def banco_novo(pasta, nome):
+    engine = db.criar_engine(os.path.join(pasta, f"{nome}.db"))
+    aplicar_migracoes(engine)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalabilidade da importação paralela por número de processos")
+    parser.add_argument("--linhas", type=int, default=500_000)
+    parser.add_argument("--processos", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, 16, os.cpu_count() or 1}))
+    parser.add_argument("--fatia", type=int, default=importacao_paralela.TAMANHO_FATIA)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--sem-serial", action="store_true", help="não mede a importação serial")
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    resultados = {"linhas": args.linhas, "fatia": args.fatia, "nucleos": os.cpu_count(), "medidas": []}
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "consumo_agua.ndjson")
+        gerar_arquivo(arquivo, args.linhas, args.semente)
+        print(f"== {args.linhas} linhas ({os.path.getsize(arquivo) / 1e6:.1f} MB), {os.cpu_count()} núcleos")
+
+        if not args.sem_serial:
+            engine = banco_novo(pasta, "serial")
+            with open(arquivo, newline="", encoding="utf-8") as f:
+                resumo = importacao.importar(engine, "consumo_agua", f)
+            engine.dispose()
+            resultados["serial"] = {"segundos": resumo["segundos"], "linhas_por_segundo": resumo["linhas_por_segundo"]}
+            print(f"   serial: {resumo['segundos']}s ({resumo['linhas_por_segundo']} linhas/s)")
+
+        base = None
+        for processos in args.processos:
+            engine = banco_novo(pasta, f"paralelo_{processos}")
+            resumo = importacao_paralela.importar_paralelo(
+                engine, "consumo_agua", arquivo, processos=processos, tamanho_fatia=args.fatia)
+            engine.dispose()
+            base = base or resumo["segundos"]
+            medida = {
+                "processos": processos,
+                "segundos": resumo["segundos"],
+                "linhas_por_segundo": resumo["linhas_por_segundo"],
+                "aceleracao": round(base / resumo["segundos"], 2),
+                "aceitos": resumo["aceitos"],
+            }
+            resultados["medidas"].append(medida)
+            print(f"   {processos:>3} processos: {medida['segundos']}s ({medida['linhas_por_segundo']} linhas/s) "
+                  f"aceleração {medida['aceleracao']}x")
+
+    if args.processos and max(args.processos) > (os.cpu_count() or 1):
+        print(f"⚠️ mais processos que núcleos ({os.cpu_count()}): os pontos acima disso não indicam escala")
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"✅ resultados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
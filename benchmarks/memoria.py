@@ -0,0 +1,88 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto (e a pasta da UI, para o util) ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'ui')))
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import func, select
+
+import util
+from api import config, db, dimensoes
+
+# Compara a memória e o tempo de carga dos DataFrames de leituras dos dashboards:
+# "nomes" é a carga como era antes das tabelas de dimensão (atividade/equipamento
+# como texto, medidas em float64); "compacta" é o carregar_dados atual (ids da
+# dimensão convertidos em category, medidas em float32).
+
+
+def carga_nomes(tabela, dias, engine):
+    tbl = util.TABELAS[tabela]
+    sel = dimensoes.selecionar(tabela, tbl, util.COLUNAS_CONSUMO[tabela])
+    sel = sel.where(tbl.c.timestamp >= func.date("now", f"-{int(dias)} day")).order_by(tbl.c.timestamp)
+    return util.tipar(pd.read_sql(sel, engine)).set_index("timestamp")
+
+
+def medir(carregar, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        df = carregar()
+        tempos.append(time.perf_counter() - inicio)
+    return df, min(tempos)
+
+
+def dias_cobertos(engine, tabela):
+    with engine.connect() as conn:
+        primeiro = conn.execute(select(func.min(util.TABELAS[tabela].c.timestamp))).scalar()
+    if primeiro is None:
+        return 1
+    return (datetime.now() - pd.Timestamp(primeiro).to_pydatetime()).days + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória dos DataFrames de leituras: nomes x compacto")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--dias", type=int, help="janela carregada (padrão: todas as leituras)")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    engine = db.criar_engine(os.path.abspath(args.db))
+    resultados = {}
+    for tabela in sorted(dimensoes.DIMENSOES):
+        dias = args.dias or dias_cobertos(engine, tabela)
+        nomes, ms_nomes = medir(lambda: carga_nomes(tabela, dias, engine), args.repeticoes)
+        compacta, ms_compacta = medir(
+            lambda: util.carregar_dados.__wrapped__(tabela, dias, engine), args.repeticoes)
+        mb_nomes = nomes.memory_usage(deep=True).sum() / 1e6
+        mb_compacta = compacta.memory_usage(deep=True).sum() / 1e6
+        resultados[tabela] = {
+            "linhas": len(compacta),
+            "nomes_mb": round(mb_nomes, 2),
+            "compacta_mb": round(mb_compacta, 2),
+            "reducao": round(mb_nomes / mb_compacta, 2) if mb_compacta else None,
+            "nomes_ms": round(ms_nomes * 1000, 1),
+            "compacta_ms": round(ms_compacta * 1000, 1),
+        }
+        print(f"== {tabela}: {len(compacta)} linhas")
+        print(f"   nomes   : {mb_nomes:8.2f} MB  {ms_nomes * 1000:8.1f} ms")
+        print(f"   compacta: {mb_compacta:8.2f} MB  {ms_compacta * 1000:8.1f} ms  "
+              f"({resultados[tabela]['reducao']}x menos memória)")
+        print(f"   tipos   : {dict(compacta.dtypes.astype(str))}")
+    engine.dispose()
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"✅ resultados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import shutil
+import tempfile
+import time
+
+from api import config, db
+from api.migracoes import aplicar_migracoes, versao_atual
+
+# Compara o plano de execução e o tempo das consultas dos dashboards
+# antes e depois das migrações, em uma cópia do banco.
+
+# {atividade}/{equipamento}: o filtro pelo nome muda de forma quando a coluna vira id (migração 7)
+CONSULTAS = {
+    "carregar_dados agua (atividade)":
+        "SELECT * FROM consumo_agua WHERE timestamp >= date('now','-{dias} day') AND {atividade}",
+    "carregar_dados energia (equipamento)":
+        "SELECT * FROM consumo_energia WHERE timestamp >= date('now','-{dias} day') AND {equipamento}",
+    "carregar_dados agua (todas)":
+        "SELECT * FROM consumo_agua WHERE timestamp >= date('now','-{dias} day')",
+    "historico por usuario":
+        "SELECT * FROM consumo_agua WHERE usuario_id = 2 AND timestamp >= date('now','-{dias} day')",
+    "compras por produto":
+        "SELECT * FROM compra WHERE produto_id = 1",
+}
+
+
+def filtro_dimensao(conn, tabela, nome, dimensao, valor):
+    colunas = [linha[1] for linha in conn.exec_driver_sql(f"PRAGMA table_info({tabela})")]
+    if nome in colunas:
+        return f"{nome} = '{valor}'"
+    return f"{nome}_id = (SELECT id FROM {dimensao} WHERE nome = '{valor}')"
+
+
+def medir(engine, repeticoes, dias):
+    resultado = {}
+    with engine.connect() as conn:
+        atividade = filtro_dimensao(conn, "consumo_agua", "atividade", "atividade_tipo", "banho")
+        equipamento = filtro_dimensao(conn, "consumo_energia", "equipamento", "equipamento", "geladeira")
+        for nome, sql in CONSULTAS.items():
+            sql = sql.format(dias=dias, atividade=atividade, equipamento=equipamento)
+            plano = [linha[-1] for linha in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                conn.exec_driver_sql(sql).fetchall()
+            ms = (time.perf_counter() - inicio) / repeticoes * 1000
+            resultado[nome] = (plano, ms)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planos de consulta antes/depois das migrações")
+    parser.add_argument("--db", default=config.DB_PATH)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        copia = os.path.join(pasta, "consumo.db")
+        shutil.copy(args.db, copia)
+        engine = db.criar_engine(copia)
+
+        print(f"Banco na versão {versao_atual(engine)}")
+        antes = medir(engine, args.repeticoes, args.dias)
+        aplicar_migracoes(engine)
+        print(f"Migrado para a versão {versao_atual(engine)}\n")
+        depois = medir(engine, args.repeticoes, args.dias)
+        engine.dispose()
+
+    for nome in CONSULTAS:
+        (plano_antes, ms_antes), (plano_depois, ms_depois) = antes[nome], depois[nome]
+        print(f"== {nome}")
+        print(f"   antes : {' | '.join(plano_antes)}  ({ms_antes:.3f} ms)")
+        print(f"   depois: {' | '.join(plano_depois)}  ({ms_depois:.3f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from api import formatos
+
+# Compara o tempo de codificação e o tamanho do corpo de uma resposta de leituras
+# (o formato de GET /consumo_agua) em cada formato: o caminho padrão do FastAPI
+# (jsonable_encoder + json.dumps, como era antes), orjson em linhas, orjson colunar
+# e Arrow IPC, cada um sem compressão, com gzip e com br (se o brotli estiver instalado).
+
+ATIVIDADES = ["banho", "descarga", "lavar_louca", "lavar_maos", "escovar_dentes", "tanque", "cozinhar"]
+
+
+def gerar_linhas(n, semente=42):
+    aleatorio = random.Random(semente)
+    inicio = datetime(2025, 1, 1)
+    return [{
+        "id": i + 1,
+        "usuario_id": aleatorio.randint(1, 50),
+        "atividade": aleatorio.choice(ATIVIDADES),
+        "volume_litros": round(aleatorio.uniform(0.2, 80), 2),
+        "timestamp": inicio + timedelta(seconds=i * 37),
+    } for i in range(n)]
+
+
+def fastapi_padrao(pagina):
+    # o que o FastAPI faz com um dict devolvido pelo endpoint (serialize_response + JSONResponse)
+    return json.dumps(jsonable_encoder(pagina), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def codificadores():
+    return {
+        "fastapi (json)": fastapi_padrao,
+        "orjson linhas": formatos.para_json,
+        "orjson colunar": lambda pagina: formatos.para_json({**pagina, "dados": formatos.colunar(pagina["dados"])}),
+        "arrow": lambda pagina: formatos.para_arrow(formatos.colunar(pagina["dados"])),
+    }
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de codificação e tamanho das respostas em cada formato")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    pagina = {"dados": gerar_linhas(args.linhas), "proximo_cursor": None}
+    compressoes = ["gzip"] + (["br"] if formatos.brotli else [])
+    resultados = {}
+    print(f"== {args.linhas} linhas (melhor de {args.repeticoes})")
+    print(f"{'formato':<16} {'codificar':>10} {'bytes':>12}" + "".join(f" {c + ' (ms)':>12} {c + ' bytes':>12}" for c in compressoes))
+    for nome, codificar in codificadores().items():
+        corpo, segundos = medir(lambda: codificar(pagina), args.repeticoes)
+        resultado = {"codificar_ms": round(segundos * 1000, 1), "bytes": len(corpo)}
+        linha = f"{nome:<16} {segundos * 1000:8.1f}ms {len(corpo):12,}"
+        for codificacao in compressoes:
+            comprimido, segundos = medir(lambda: formatos.comprimir(corpo, codificacao), max(1, args.repeticoes // 2))
+            resultado[f"{codificacao}_ms"] = round(segundos * 1000, 1)
+            resultado[f"{codificacao}_bytes"] = len(comprimido)
+            linha += f" {segundos * 1000:10.1f}ms {len(comprimido):12,}"
+        resultados[nome] = resultado
+        print(linha)
+
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({"linhas": args.linhas, "formatos": resultados}, f, indent=2, ensure_ascii=False)
+        print(f"✅ resultados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import sys
+import os
+
+# Adiciona o diretório raiz do projeto (e a pasta da UI, para o util) ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'ui')))
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from sqlalchemy import func, select
+
+from api import config, db
+from api.tables import consumo_agua, consumo_energia, produto_tbl, compra_tbl, atividade_tbl
+from concorrencia import esperar_api
+
+# Mede os caminhos quentes (endpoints da API e funções de carga da UI) sobre um
+# banco, de preferência gerado por gerar_dados.py, e grava um JSON com os tempos
+# para comparar execuções: python benchmarks/suite.py --db x.db --comparar anterior.json
+
+PASTA_RESULTADOS = os.path.join(config.BASE_DIR, "benchmarks", "resultados")
+
+
+def resumo(tempos):
+    ordenados = sorted(tempos)
+    quantis = statistics.quantiles(ordenados, n=100) if len(ordenados) > 1 else ordenados * 99
+    return {
+        "n": len(ordenados),
+        "media_ms": round(statistics.fmean(ordenados) * 1000, 3),
+        "p50_ms": round(quantis[49] * 1000, 3),
+        "p95_ms": round(quantis[94] * 1000, 3),
+        "min_ms": round(ordenados[0] * 1000, 3),
+        "max_ms": round(ordenados[-1] * 1000, 3),
+    }
+
+
+def medir(funcao, repeticoes, aquecimento=1):
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resumo(tempos)
+
+
+def leitura_agua(i):
+    return {
+        "usuario_id": i % 50 + 1,
+        "atividade": random.choice(["banho", "descarga", "lavar_louca"]),
+        "volume_litros": round(random.uniform(0.5, 60), 2),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def requisicao(sessao, url, metodo, caminho, **kwargs):
+    def chamar():
+        resposta = sessao.request(metodo, f"{url}{caminho}", timeout=60, **kwargs)
+        resposta.raise_for_status()
+    return chamar
+
+
+def casos_api(sessao, url):
+    lote = [leitura_agua(i) for i in range(500)]
+    return {
+        "GET /consumo_agua limite=1000": requisicao(sessao, url, "GET", "/consumo_agua", params={"limite": 1000}),
+        "GET /consumo_energia limite=1000": requisicao(
+            sessao, url, "GET", "/consumo_energia", params={"limite": 1000}),
+        "GET /agregados/consumo_agua dia por atividade": requisicao(
+            sessao, url, "GET", "/agregados/consumo_agua", params={"granularidade": "dia", "por": "atividade"}),
+        "GET /agregados/consumo_energia hora": requisicao(
+            sessao, url, "GET", "/agregados/consumo_energia", params={"granularidade": "hora"}),
+        "POST /consumo_agua": requisicao(sessao, url, "POST", "/consumo_agua", json=leitura_agua(0)),
+        "POST /consumo_agua/lote 500": requisicao(sessao, url, "POST", "/consumo_agua/lote", json=lote),
+    }
+
+
+def concorrente(url, clientes, segundos):
+    # leituras paginadas por vários clientes ao mesmo tempo: mede vazão e latência sob carga
+    fim = time.time() + segundos
+
+    def cliente(_):
+        sessao = requests.Session()
+        chamar = requisicao(sessao, url, "GET", "/consumo_agua", params={"limite": 100})
+        tempos = []
+        while time.time() < fim:
+            inicio = time.perf_counter()
+            chamar()
+            tempos.append(time.perf_counter() - inicio)
+        return tempos
+
+    with ThreadPoolExecutor(clientes) as executor:
+        tempos = [t for r in executor.map(cliente, range(clientes)) for t in r]
+    return {**resumo(tempos), "clientes": clientes, "req_por_s": round(len(tempos) / segundos, 1)}
+
+
+def rodar_api(banco, porta, repeticoes, clientes, segundos):
+    # a API escreve no banco, então roda sobre uma cópia
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        copia = os.path.join(pasta, "consumo.db")
+        shutil.copy(banco, copia)
+        env = {**os.environ, "CONSUMO_DB": copia}
+        processo = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api.app:app", "--port", str(porta), "--log-level", "warning"],
+            cwd=config.BASE_DIR, env=env,
+        )
+        url = f"http://127.0.0.1:{porta}"
+        try:
+            esperar_api(url, processo)
+            sessao = requests.Session()
+            for nome, chamar in casos_api(sessao, url).items():
+                resultados[nome] = medir(chamar, repeticoes)
+                print(f"   {nome}: p50={resultados[nome]['p50_ms']}ms")
+            resultados[f"GET /consumo_agua limite=100 x{clientes}"] = concorrente(url, clientes, segundos)
+        finally:
+            processo.terminate()
+            processo.wait()
+    return resultados
+
+
+def rodar_ui(banco, repeticoes, dias):
+    # chama as funções sem o cache da UI (__wrapped__), para medir a consulta em si
+    import util
+
+    engine = db.criar_engine(banco)
+    produtos = util.carregar_produtos.__wrapped__(engine)
+    compras = util.carregar_compras.__wrapped__(engine)
+    atividades = util.carregar_atividades.__wrapped__(engine)
+    casos = {
+        "carregar_dados consumo_agua": lambda: util.carregar_dados.__wrapped__("consumo_agua", dias, engine),
+        "carregar_dados consumo_energia": lambda: util.carregar_dados.__wrapped__("consumo_energia", dias, engine),
+        "carregar_rollup consumo_agua dia": lambda: util.carregar_rollup.__wrapped__(
+            "consumo_agua", "dia", engine, dias),
+        "dias_monitorados consumo_agua": lambda: util.dias_monitorados.__wrapped__("consumo_agua", engine),
+        "carregar_atividades": lambda: util.carregar_atividades.__wrapped__(engine),
+        "calcular_consumo_mensal": lambda: util.calcular_consumo_mensal(
+            atividades.copy(), produtos, compras.copy()),
+        "gasto_por_produto": lambda: util.gasto_por_produto(compras, produtos),
+    }
+    resultados = {}
+    for nome, chamar in casos.items():
+        resultados[nome] = medir(chamar, repeticoes)
+        print(f"   {nome}: p50={resultados[nome]['p50_ms']}ms")
+    engine.dispose()
+    return resultados
+
+
+def metadados(banco):
+    engine = db.criar_engine(banco)
+    with engine.connect() as conn:
+        linhas = {
+            tbl.name: conn.execute(select(func.count()).select_from(tbl)).scalar()
+            for tbl in (consumo_agua, consumo_energia, produto_tbl, compra_tbl, atividade_tbl)
+        }
+    engine.dispose()
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=config.BASE_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "banco": os.path.abspath(banco),
+        "linhas": linhas,
+    }
+
+
+def comparar(atual, anterior, tolerancia):
+    # compara p50 de cada caso presente nos dois arquivos; devolve os que pioraram além da tolerância
+    piores = []
+    print(f"== comparação com {anterior['metadados'].get('commit') or 'execução anterior'}")
+    for grupo in ("api", "ui"):
+        for nome, medida in atual.get(grupo, {}).items():
+            antes = anterior.get(grupo, {}).get(nome)
+            if not antes or not antes["p50_ms"]:
+                continue
+            variacao = medida["p50_ms"] / antes["p50_ms"] - 1
+            marca = "⚠️ " if variacao > tolerancia else "   "
+            print(f"{marca}{grupo} | {nome}: {antes['p50_ms']}ms -> {medida['p50_ms']}ms ({variacao:+.0%})")
+            if variacao > tolerancia:
+                piores.append(nome)
+    return piores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suíte de benchmarks da API e da UI")
+    parser.add_argument("--db", default=config.DB_PATH, help="banco medido (ex.: gerado por gerar_dados.py)")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--segundos", type=int, default=5, help="duração do teste concorrente")
+    parser.add_argument("--dias", type=int, default=3650, help="janela usada nas cargas da UI")
+    parser.add_argument("--porta", type=int, default=8766)
+    parser.add_argument("--sem-api", action="store_true")
+    parser.add_argument("--sem-ui", action="store_true")
+    parser.add_argument("--saida", help="arquivo JSON de resultados (padrão: benchmarks/resultados/)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora aceitável no p50 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    banco = os.path.abspath(args.db)
+    resultados = {"metadados": metadados(banco)}
+    print(f"== {banco}: {resultados['metadados']['linhas']}")
+    if not args.sem_ui:
+        print("== UI")
+        resultados["ui"] = rodar_ui(banco, args.repeticoes, args.dias)
+    if not args.sem_api:
+        print("== API")
+        resultados["api"] = rodar_api(banco, args.porta, args.repeticoes, args.clientes, args.segundos)
+
+    saida = args.saida
+    if not saida:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        nome = f"{datetime.now():%Y%m%d-%H%M%S}-{resultados['metadados']['commit'] or 'local'}.json"
+        saida = os.path.join(PASTA_RESULTADOS, nome)
+    with open(saida, "w") as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"✅ resultados em {saida}")
+
+    if args.comparar:
+        with open(args.comparar) as f:
+            piores = comparar(resultados, json.load(f), args.tolerancia)
+        if piores:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+# a configuração é lida quando api.config é importado: banco e pastas da API vão para
+# um diretório temporário antes de qualquer import do projeto
+PASTA = tempfile.mkdtemp(prefix="consumo_testes_")
+os.environ.update({
+    "CONSUMO_DB": os.path.join(PASTA, "consumo.db"),
+    "CONSUMO_ARQUIVO_DIR": os.path.join(PASTA, "arquivo"),
+    "CONSUMO_SNAPSHOT_DIR": os.path.join(PASTA, "snapshots"),
+    "CONSUMO_MODELOS_DIR": os.path.join(PASTA, "modelos"),
+    "CONSUMO_SHARDS_DIR": os.path.join(PASTA, "shards"),
+    "CONSUMO_CAIXA_SAIDA": os.path.join(PASTA, "caixa_saida.db"),
+    # os testes chamam o escritor dos modelos direto, sem a tarefa periódica
+    "CONSUMO_PREVISAO_INTERVALO_S": "0",
+})
+os.environ.pop("CONSUMO_SHARDS", None)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from api import db, migracoes
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # banco novo, no esquema atual
+    engine = db.criar_engine(str(tmp_path / "consumo.db"))
+    migracoes.aplicar_migracoes(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    from fastapi.testclient import TestClient
+
+    from api.app import app
+
+    with TestClient(app) as cliente:
+        yield cliente
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from api import agregados, escrita
+from api.tables import consumo_agua
+
+ATIVIDADES = ["banho", "descarga", "lavar_louca"]
+
+
+@pytest.fixture
+def com_leituras(engine):
+    inicio = datetime(2024, 4, 1, 0, 30)
+    linhas = [{"usuario_id": 1 + i % 3, "atividade": ATIVIDADES[i % len(ATIVIDADES)],
+               "volume_litros": float(i % 17), "timestamp": inicio + timedelta(hours=7 * i)} for i in range(300)]
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, linhas)
+    return engine
+
+
+@pytest.mark.parametrize("granularidade", ["dia", "semana", "mes", "total"])
+@pytest.mark.parametrize("por", [(), ("usuario_id",), ("atividade",), ("usuario_id", "atividade")])
+def test_rollup_e_leituras_dao_o_mesmo_resultado(com_leituras, granularidade, por):
+    # dias inteiros usam o rollup; um microssegundo depois da meia-noite força as leituras
+    dias, bruto = datetime(2024, 4, 1), datetime(2024, 4, 1, 0, 0, 0, 1)
+    fim = datetime(2024, 6, 1)
+    assert agregados.origem("consumo_agua", granularidade, dias, fim)[3] is not None
+    assert agregados.origem("consumo_agua", granularidade, bruto, fim)[3] is None
+    with com_leituras.connect() as conn:
+        rollup = agregados.agregar(conn, "consumo_agua", granularidade, por, dias, fim)
+        leituras = agregados.agregar(conn, "consumo_agua", granularidade, por, bruto, fim)
+    assert rollup["colunas"] == leituras["colunas"]
+    assert rollup["dados"] == pytest.approx(leituras["dados"])
+    assert sum(rollup["dados"]["leituras"]) == sum(1 for i in range(300)
+                                                   if datetime(2024, 4, 1, 0, 30) + timedelta(hours=7 * i) < fim)
+
+
+def test_filtro_por_dimensao(com_leituras):
+    with com_leituras.connect() as conn:
+        banho = agregados.agregar(conn, "consumo_agua", "total", (), None, None, {"atividade": "banho"})
+        todas = agregados.agregar(conn, "consumo_agua", "total", ("atividade",))
+    indice = todas["dados"]["atividade"].index("banho")
+    assert banho["dados"]["volume_litros"] == [todas["dados"]["volume_litros"][indice]]
+
+
+def test_dimensao_invalida(com_leituras):
+    with com_leituras.connect() as conn, pytest.raises(ValueError):
+        agregados.agregar(conn, "consumo_agua", "dia", ("volume_litros",))
+
+
+def test_endpoint_rejeita_granularidade_invalida(cliente):
+    assert cliente.get("/agregados/consumo_agua?granularidade=ano").status_code == 400
+    assert cliente.get("/agregados/nao_existe").status_code == 404
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from api import amostragem
+
+
+def serie(n, semente=3):
+    aleatorio = np.random.default_rng(semente)
+    return pd.Series(aleatorio.uniform(0, 10, n), index=pd.date_range("2025-01-01", periods=n, freq="min"))
+
+
+@pytest.mark.parametrize("pontos", [1, 2, 3, 4, 5, 10, 11, 100])
+def test_reduzir_serie_respeita_o_orcamento(pontos):
+    s = serie(1000)
+    s.iloc[500] = 1000.0
+    reduzida = amostragem.reduzir_serie(s, pontos)
+    assert 0 < len(reduzida) <= pontos
+    # o pico sobrevive a qualquer orçamento
+    assert reduzida.max() == 1000.0
+
+
+def test_reduzir_serie_mantem_as_pontas():
+    s = serie(1000)
+    reduzida = amostragem.reduzir_serie(s, 10)
+    assert reduzida.index[0] == s.index[0] and reduzida.index[-1] == s.index[-1]
+
+
+@pytest.mark.parametrize("grupos,pontos", [(3, 10), (5, 12), (20, 10), (50, 40)])
+def test_reduzir_colunar_respeita_o_orcamento_com_grupos(grupos, pontos):
+    n = 200 * grupos
+    dados = {
+        "periodo": list(pd.date_range("2025-01-01", periods=200, freq="D").repeat(grupos)),
+        "usuario_id": list(np.tile(np.arange(grupos), 200)),
+        "volume_litros": list(np.random.default_rng(1).uniform(0, 10, n)),
+    }
+    reduzidos = amostragem.reduzir_colunar(dados, "periodo", "volume_litros", pontos, ["usuario_id"])
+    assert len(reduzidos["periodo"]) <= pontos
+    if grupos <= pontos:
+        assert set(reduzidos["usuario_id"]) == set(range(grupos))
+
+
+def test_repartir_soma_no_maximo_o_orcamento():
+    orcamentos = amostragem.repartir([1000, 10, 3], 10)
+    assert orcamentos.sum() <= 10 and (orcamentos >= 1).all()
+    assert list(amostragem.repartir([2, 2], 10)) == [2, 2]
@@ -0,0 +1,85 @@
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from api import anomalias, escrita
+from api.tables import alerta_tbl, consumo_agua, consumo_energia
+
+PARAMETROS = {"alfa": 0.05, "limiar": 4.0, "limiar_nivel": 6.0, "aquecimento": 20}
+
+
+def serie(valores, inicio=datetime(2024, 6, 1, 12), passo=timedelta(days=1)):
+    return [{"usuario_id": 1, "atividade_id": 1, "volume_litros": v, "timestamp": inicio + i * passo}
+            for i, v in enumerate(valores)]
+
+
+def normais(n, semente=3):
+    aleatorio = random.Random(semente)
+    return [aleatorio.uniform(5, 15) for _ in range(n)]
+
+
+def test_aquecimento_nao_gera_alertas():
+    # mesmo valores absurdos não disparam antes de a série ter histórico
+    valores = normais(10) + [500.0] + normais(8)
+    assert anomalias.processar("consumo_agua", serie(valores), {}, PARAMETROS) == []
+
+
+def test_pico_dispara_alerta_pontual():
+    linhas = serie(normais(60) + [200.0] + normais(5, semente=4))
+    alertas = anomalias.processar("consumo_agua", linhas, {}, PARAMETROS)
+    assert [(a["teste"], a["tipo"], a["valor"]) for a in alertas] == [("pico", "consumo_alto", 200.0)]
+    assert alertas[0]["timestamp"] == linhas[60]["timestamp"]
+    assert 5 < alertas[0]["esperado"] < 15
+
+
+def test_pico_de_madrugada_e_vazamento():
+    linhas = serie(normais(60) + [200.0], inicio=datetime(2024, 6, 1, 3))
+    alertas = anomalias.processar("consumo_agua", linhas, {}, PARAMETROS)
+    assert [(a["teste"], a["tipo"]) for a in alertas] == [("pico", "vazamento")]
+
+
+def test_deriva_sustentada_dispara_cusum_uma_vez():
+    # 50% acima do normal em todas as leituras: nenhuma passa o limiar do pico, o CUSUM acumula
+    valores = normais(60) + [1.5 * v for v in normais(40, semente=5)]
+    linhas, estados = serie(valores), {}
+    alertas = anomalias.processar("consumo_agua", linhas[:70], estados, PARAMETROS)
+    assert [(a["teste"], a["tipo"]) for a in alertas] == [("nivel", "vazamento")]
+    assert alertas[0]["timestamp"] > linhas[60]["timestamp"]
+    assert estados[(1, 1)]["em_deriva"]
+    # a média se ajusta ao novo nível: não avisa de novo enquanto ele durar
+    assert anomalias.processar("consumo_agua", linhas[70:], estados, PARAMETROS) == []
+
+
+def test_estado_continua_entre_lotes():
+    valores = normais(60) + [200.0]
+    linhas = serie(valores)
+    estados = {}
+    assert anomalias.processar("consumo_agua", linhas[:30], estados, PARAMETROS) == []
+    alertas = anomalias.processar("consumo_agua", linhas[30:], estados, PARAMETROS)
+    assert anomalias.processar("consumo_agua", linhas, {}, PARAMETROS) == alertas
+    assert estados[(1, 1)]["leituras"] == len(valores)
+
+
+def test_escrita_grava_alertas_de_energia(engine):
+    inicio = datetime(2024, 7, 1)
+    linhas = [{"usuario_id": 5, "equipamento": "geladeira", "potencia_w": 150.0, "gasto_h": g,
+               "timestamp": inicio + timedelta(hours=i)} for i, g in enumerate(normais(40) + [300.0])]
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_energia, linhas[:20])
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_energia, linhas[20:])
+    with engine.connect() as conn:
+        alertas = anomalias.listar(conn, tabela="consumo_energia")
+        assert conn.execute(select(alerta_tbl.c.id).where(alerta_tbl.c.tabela == "consumo_agua")).all() == []
+    assert [(a["tipo"], a["item"], a["valor"]) for a in alertas] == [("falha_equipamento", "geladeira", 300.0)]
+
+
+def test_reconstruir_reproduz_o_estado_da_escrita(engine):
+    linhas = [{"usuario_id": 1, "atividade": "banho", "volume_litros": v, "timestamp": datetime(2024, 8, 1) + timedelta(hours=i)}
+              for i, v in enumerate(normais(50))]
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, linhas)
+        incremental = anomalias.carregar_estados(conn, "consumo_agua", [(1, 1)])
+        anomalias.reconstruir(conn, "consumo_agua")
+        assert anomalias.carregar_estados(conn, "consumo_agua", [(1, 1)]) == incremental
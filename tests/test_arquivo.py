@@ -0,0 +1,148 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from api import arquivo, config, db, escrita, migracoes
+from api.tables import consumo_agua
+
+
+def leituras(inicio, n, usuario_id=1):
+    return [{"usuario_id": usuario_id, "atividade": "banho", "volume_litros": 10.0 + i,
+             "timestamp": inicio + timedelta(hours=i)} for i in range(n)]
+
+
+def gravar(engine, linhas):
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, linhas)
+
+
+def ids(engine):
+    with engine.connect() as conn:
+        return [i for i, in conn.exec_driver_sql("SELECT id FROM consumo_agua ORDER BY id")]
+
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    pasta = str(tmp_path / "arquivo")
+    monkeypatch.setattr(config, "ARQUIVO_DIR", pasta)
+    return pasta
+
+
+def test_ids_nao_sao_reusados_depois_de_arquivar_tudo(engine, pasta):
+    antigas = leituras(datetime(2020, 1, 1), 5)
+    gravar(engine, antigas)
+    arquivados = ids(engine)
+    movidas, _ = arquivo.arquivar(engine, "consumo_agua", horizonte_dias=365, pasta=pasta)
+    assert movidas == 5 and ids(engine) == []
+
+    gravar(engine, leituras(datetime.now() - timedelta(days=1), 2, usuario_id=2))
+    assert min(ids(engine)) > max(arquivados)
+    with engine.connect() as conn:
+        df = arquivo.ler_consumo(conn, "consumo_agua", pasta=pasta)
+    assert len(df) == 7
+    assert df["id"].is_unique
+
+
+def test_migracao_9_comeca_acima_do_arquivo(tmp_path, pasta, monkeypatch):
+    engine = db.criar_engine(str(tmp_path / "v8.db"))
+    migracoes.aplicar_migracoes(engine, ate=8)
+    gravar(engine, leituras(datetime(2020, 1, 1), 5))
+    arquivados = ids(engine)
+    arquivo.arquivar(engine, "consumo_agua", horizonte_dias=365, pasta=pasta)
+
+    # a pasta vem de quem migra, não da configuração do momento
+    monkeypatch.setattr(config, "ARQUIVO_DIR", str(tmp_path / "outra"))
+    with pytest.raises(RuntimeError):
+        migracoes.aplicar_migracoes(engine)
+    assert migracoes.versao_atual(engine) == 8
+    assert migracoes.aplicar_migracoes(engine, pasta_arquivo=pasta) == [(9, migracoes.MIGRACOES[8][1])]
+    gravar(engine, leituras(datetime.now(), 1))
+    assert ids(engine)[0] > max(arquivados)
+    engine.dispose()
+
+
+def test_lote_no_arquivo_e_no_banco_aparece_uma_vez(engine, pasta):
+    # arquivamento interrompido entre gravar o Parquet e apagar do banco
+    gravar(engine, leituras(datetime(2020, 1, 1), 4))
+    with engine.connect() as conn:
+        df = arquivo.ler_consumo(conn, "consumo_agua")
+    arquivo.snapshot.gravar_parte(df, "consumo_agua", "timestamp", pasta)
+    with engine.begin() as conn:
+        arquivo.salvar_estado(conn, "consumo_agua", {"arquivado_ate": None, "corte": datetime(2021, 1, 1), "linhas": 0})
+        df = arquivo.ler_consumo(conn, "consumo_agua", pasta=pasta)
+    assert len(df) == 4
+
+
+def paginas(conn, tabela, limite, **filtros):
+    linhas, cursor = [], None
+    while True:
+        pagina = arquivo.pagina_consumo(conn, tabela, filtros.get("coluna"), filtros.get("valor"), None, None,
+                                        cursor, limite)
+        assert len(pagina["dados"]) <= limite
+        linhas.extend(pagina["dados"])
+        cursor = pagina["proximo_cursor"]
+        if not cursor:
+            return linhas
+
+
+def test_paginas_atravessam_o_arquivo_na_ordem(engine, pasta):
+    # dois usuários com leituras intercaladas, parte arquivada e parte no banco
+    gravar(engine, leituras(datetime(2020, 1, 1), 60) + leituras(datetime(2020, 1, 1, 0, 30), 60, usuario_id=2))
+    gravar(engine, leituras(datetime.now() - timedelta(days=2), 10))
+    with engine.connect() as conn:
+        antes = arquivo.ler_consumo(conn, "consumo_agua")
+    arquivo.arquivar(engine, "consumo_agua", horizonte_dias=365, pasta=pasta)
+
+    with engine.connect() as conn:
+        linhas = paginas(conn, "consumo_agua", 7)
+        banco = arquivo.pagina_consumo(conn, "consumo_agua", None, None, datetime.now() - timedelta(days=3),
+                                       None, None, 1)["dados"]
+    assert [l["id"] for l in linhas] == list(antes["id"])
+    # as páginas do arquivo têm as mesmas colunas, na mesma ordem, que as do banco
+    assert list(linhas[0]) == list(banco[0]) == ["id", "usuario_id", "atividade", "volume_litros", "timestamp"]
+
+
+def test_mes_arquivado_e_lido_aos_poucos(engine, pasta):
+    gravar(engine, leituras(datetime(2020, 1, 1), 200))
+    arquivo.arquivar(engine, "consumo_agua", horizonte_dias=365, pasta=pasta)
+    with engine.connect() as conn:
+        df = arquivo.ler_mes(conn, "consumo_agua", None, None, datetime(2020, 1, 1), datetime(2020, 2, 1), None, 10)
+        cursor = arquivo.consultas.codificar_cursor(df["timestamp"].iloc[-1], int(df["id"].iloc[-1]))
+        seguinte = arquivo.ler_mes(conn, "consumo_agua", None, None, datetime(2020, 1, 1), datetime(2020, 2, 1),
+                                   cursor, 10)
+    assert list(df["id"]) == list(range(1, 12))
+    assert list(seguinte["id"]) == list(range(12, 23))
+    colunas = ["id", "usuario_id", "atividade", "volume_litros", "timestamp"]
+    parte = arquivo.ler_arquivo("consumo_agua", colunas, datetime(2020, 1, 1), datetime(2020, 2, 1), {}, None, 5, pasta)
+    assert list(parte["id"]) == [1, 2, 3, 4, 5]
+
+
+def test_lote_repetido_nao_pula_linhas_na_pagina(engine, pasta):
+    # arquivamento interrompido: as mesmas linhas no Parquet e no banco
+    gravar(engine, leituras(datetime(2020, 1, 1), 9))
+    with engine.connect() as conn:
+        df = arquivo.ler_consumo(conn, "consumo_agua")
+    arquivo.snapshot.gravar_parte(df.iloc[:6], "consumo_agua", "timestamp", pasta)
+    with engine.begin() as conn:
+        arquivo.salvar_estado(conn, "consumo_agua", {"arquivado_ate": None, "corte": datetime(2021, 1, 1), "linhas": 0})
+    with engine.connect() as conn:
+        assert [l["id"] for l in paginas(conn, "consumo_agua", 2)] == list(range(1, 10))
+
+
+def test_filtros_com_fuso_depois_de_arquivar(cliente):
+    engine = db.criar_engine(config.DB_PATH)
+    gravar(engine, leituras(datetime(2019, 3, 1), 48, usuario_id=900))
+    corte = datetime(2019, 6, 15)
+    arquivo.arquivar(engine, "consumo_agua", horizonte_dias=(datetime.now() - corte).days)
+    engine.dispose()
+
+    ingenuo = cliente.get("/consumo_agua?inicio=2019-03-01T12:00:00&fim=2019-03-02T00:00:00")
+    assert ingenuo.status_code == 200 and len(ingenuo.json()["dados"]) == 12
+    for consulta in ("inicio=2019-03-01T12:00:00Z&fim=2019-03-02T00:00:00Z",
+                     "inicio=2019-03-01T09:00:00-03:00&fim=2019-03-01T21:00:00-03:00"):
+        resposta = cliente.get(f"/consumo_agua?{consulta}")
+        assert resposta.status_code == 200
+        assert resposta.json() == ingenuo.json()
+    assert cliente.get("/consumo_agua?fim=2019-03-01T01:00:00Z").status_code == 200
+    assert cliente.get("/agregados/consumo_agua?inicio=2019-03-01T00:00:00Z&granularidade=total").status_code == 200
+    assert cliente.get("/consumo_agua?stream=true&inicio=2019-03-01T12:00:00Z").status_code == 200
@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from api import db, metricas
+from api.buffer_escrita import BufferEscrita, FilaCheia
+from api.tables import consumo_agua
+
+
+def leitura(i):
+    return {"usuario_id": 1, "atividade": "banho", "volume_litros": 1.0, "timestamp": datetime(2024, 5, 1, 0, 0, i)}
+
+
+def contar(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT count(*) FROM consumo_agua").scalar()
+
+
+def rodar(engine, teste, **opcoes):
+    async def principal():
+        engine_async = db.criar_engine_async(engine.url.database)
+        buffer = BufferEscrita(engine_async, **opcoes)
+        try:
+            return await teste(buffer)
+        finally:
+            await engine_async.dispose()
+
+    return asyncio.run(principal())
+
+
+def test_flush_responde_depois_do_commit_em_um_lote(engine):
+    async def teste(buffer):
+        buffer.iniciar()
+        await asyncio.gather(*[buffer.enfileirar(consumo_agua, leitura(i)) for i in range(50)])
+        # com durabilidade "flush" o enfileirar só volta com a leitura gravada
+        assert contar(engine) == 50
+        await buffer.encerrar()
+        return buffer.gravadas
+
+    def inserts():
+        return metricas.consultas.resumo().get(("INSERT", "consumo_agua"), (0, 0))[0]
+
+    antes = inserts()
+    assert rodar(engine, teste, max_linhas=100, intervalo_ms=50) == 50
+    # um único executemany para as 50 leituras
+    assert inserts() - antes == 1
+
+
+def test_fila_cheia_aplica_backpressure(engine):
+    async def teste(buffer):
+        # sem a tarefa de gravação, a fila enche e o próximo espera timeout_fila e desiste
+        for i in range(2):
+            await buffer.enfileirar(consumo_agua, leitura(i))
+        with pytest.raises(FilaCheia):
+            await buffer.enfileirar(consumo_agua, leitura(2))
+
+    rodar(engine, teste, capacidade=2, durabilidade="fila", timeout_fila=0.05)
+    assert contar(engine) == 0
+
+
+def test_encerrar_grava_o_que_ja_estava_na_fila(engine):
+    async def teste(buffer):
+        buffer.iniciar()
+        for i in range(30):
+            await buffer.enfileirar(consumo_agua, leitura(i))
+        await buffer.encerrar()
+        with pytest.raises(FilaCheia):
+            await buffer.enfileirar(consumo_agua, leitura(31))
+
+    rodar(engine, teste, durabilidade="fila", intervalo_ms=10_000, max_linhas=1000)
+    assert contar(engine) == 30
+
+
+def test_falha_no_modo_fila_e_contada(engine, caplog):
+    async def teste(buffer):
+        buffer.iniciar()
+        await buffer.enfileirar(consumo_agua, leitura(0))
+        await buffer.enfileirar(consumo_agua, {"usuario_id": 1, "atividade": "banho"})
+        await buffer.encerrar()
+        return buffer.falhas
+
+    antes = metricas.falhas_buffer.valores[("consumo_agua", "fila")]
+    assert rodar(engine, teste, durabilidade="fila") == 1
+    # a boa do mesmo lote é gravada; a ruim vira métrica e fica no log
+    assert contar(engine) == 1
+    assert metricas.falhas_buffer.valores[("consumo_agua", "fila")] - antes == 1
+    assert any("descartada" in r.getMessage() for r in caplog.records)
+
+
+def test_falha_no_modo_flush_chega_ao_cliente(engine):
+    async def teste(buffer):
+        buffer.iniciar()
+        with pytest.raises(Exception):
+            await buffer.enfileirar(consumo_agua, {"usuario_id": 1, "atividade": "banho"})
+        await buffer.encerrar()
+
+    rodar(engine, teste)
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from api import config, db, escrita, metricas
+from api.tables import consumo_agua
+
+JANELA = "/consumo_agua?inicio=2021-04-01T00:00:00&fim=2021-04-02T00:00:00"
+
+
+def leitura(volume, hora=8):
+    return {"usuario_id": 77, "atividade": "banho", "volume_litros": volume, "timestamp": f"2021-04-01T{hora:02d}:00:00"}
+
+
+def acertos(rota="/consumo_agua"):
+    return {r: metricas.cache_respostas.valores.get((rota, r), 0) for r in ("acerto", "falha", "nao_modificado")}
+
+
+def test_etag_304_e_invalidacao_depois_de_escrever(cliente):
+    assert cliente.post("/consumo_agua", json=leitura(1.0)).status_code == 200
+    primeira = cliente.get(JANELA)
+    etag = primeira.headers["etag"]
+    assert etag.startswith('W/"')
+
+    antes = acertos()
+    repetida = cliente.get(JANELA, headers={"If-None-Match": etag})
+    assert repetida.status_code == 304 and repetida.content == b""
+    assert repetida.headers["etag"] == etag
+    # a forma forte do mesmo ETag e listas com outros valores também valem
+    assert cliente.get(JANELA, headers={"If-None-Match": f'"x", {etag.removeprefix("W/")}'}).status_code == 304
+    # sem If-None-Match a resposta sai do cache, igual à primeira
+    assert cliente.get(JANELA).json() == primeira.json()
+    depois = acertos()
+    assert depois["nao_modificado"] - antes["nao_modificado"] == 2
+    assert depois["acerto"] - antes["acerto"] == 1
+
+    # escrita pela API: o mesmo ETag não vale mais e a leitura nova aparece
+    assert cliente.post("/consumo_agua", json=leitura(2.0, hora=9)).status_code == 200
+    nova = cliente.get(JANELA, headers={"If-None-Match": etag})
+    assert nova.status_code == 200 and nova.headers["etag"] != etag
+    assert len(nova.json()["dados"]) == len(primeira.json()["dados"]) + 1
+
+
+def test_escrita_em_outra_tabela_nao_invalida(cliente):
+    etag = cliente.get(JANELA).headers["etag"]
+    energia = {"usuario_id": 77, "equipamento": "geladeira", "potencia_w": 150.0, "gasto_h": 0.2,
+               "timestamp": "2021-04-01T10:00:00"}
+    assert cliente.post("/consumo_energia", json=energia).status_code == 200
+    assert cliente.get(JANELA, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_escrita_de_outro_processo_invalida(cliente):
+    etag = cliente.get(JANELA).headers["etag"]
+    # outra conexão (importação, outro worker): só o PRAGMA data_version avisa a API
+    engine = db.criar_engine(config.DB_PATH)
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, [{**leitura(3.0, hora=11), "timestamp": datetime(2021, 4, 1, 11)}])
+    engine.dispose()
+    resposta = cliente.get(JANELA, headers={"If-None-Match": etag})
+    assert resposta.status_code == 200 and resposta.headers["etag"] != etag
+    assert 3.0 in [l["volume_litros"] for l in resposta.json()["dados"]]
@@ -0,0 +1,89 @@
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from api import escrita, versoes
+from api.tables import consumo_agua, consumo_energia
+
+# os módulos da UI se importam pelo nome, como o Streamlit os executa
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ui"))
+
+from cache import CacheConsultas, em_cache  # noqa: E402
+
+
+def gravar_agua(engine):
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, [{"usuario_id": 1, "atividade": "banho", "volume_litros": 1.0,
+                                             "timestamp": datetime(2024, 1, 1)}])
+
+
+def test_escrita_na_tabela_invalida_so_quem_depende_dela(engine):
+    cache = CacheConsultas(engine)
+    chamadas = []
+
+    def carregar(nome):
+        chamadas.append(nome)
+        return pd.DataFrame({"x": [len(chamadas)]})
+
+    def obter(nome, tabelas):
+        return cache.obter(nome, tabelas, lambda: carregar(nome))
+
+    obter("agua", ["consumo_agua"])
+    obter("energia", ["consumo_energia"])
+    obter("agua", ["consumo_agua"])
+    obter("energia", ["consumo_energia"])
+    assert chamadas == ["agua", "energia"]
+    assert (cache.acertos, cache.falhas) == (2, 2)
+
+    gravar_agua(engine)
+    obter("agua", ["consumo_agua"])
+    obter("energia", ["consumo_energia"])
+    assert chamadas == ["agua", "energia", "agua"]
+
+    # a versão é o que conta: um incremento sem linhas novas também invalida
+    with engine.begin() as conn:
+        versoes.incrementar(conn, consumo_energia.name)
+    obter("energia", ["consumo_energia"])
+    assert chamadas[-1] == "energia"
+
+
+def test_cada_leitura_recebe_uma_copia(engine):
+    cache = CacheConsultas(engine)
+    primeiro = cache.obter("df", ["consumo_agua"], lambda: pd.DataFrame({"x": [1]}))
+    primeiro["y"] = 2
+    assert list(cache.obter("df", ["consumo_agua"], lambda: None).columns) == ["x"]
+
+
+def test_ttl_e_limite_de_itens(engine):
+    cache = CacheConsultas(engine, max_itens=2, ttl=0)
+    chamadas = []
+    for _ in range(2):
+        cache.obter("a", [], lambda: chamadas.append("a"))
+    assert chamadas == ["a", "a"]
+
+    cache = CacheConsultas(engine, max_itens=2)
+    for chave in ("a", "b", "c"):
+        cache.obter(chave, [], lambda: chave)
+    assert list(cache.itens) == ["b", "c"]
+
+
+def test_decorador_usa_argumentos_e_tabela_do_parametro(engine):
+    chamadas = []
+
+    @em_cache(tabela_param="tabela")
+    def carregar(engine, tabela, usuario=None):
+        chamadas.append((tabela, usuario))
+        return len(chamadas)
+
+    carregar(engine, "consumo_agua")
+    carregar(engine, tabela="consumo_agua")
+    carregar(engine, "consumo_agua", usuario=1)
+    carregar(engine, "consumo_energia")
+    assert len(chamadas) == 3
+
+    gravar_agua(engine)
+    carregar(engine, "consumo_agua")
+    carregar(engine, "consumo_energia")
+    assert len(chamadas) == 4
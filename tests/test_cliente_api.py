@@ -0,0 +1,121 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from ui.cliente_api import CaixaSaida, ClienteAPI, EnvioIncerto
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def servidor():
+    # API falsa: responde com o status da vez; "cair" fecha a conexão depois de ler o corpo
+    respostas, recebidos = [], []
+
+    class Tratador(BaseHTTPRequestHandler):
+        def do_POST(self):
+            recebidos.append(self.rfile.read(int(self.headers["Content-Length"])))
+            status = respostas.pop(0) if respostas else 200
+            if status == "cair":
+                self.close_connection = True
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    http = HTTPServer(("127.0.0.1", 0), Tratador)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{http.server_port}", respostas, recebidos
+    http.shutdown()
+    http.server_close()
+
+
+def novo_cliente(url, tmp_path):
+    return ClienteAPI(url, CaixaSaida(str(tmp_path / "caixa.db")), tentativas=0, timeout=(1, 2))
+
+
+def test_api_fora_do_ar_enfileira(tmp_path):
+    cliente = novo_cliente(f"http://127.0.0.1:{porta_livre()}", tmp_path)
+    assert cliente.enviar("consumo_agua", {"x": 1})["status"] == "enfileirado"
+    assert cliente.caixa.contar() == 1
+
+
+def test_conexao_caida_depois_do_envio_nao_enfileira(servidor, tmp_path):
+    url, respostas, recebidos = servidor
+    cliente = novo_cliente(url, tmp_path)
+    respostas.append("cair")
+    with pytest.raises(EnvioIncerto):
+        cliente.enviar("consumo_agua", {"x": 1})
+    assert len(recebidos) == 1
+    assert cliente.caixa.contar() == 0
+
+
+def test_reenviar_so_descarta_4xx(servidor, tmp_path):
+    url, respostas, recebidos = servidor
+    cliente = novo_cliente(url, tmp_path)
+    for i in range(3):
+        cliente.caixa.guardar("consumo_agua", {"x": i})
+
+    respostas.extend([500])
+    assert cliente.reenviar() == 0
+    assert cliente.caixa.contar() == 3
+
+    respostas.extend([200, 422, 200])
+    assert cliente.reenviar() == 2
+    assert cliente.caixa.contar() == 0
+    assert cliente.caixa.contar("rejeitado") == 1
+
+
+def test_reenvio_incerto_sai_da_fila(servidor, tmp_path):
+    url, respostas, recebidos = servidor
+    cliente = novo_cliente(url, tmp_path)
+    cliente.caixa.guardar("consumo_agua", {"x": 1})
+    cliente.caixa.guardar("consumo_agua", {"x": 2})
+    respostas.append("cair")
+    assert cliente.reenviar() == 0
+    assert cliente.caixa.contar("incerto") == 1
+    assert cliente.reenviar() == 1
+    assert len(recebidos) == 2
+
+
+def test_502_nao_repete_nem_enfileira(servidor, tmp_path):
+    url, respostas, recebidos = servidor
+    cliente = ClienteAPI(url, CaixaSaida(str(tmp_path / "caixa.db")), tentativas=2, timeout=(1, 2))
+    respostas.append(502)
+    with pytest.raises(EnvioIncerto):
+        cliente.enviar("consumo_agua", {"x": 1})
+    assert len(recebidos) == 1
+    assert cliente.caixa.contar() == 0
+
+
+def test_503_repete(servidor, tmp_path):
+    url, respostas, recebidos = servidor
+    cliente = ClienteAPI(url, CaixaSaida(str(tmp_path / "caixa.db")), tentativas=2, timeout=(1, 2))
+    respostas.extend([503, 503])
+    assert cliente.enviar("consumo_agua", {"x": 1})["status"] == "ok"
+    assert len(recebidos) == 3
+
+
+def test_reenvio_automatico_respeita_intervalo(servidor, tmp_path):
+    url, respostas, recebidos = servidor
+    cliente = novo_cliente(url, tmp_path)
+    cliente.caixa.guardar("consumo_agua", {"x": 1})
+    respostas.append(503)
+    assert cliente.reenviar_se_devido(intervalo=60) == 0
+    assert len(recebidos) == 1
+    # dentro do intervalo nenhum rerun bate na API de novo
+    assert cliente.reenviar_se_devido(intervalo=60) == 0
+    assert len(recebidos) == 1
+    assert cliente.reenviar_se_devido(intervalo=0) == 1
+    assert cliente.caixa.contar() == 0
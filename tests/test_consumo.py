@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.mark.parametrize("formato", ["colunar", "arrow"])
+def test_stream_rejeita_formato_que_nao_e_ndjson(cliente, formato):
+    resposta = cliente.get(f"/consumo_agua?stream=true&formato={formato}")
+    assert resposta.status_code == 400
+
+
+def test_stream_em_linhas_e_ndjson(cliente):
+    resposta = cliente.get("/consumo_agua?stream=true")
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("application/x-ndjson")
+
+
+def test_pagina_vazia_mantem_colunas(cliente):
+    import pyarrow as pa
+
+    vazio = "/consumo_agua?inicio=1900-01-01T00:00:00&fim=1900-01-02T00:00:00"
+    tabela = pa.ipc.open_stream(cliente.get(f"{vazio}&formato=arrow").content).read_all()
+    assert tabela.num_rows == 0
+    assert {"id", "usuario_id", "atividade", "volume_litros", "timestamp"} <= set(tabela.column_names)
+    assert tabela.schema.field("timestamp").type == pa.timestamp("us")
+    assert tabela.schema.field("usuario_id").type == pa.int64()
+
+    colunar = cliente.get(f"{vazio}&formato=colunar").json()["dados"]
+    assert colunar["id"] == [] and set(colunar) == set(tabela.column_names)
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from api import dimensoes, escrita, versoes
+from api.tables import atividade_tipo_tbl, consumo_agua, consumo_energia
+
+
+def leitura(atividade, volume=1.0):
+    return {"usuario_id": 1, "atividade": atividade, "volume_litros": volume, "timestamp": datetime(2024, 5, 1, 12)}
+
+
+def cadastro(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(select(atividade_tipo_tbl.c.nome, atividade_tipo_tbl.c.id)).all())
+
+
+def test_nomes_novos_sao_cadastrados_e_os_existentes_reaproveitados(engine):
+    linhas = [leitura("banho"), leitura("rega"), leitura("banho")]
+    with engine.begin() as conn:
+        resolvidas = dimensoes.resolver(conn, "consumo_agua", linhas)
+    ids = cadastro(engine)
+    assert [l["atividade_id"] for l in resolvidas] == [ids["banho"], ids["rega"], ids["banho"]]
+    assert all("atividade" not in l for l in resolvidas)
+    # as linhas originais não são alteradas
+    assert linhas[0]["atividade"] == "banho"
+
+    with engine.begin() as conn:
+        antes = versoes.ler_versoes(conn).get("atividade_tipo")
+        de_novo = dimensoes.resolver(conn, "consumo_agua", [leitura("rega")])
+        # sem nome novo, a versão da dimensão (e o cache da UI) não muda
+        assert versoes.ler_versoes(conn).get("atividade_tipo") == antes
+    assert de_novo[0]["atividade_id"] == ids["rega"]
+    assert cadastro(engine) == ids
+
+
+def test_id_de_transacao_desfeita_nao_fica_no_cache(engine):
+    with pytest.raises(RuntimeError):
+        with engine.begin() as conn:
+            dimensoes.resolver(conn, "consumo_agua", [leitura("piscina")])
+            raise RuntimeError("rollback")
+    assert "piscina" not in cadastro(engine)
+    with engine.begin() as conn:
+        resolvida = dimensoes.resolver(conn, "consumo_agua", [leitura("piscina")])
+    assert resolvida[0]["atividade_id"] == cadastro(engine)["piscina"]
+
+
+def test_nome_cadastrado_por_outro_processo_e_encontrado(engine):
+    with engine.begin() as conn:
+        dimensoes.resolver(conn, "consumo_agua", [leitura("banho")])
+        # outro processo cadastra um nome depois que o cache foi montado
+        conn.execute(atividade_tipo_tbl.insert().values(nome="lavar carro"))
+    with engine.begin() as conn:
+        resolvida = dimensoes.resolver(conn, "consumo_agua", [leitura("lavar carro")])
+    assert resolvida[0]["atividade_id"] == cadastro(engine)["lavar carro"]
+
+
+def test_leituras_devolvem_o_nome(engine):
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, [leitura("banho", 3.0), leitura("tanque", 4.0)])
+    with engine.connect() as conn:
+        todas = conn.execute(dimensoes.selecionar("consumo_agua", consumo_agua)).mappings().all()
+        assert [(l["atividade"], l["volume_litros"]) for l in todas] == [("banho", 3.0), ("tanque", 4.0)]
+        assert list(todas[0].keys()) == dimensoes.colunas_publicas("consumo_agua", consumo_agua)
+        filtradas = conn.execute(select(consumo_agua.c.volume_litros).where(
+            dimensoes.filtro("consumo_agua", consumo_agua, "atividade", "tanque"))).scalars().all()
+        assert filtradas == [4.0]
+        assert conn.execute(select(consumo_agua.c.id).where(
+            dimensoes.filtro("consumo_agua", consumo_agua, "atividade", "inexistente"))).all() == []
+
+
+def test_tabela_sem_dimensao_passa_direto(engine):
+    linhas = [{"usuario_id": 1, "quantidade": 2}]
+    with engine.begin() as conn:
+        assert dimensoes.resolver(conn, "consumo_higiene_limpeza", linhas) is linhas
+    assert "equipamento" in dimensoes.colunas_publicas("consumo_energia", consumo_energia)
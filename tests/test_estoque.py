@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from api import escrita, estoque
+from api.tables import atividade_tbl, compra_tbl, produto_tbl
+
+
+def produto(nome="sabonete", total=90.0, restante=90.0):
+    return {"nome": nome, "unidade": "g", "quantidade_restante": restante, "quantidade_total": total,
+            "quantidade_estoque": 1, "preco_unitario": 3.5, "data_compra": datetime(2025, 1, 1)}
+
+
+def compra(produto_id, quantidade, dia=3):
+    return {"usuario_id": 1, "produto_id": produto_id, "produto_nome": "sabonete", "quantidade": quantidade,
+            "gasto_total": 7.0, "data": datetime(2025, 1, dia)}
+
+
+def gravar(engine, tabela, linhas):
+    with engine.begin() as conn:
+        escrita.gravar(conn, tabela, linhas)
+
+
+def estado(engine):
+    consultas = ["SELECT * FROM estoque ORDER BY produto_id", "SELECT * FROM estoque_diario ORDER BY produto_id, dia",
+                 "SELECT id, quantidade_restante, quantidade_estoque FROM produto ORDER BY id"]
+    with engine.connect() as conn:
+        return [conn.exec_driver_sql(sql).all() for sql in consultas]
+
+
+def test_compra_antes_do_cadastro_conta_quando_o_produto_chega(engine):
+    gravar(engine, compra_tbl, [compra(1, 2), compra(1, 1, dia=4)])
+    gravar(engine, produto_tbl, [produto()])
+    with engine.connect() as conn:
+        detalhe = estoque.detalhar(conn, 1)
+    assert detalhe["comprado"] == 270.0
+    assert detalhe["quantidade"] == 90.0 + 270.0
+
+    incremental = estado(engine)
+    with engine.begin() as conn:
+        estoque.reconstruir(conn)
+    assert estado(engine) == incremental
+
+
+def test_produto_inserido_por_fora_nao_conta_compra_duas_vezes(engine):
+    with engine.begin() as conn:
+        conn.execute(produto_tbl.insert(), [produto()])
+    gravar(engine, compra_tbl, [compra(1, 2)])
+    gravar(engine, atividade_tbl, [{"usuario_id": 1, "produto_id": 1, "produto_nome": "sabonete", "atividade": "banho",
+                                    "porcentagem_gasto": 0.1, "consumo": 9.0, "data": datetime(2025, 1, 5)}])
+    gravar(engine, produto_tbl, [produto("shampoo", 400.0, 400.0)])
+    with engine.connect() as conn:
+        assert estoque.detalhar(conn, 1)["quantidade"] == 90.0 + 180.0 - 9.0
+    incremental = estado(engine)
+    with engine.begin() as conn:
+        estoque.reconstruir(conn)
+    assert estado(engine) == incremental
+
+
+def test_eventos_nao_alteram_o_cadastro(engine):
+    gravar(engine, produto_tbl, [produto(total=90.0, restante=50.0)])
+    gravar(engine, compra_tbl, [compra(1, 2)])
+    with engine.connect() as conn:
+        cadastro = conn.execute(produto_tbl.select()).all()
+        listado = estoque.listar(conn, datetime(2025, 1, 10).date())["produtos"][0]
+    assert (cadastro[0].quantidade_restante, cadastro[0].quantidade_estoque) == (50.0, 1)
+    # 50 + 2 x 90 = 230: 3 embalagens (arredondado para cima)
+    assert (listado["quantidade"], listado["embalagens"], listado["saldo_negativo"]) == (230.0, 3, False)
+
+
+def test_saldo_negativo_e_marcado_e_nao_aparece_como_estoque(engine):
+    gravar(engine, produto_tbl, [produto(restante=10.0)])
+    gravar(engine, atividade_tbl, [{"usuario_id": 1, "produto_id": 1, "produto_nome": "sabonete",
+                                    "atividade": "banho", "porcentagem_gasto": 0.1, "consumo": 25.0,
+                                    "data": datetime(2025, 1, 5)}])
+    with engine.connect() as conn:
+        listado = estoque.listar(conn, datetime(2025, 1, 6).date())["produtos"][0]
+        detalhe = estoque.detalhar(conn, 1, datetime(2025, 1, 6).date())
+    assert (listado["quantidade"], listado["embalagens"], listado["saldo_negativo"]) == (0.0, 0, True)
+    assert listado["dias_restantes"] is None
+    assert detalhe["saldo"] == -15.0
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from api import db, escrita, eventos
+from api.tables import consumo_agua
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "ui"))
+
+import ao_vivo  # noqa: E402
+
+
+class Requisicao:
+    async def is_disconnected(self):
+        return False
+
+
+def gravar(engine, *volumes, timestamp=datetime(2024, 9, 1, 10)):
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, [{"usuario_id": 1, "atividade": "banho", "volume_litros": v,
+                                             "timestamp": timestamp} for v in volumes])
+
+
+def com_difusor(engine, teste, **opcoes):
+    # o difusor vigia o banco do teste; verificar() é chamado direto, sem esperar o intervalo
+    async def rodar():
+        engine_async = db.criar_engine_async(engine.url.database)
+        difusor = eventos.Difusor(engine_async, intervalo_ms=60_000, **opcoes)
+        await difusor.iniciar()
+        try:
+            return await teste(difusor)
+        finally:
+            await difusor.encerrar()
+            await engine_async.dispose()
+    return asyncio.run(rodar())
+
+
+async def ler(transmissao, n):
+    # n eventos da transmissão (sem o retry), já passados pelo parser da UI
+    blocos = []
+    while len(blocos) < n:
+        bloco = await asyncio.wait_for(anext(transmissao), 5)
+        if not bloco.startswith("retry:"):
+            blocos.append(bloco)
+    return list(ao_vivo.ler_eventos("".join(blocos).split("\n")))
+
+
+def test_reconexao_com_last_event_id_recebe_o_que_perdeu(engine):
+    async def teste(difusor):
+        primeira = difusor.transmitir(Requisicao(), ["consumo_agua"])
+        [(inicio, tipo, dados)] = await ler(primeira, 1)
+        assert tipo == "inicio" and dados["ultimos_ids"]["consumo_agua"] == 0
+        gravar(engine, 1.0)
+        await difusor.verificar()
+        [(visto, tipo, dados)] = await ler(primeira, 1)
+        assert tipo == "leituras" and [l["volume_litros"] for l in dados["linhas"]] == [1.0]
+        await primeira.aclose()
+
+        # com o cliente desconectado chegam mais duas escritas
+        gravar(engine, 2.0)
+        await difusor.verificar()
+        gravar(engine, 3.0, 4.0)
+        await difusor.verificar()
+
+        retomada = difusor.transmitir(Requisicao(), ["consumo_agua"], visto)
+        recebidos = await ler(retomada, 2)
+        await retomada.aclose()
+        assert [id_ for id_, _, _ in recebidos] == [visto + 1, visto + 2]
+        assert [[l["volume_litros"] for l in d["linhas"]] for _, _, d in recebidos] == [[2.0], [3.0, 4.0]]
+        # na retomada não há evento de início: os ids seguem os do histórico
+        assert all(tipo == "leituras" for _, tipo, _ in recebidos)
+
+    com_difusor(engine, teste)
+
+
+def test_last_event_id_fora_do_historico_manda_reler(engine):
+    async def teste(difusor):
+        antes = difusor.seq
+        for volume in (1.0, 2.0, 3.0):
+            gravar(engine, volume)
+            await difusor.verificar()
+        retomada = difusor.transmitir(Requisicao(), ["consumo_agua"], antes)
+        [(_, tipo, dados)] = await ler(retomada, 1)
+        await retomada.aclose()
+        assert (tipo, dados) == ("recarregar", {"tabela": None})
+        # id de antes de a API reiniciar (acima da sequência atual) também
+        _, pendentes = difusor.assinar(difusor.seq + 10)
+        assert [tipo for _, tipo, _ in pendentes] == ["recarregar"]
+
+    com_difusor(engine, teste, historico=2)
+
+
+def test_retomada_filtra_pelas_tabelas_assinadas(engine):
+    async def teste(difusor):
+        antes = difusor.seq
+        gravar(engine, 1.0)
+        await difusor.verificar()
+        _, pendentes = difusor.assinar(antes)
+        assert len(pendentes) == 1
+        assert eventos.filtrar(pendentes[0], ["consumo_energia"]) is None
+        assert eventos.filtrar(pendentes[0], ["consumo_agua"]) == pendentes[0]
+
+    com_difusor(engine, teste)
+
+
+def test_painel_ignora_deltas_fora_da_janela():
+    estado = {"desde": pd.Timestamp("2024-09-01"), "por_item": {"banho": 10.0}, "horas": {}, "novas": 0, "ultima": None}
+    linhas = [{"atividade": "banho", "volume_litros": 5.0, "timestamp": "2024-08-31 23:00:00"},
+              {"atividade": "banho", "volume_litros": 2.0, "timestamp": "2024-09-02 08:00:00"},
+              {"atividade": "descarga", "volume_litros": 1.0, "timestamp": "2024-09-02 09:00:00"}]
+    ao_vivo.aplicar(estado, linhas, "atividade", "volume_litros", "banho")
+    assert estado["por_item"] == {"banho": 12.0}
+    assert estado["novas"] == 1
+    assert estado["ultima"] == pd.Timestamp("2024-09-02 08:00:00")
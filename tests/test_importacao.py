@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from api import importacao
+
+
+def linhas_agua(n):
+    return [json.dumps({"usuario_id": 1, "atividade": "banho", "volume_litros": 10.0,
+                        "timestamp": f"2025-01-01T00:00:{i:02d}"}) + "\n" for i in range(n)]
+
+
+@pytest.mark.parametrize("tamanho", [0, -1])
+def test_endpoint_rejeita_chunk_nao_positivo(cliente, tamanho):
+    resposta = cliente.post(f"/importar/consumo_agua?tamanho_chunk={tamanho}", content="".join(linhas_agua(3)))
+    assert resposta.status_code == 422
+
+
+@pytest.mark.parametrize("tamanho", [0, -1])
+def test_importar_rejeita_chunk_nao_positivo(engine, tamanho):
+    with pytest.raises(ValueError):
+        importacao.importar(engine, "consumo_agua", linhas_agua(3), tamanho_chunk=tamanho)
+
+
+def test_importar_grava_todos_os_chunks(engine):
+    resumo = importacao.importar(engine, "consumo_agua", linhas_agua(5), tamanho_chunk=2)
+    assert (resumo["linhas"], resumo["aceitos"], resumo["rejeitados"]) == (5, 5, 0)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM consumo_agua").scalar() == 5
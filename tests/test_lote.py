@@ -0,0 +1,35 @@
+def agua(usuario_id, minuto, **extra):
+    return {"usuario_id": usuario_id, "atividade": "lavar_louca", "volume_litros": 12.5,
+            "timestamp": f"2021-06-01T10:{minuto:02d}:00", **extra}
+
+
+def test_lote_de_agua_informa_cada_linha(cliente):
+    itens = [agua(1, 0), {"usuario_id": "x", "atividade": "banho"}, agua(2, 1), "nem um objeto"]
+    resposta = cliente.post("/consumo_agua/lote", json=itens)
+    assert resposta.status_code == 200
+    corpo = resposta.json()
+    assert (corpo["aceitos"], corpo["rejeitados"]) == (2, 2)
+    assert [r["status"] for r in corpo["resultados"]] == ["aceito", "rejeitado", "aceito", "rejeitado"]
+    assert [r["indice"] for r in corpo["resultados"]] == [0, 1, 2, 3]
+    assert "usuario_id" in corpo["resultados"][1]["erro"]
+
+    # só as linhas aceitas foram gravadas
+    gravadas = cliente.get("/consumo_agua?inicio=2021-06-01T10:00:00&fim=2021-06-01T11:00:00").json()["dados"]
+    assert sorted(l["usuario_id"] for l in gravadas) == [1, 2]
+    assert {l["atividade"] for l in gravadas} == {"lavar_louca"}
+
+
+def test_lote_de_energia_todo_invalido_nao_grava(cliente):
+    itens = [{"usuario_id": 1, "equipamento": "geladeira", "timestamp": "2021-06-02T10:00:00"}]
+    corpo = cliente.post("/consumo_energia/lote", json=itens).json()
+    assert (corpo["aceitos"], corpo["rejeitados"]) == (0, 1)
+    assert cliente.get("/consumo_energia?inicio=2021-06-02T00:00:00&fim=2021-06-03T00:00:00").json()["dados"] == []
+
+
+def test_lote_de_energia_valido(cliente):
+    itens = [{"usuario_id": u, "equipamento": "geladeira", "potencia_w": 150.0, "gasto_h": 1.5,
+              "timestamp": f"2021-06-03T10:0{u}:00"} for u in range(3)]
+    corpo = cliente.post("/consumo_energia/lote", json=itens).json()
+    assert (corpo["status"], corpo["aceitos"], corpo["rejeitados"]) == ("ok", 3, 0)
+    gravadas = cliente.get("/consumo_energia?inicio=2021-06-03T00:00:00&fim=2021-06-04T00:00:00").json()["dados"]
+    assert len(gravadas) == 3
@@ -0,0 +1,22 @@
+import logging
+
+from api import config, db, metricas
+
+
+def test_etapas_da_requisicao_aparecem_em_metrics(cliente):
+    lote = [{"usuario_id": 1, "atividade": "banho", "volume_litros": 12.5, "timestamp": "2025-02-01T08:00:00"}]
+    assert cliente.post("/consumo_agua/lote", json=lote).status_code == 200
+    assert cliente.get("/consumo_agua?limite=1").status_code == 200
+    texto = cliente.get("/metrics").text
+    assert 'consumo_requisicao_etapa_segundos_count{rota="/consumo_agua/lote",etapa="validacao"} ' in texto
+    assert 'consumo_requisicao_etapa_segundos_count{rota="/consumo_agua",etapa="serializacao"} ' in texto
+
+
+def test_consulta_lenta_vai_para_o_log(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(config, "LIMITE_CONSULTA_LENTA_MS", 1e-6)
+    engine = db.criar_engine(str(tmp_path / "lento.db"))
+    with caplog.at_level(logging.WARNING, logger=metricas.log.name):
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+    engine.dispose()
+    assert any("Consulta lenta" in r.getMessage() and "SELECT 1" in r.getMessage() for r in caplog.records)
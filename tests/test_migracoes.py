@@ -0,0 +1,133 @@
+import random
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from api import anomalias, config, db, estoque, migracoes
+
+
+def leituras_v2(n=400, semente=7):
+    # linhas no esquema das leituras até a versão 6 (nome da atividade/do equipamento na própria linha)
+    aleatorio = random.Random(semente)
+    inicio = datetime(2025, 1, 1)
+    agua, energia = [], []
+    for i in range(n):
+        timestamp = (inicio + timedelta(minutes=37 * i)).strftime("%Y-%m-%d %H:%M:%S.%f")
+        volume = aleatorio.uniform(5, 15) * (20 if i % 97 == 96 else 1)
+        agua.append((aleatorio.randint(1, 3), aleatorio.choice(["banho", "descarga"]), volume, timestamp))
+        energia.append((aleatorio.randint(1, 3), "geladeira", 150.0, aleatorio.uniform(0.1, 0.3), timestamp))
+    return agua, energia
+
+
+def banco_com_dados(caminho, ate):
+    engine = db.criar_engine(str(caminho))
+    migracoes.aplicar_migracoes(engine, ate=2)
+    agua, energia = leituras_v2()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO consumo_agua (usuario_id, atividade, volume_litros, timestamp) "
+                             "VALUES (?, ?, ?, ?)", agua)
+        conn.exec_driver_sql("INSERT INTO consumo_energia (usuario_id, equipamento, potencia_w, gasto_h, timestamp) "
+                             "VALUES (?, ?, ?, ?, ?)", energia)
+        conn.exec_driver_sql(
+            "INSERT INTO produto (id, nome, unidade, quantidade_restante, quantidade_total, quantidade_estoque, "
+            "preco_unitario, data_compra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(1, "sabonete", "g", 90.0, 90.0, 1, 3.5, "2025-01-01"), (2, "shampoo", "ml", 300.0, 400.0, 1, 20.0, "2025-01-01")])
+        conn.exec_driver_sql(
+            "INSERT INTO compra (usuario_id, produto_id, produto_nome, quantidade, gasto_total, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [(1, 1, "sabonete", 2, 7.0, "2025-01-03"), (2, 2, "shampoo", 1, 20.0, "2025-01-05")])
+        conn.exec_driver_sql(
+            "INSERT INTO atividade (usuario_id, produto_id, produto_nome, atividade, porcentagem_gasto, consumo, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(1, 1, "sabonete", "banho", 0.1, 9.0, f"2025-01-{d:02d}") for d in range(2, 12)]
+            + [(2, 2, "shampoo", "banho", 0.05, 20.0, f"2025-01-{d:02d}") for d in range(4, 9)])
+    if ate > 2:
+        migracoes.aplicar_migracoes(engine, ate=ate)
+    return engine
+
+
+def ler(engine, sql):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(sql).all()
+
+
+def test_versao_lida_antes_da_trava_nao_reaplica_migracao(engine, monkeypatch):
+    # outro processo aplicou tudo entre a leitura da versão e o BEGIN IMMEDIATE
+    monkeypatch.setattr(migracoes, "versao_atual", lambda engine: 2)
+    assert migracoes.aplicar_migracoes(engine) == []
+    assert ler(engine, "PRAGMA user_version")[0][0] == migracoes.VERSAO_ESQUEMA
+
+
+def test_migracoes_concorrentes_aplicam_cada_versao_uma_vez(tmp_path):
+    banco_com_dados(tmp_path / "consumo.db", ate=2).dispose()
+    engines = [db.criar_engine(str(tmp_path / "consumo.db")) for _ in range(2)]
+    largada = threading.Barrier(len(engines))
+    aplicadas, erros = [], []
+
+    def migrar(engine):
+        largada.wait()
+        try:
+            aplicadas.extend(v for v, _ in migracoes.aplicar_migracoes(engine))
+        except Exception as erro:
+            erros.append(erro)
+
+    threads = [threading.Thread(target=migrar, args=(e,)) for e in engines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert erros == []
+    assert sorted(aplicadas) == list(range(3, migracoes.VERSAO_ESQUEMA + 1))
+    # o rollup diário foi preenchido uma vez só
+    total, = ler(engines[0], "SELECT sum(leituras) FROM rollup_agua WHERE granularidade = 'dia'")[0]
+    assert total == 400
+    for e in engines:
+        e.dispose()
+
+
+def test_m006_igual_ao_estoque_reconstruido(tmp_path):
+    engine = banco_com_dados(tmp_path / "consumo.db", ate=migracoes.VERSAO_ESQUEMA)
+    consultas = ["SELECT * FROM estoque ORDER BY produto_id", "SELECT * FROM estoque_diario ORDER BY produto_id, dia",
+                 "SELECT * FROM estoque_aplicado ORDER BY origem", "SELECT * FROM produto ORDER BY id"]
+    migrado = [ler(engine, sql) for sql in consultas]
+    with engine.begin() as conn:
+        estoque.reconstruir(conn)
+    assert migrado == [ler(engine, sql) for sql in consultas]
+
+
+def test_m006_nao_altera_o_cadastro(tmp_path):
+    engine = banco_com_dados(tmp_path / "consumo.db", ate=5)
+    cadastro = ler(engine, "SELECT * FROM produto ORDER BY id")
+    with engine.begin() as conn:
+        # o sabonete consome mais do que tinha: 90 + 180 comprados, 300 consumidos
+        conn.exec_driver_sql("UPDATE atividade SET consumo = 30.0 WHERE produto_id = 1")
+    migracoes.aplicar_migracoes(engine)
+    assert ler(engine, "SELECT * FROM produto ORDER BY id") == cadastro
+    with engine.connect() as conn:
+        sabonete = estoque.detalhar(conn, 1)
+    assert (sabonete["quantidade"], sabonete["embalagens"], sabonete["saldo_negativo"]) == (0.0, 0, True)
+    assert sabonete["saldo"] == 90.0 + 180.0 - 300.0
+
+
+def test_m008_igual_a_reconstrucao_das_anomalias(tmp_path):
+    engine = banco_com_dados(tmp_path / "consumo.db", ate=migracoes.VERSAO_ESQUEMA)
+    sql = "SELECT * FROM anomalia_estado ORDER BY tabela, usuario_id, dimensao_id"
+    migrado = ler(engine, sql)
+    assert migrado
+    with engine.begin() as conn:
+        for tabela in anomalias.VALORES:
+            anomalias.reconstruir(conn, tabela)
+    reconstruido = ler(engine, sql)
+    assert [l[:3] for l in migrado] == [l[:3] for l in reconstruido]
+    for a, b in zip(migrado, reconstruido):
+        assert a[3:8] == pytest.approx(b[3:8])
+        assert a[8] == b[8]
+
+
+def test_m008_nao_depende_da_configuracao_atual(tmp_path, monkeypatch):
+    padrao = ler(banco_com_dados(tmp_path / "padrao.db", ate=8), "SELECT * FROM anomalia_estado")
+    # mudar os parâmetros da detecção depois não muda o que a migração produz
+    monkeypatch.setattr(config, "ANOMALIA_AQUECIMENTO", 1)
+    monkeypatch.setattr(config, "ANOMALIA_ALFA", 0.5)
+    monkeypatch.setattr(config, "ANOMALIA_LIMIAR_NIVEL", 0.1)
+    assert ler(banco_com_dados(tmp_path / "outro.db", ate=8), "SELECT * FROM anomalia_estado") == padrao
@@ -0,0 +1,75 @@
+import os
+from datetime import datetime, timedelta
+
+from api import escrita, previsao, versoes
+from api.tables import consumo_agua
+
+
+def gravar_dias(engine, dias, ate=None):
+    ate = ate or datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    linhas = [{"usuario_id": u, "atividade": "banho", "volume_litros": 40.0 + u + d % 7,
+               "timestamp": ate - timedelta(days=d)} for d in range(dias) for u in (1, 2)]
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, linhas)
+
+
+def versao_previsao(engine):
+    with engine.connect() as conn:
+        return versoes.ler_versoes(conn).get("previsao", 0)
+
+
+def test_leitura_nao_treina_nem_grava(tmp_path, engine):
+    gravar_dias(engine, 20)
+    df = previsao.previsoes(str(tmp_path))
+    assert df.empty
+    assert not os.path.exists(previsao.caminho_modelos(str(tmp_path)))
+
+
+def test_atualizar_so_regrava_com_dias_novos(tmp_path, engine):
+    pasta = str(tmp_path)
+    gravar_dias(engine, 20)
+    _, novos = previsao.atualizar(engine, pasta)
+    assert novos["consumo_agua"] > 0
+    caminho = previsao.caminho_modelos(pasta)
+    mtime, versao = os.stat(caminho).st_mtime_ns, versao_previsao(engine)
+    assert set(previsao.previsoes(pasta)["usuario_id"]) == {1, 2}
+
+    # uma leitura de hoje muda a versão de consumo_agua, mas o dia ainda não está completo
+    gravar_dias(engine, 1, ate=datetime.now())
+    assert previsao.atualizar_se_preciso(engine, pasta) == {t: 0 for t in previsao.SERIES}
+    assert os.stat(caminho).st_mtime_ns == mtime
+    assert versao_previsao(engine) == versao
+    # sem dado novo nem virada do dia, nem relê os totais
+    assert previsao.atualizar_se_preciso(engine, pasta) is None
+
+
+def test_get_previsoes_nao_grava_modelos(cliente):
+    from api import config
+
+    assert cliente.get("/previsoes").status_code == 200
+    assert not os.path.exists(previsao.caminho_modelos(config.MODELOS_DIR))
+
+
+def test_falha_na_tarefa_vai_para_o_log_e_ela_continua(monkeypatch, caplog):
+    import asyncio
+
+    import api.app as app_mod
+
+    rodadas = []
+
+    def falhar(engine):
+        rodadas.append(1)
+        raise RuntimeError("modelo corrompido")
+
+    monkeypatch.setattr(previsao, "atualizar_se_preciso", falhar)
+    monkeypatch.setattr(app_mod.config, "PREVISAO_INTERVALO_S", 0.01)
+
+    async def rodar():
+        tarefa = asyncio.create_task(app_mod.manter_previsoes())
+        while len(rodadas) < 2:
+            await asyncio.sleep(0.01)
+        tarefa.cancel()
+
+    asyncio.run(rodar())
+    erros = [r for r in caplog.records if r.name == "api.app"]
+    assert erros and "modelo corrompido" in str(erros[0].exc_info[1])
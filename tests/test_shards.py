@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select, text
+
+import api.app as app_mod
+import api.models as models
+from api import shards
+from api.tables import consumo_agua
+
+
+@pytest.fixture
+def roteador(tmp_path):
+    roteador = shards.Roteador(2, str(tmp_path))
+    roteador.preparar()
+    yield roteador
+    for engine in roteador.engines:
+        engine.dispose()
+
+
+def contar(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(consumo_agua)).scalar()
+
+
+def quebrar(roteador, n):
+    # o shard n perde a tabela: a gravação nele falha e nos outros segue
+    with roteador.engines[n].begin() as conn:
+        conn.execute(text("DROP TABLE consumo_agua"))
+
+
+def itens(usuarios):
+    return [{"usuario_id": u, "atividade": "banho", "volume_litros": 10.0, "timestamp": datetime(2024, 1, 1, 8)}
+            for u in usuarios]
+
+
+def test_lote_parcial_informa_falhas_por_linha(roteador, monkeypatch):
+    monkeypatch.setattr(app_mod, "roteador", roteador)
+    quebrar(roteador, 1)
+
+    resposta = asyncio.run(app_mod.inserir_lote(consumo_agua, models.ConsumoAgua, itens([2, 3, 4, 5]) + ["x"]))
+
+    assert resposta["status"] == "parcial"
+    assert (resposta["aceitos"], resposta["falhas"], resposta["rejeitados"]) == (2, 2, 1)
+    assert [r["status"] for r in resposta["resultados"]] == ["aceito", "falhou", "aceito", "falhou", "rejeitado"]
+    assert contar(roteador.engines[0]) == 2
+
+
+def test_lote_sem_nenhum_arquivo_gravado_levanta(roteador):
+    quebrar(roteador, 1)
+    with pytest.raises(Exception):
+        asyncio.run(roteador.gravar(consumo_agua, [models.ConsumoAgua(**i).model_dump() for i in itens([3, 5])]))
+    assert asyncio.run(roteador.gravar(consumo_agua, [models.ConsumoAgua(**i).model_dump() for i in itens([2])])) == {}
+
+
+def test_falha_parcial_vai_para_o_log(roteador, caplog):
+    quebrar(roteador, 1)
+    with caplog.at_level("WARNING", logger="api.shards"):
+        falhas = asyncio.run(roteador.gravar(consumo_agua, [models.ConsumoAgua(**i).model_dump() for i in itens([2, 3])]))
+    assert list(falhas) == [1]
+    assert "shard 1" in caplog.text
+
+
+def test_importacao_retomada_nao_repete_linhas_nos_shards(roteador, tmp_path, monkeypatch):
+    from api import db, importacao, migracoes
+
+    central = db.criar_engine(str(tmp_path / "central.db"))
+    migracoes.aplicar_migracoes(central)
+    registros = [f'{{"usuario_id": {2 + i % 2}, "atividade": "banho", "volume_litros": {i}, '
+                 f'"timestamp": "2024-01-01T{i % 24:02d}:00:00"}}\n' for i in range(40)]
+
+    gravar = shards.escrita.gravar
+    chamadas = []
+
+    def cair_no_shard_1(conn, tabela, linhas):
+        # segundo chunk: o shard 0 faz commit e o processo cai antes do shard 1 (e do progresso central)
+        chamadas.append(1)
+        if len(chamadas) == 4:
+            raise RuntimeError("queda")
+        return gravar(conn, tabela, linhas)
+
+    monkeypatch.setattr(shards.escrita, "gravar", cair_no_shard_1)
+    with pytest.raises(RuntimeError):
+        importacao.importar(central, "consumo_agua", iter(registros), importacao_id="x", tamanho_chunk=10,
+                            roteador=roteador)
+    assert importacao.linhas_processadas(central, "x") == 10
+    assert [contar(e) for e in roteador.engines] == [10, 5]
+
+    monkeypatch.setattr(shards.escrita, "gravar", gravar)
+    # retomada com outro tamanho de chunk: os cortes não coincidem com os do shard 0
+    resumo = importacao.importar(central, "consumo_agua", iter(registros), importacao_id="x", tamanho_chunk=7,
+                                 roteador=roteador)
+    assert resumo["retomado_de"] == 10
+    assert [contar(e) for e in roteador.engines] == [20, 20]
+    with roteador.engines[0].connect() as conn:
+        volumes = conn.execute(select(consumo_agua.c.volume_litros).order_by(consumo_agua.c.id)).scalars().all()
+    assert volumes == [float(i) for i in range(0, 40, 2)]
+    central.dispose()
+
+
+def test_rebalancear_recusa_origem_com_arquivo(roteador, tmp_path):
+    from api import arquivo
+
+    with roteador.engines[0].begin() as conn:
+        arquivo.salvar_estado(conn, "consumo_agua", {"arquivado_ate": datetime(2024, 1, 1), "corte": None, "linhas": 3})
+    with pytest.raises(ValueError, match="arquivadas"):
+        shards.rebalancear(roteador.caminhos, str(tmp_path / "novos"), 3)
+    assert not (tmp_path / "novos").exists()
+
+
+def test_cada_shard_le_a_propria_pasta_de_arquivo(roteador, tmp_path, monkeypatch):
+    from api import arquivo, config, escrita
+
+    monkeypatch.setattr(config, "ARQUIVO_DIR", str(tmp_path / "arquivo"))
+    linhas = [{**i, "timestamp": datetime(2020, 1, 1, h)} for h, i in enumerate(itens([2, 3, 4, 5]))]
+    for n, parte in shards.particionar(linhas, 2).items():
+        with roteador.engines[n].begin() as conn:
+            escrita.gravar(conn, consumo_agua, parte)
+        arquivo.arquivar(roteador.engines[n], "consumo_agua", horizonte_dias=365, pasta=shards.pasta_arquivo(n))
+    assert [contar(e) for e in roteador.engines] == [0, 0]
+    assert (tmp_path / "arquivo" / "shard_001" / "consumo_agua").is_dir()
+
+    # os ids locais se repetem entre os shards: cada um precisa ler só o seu arquivo
+    pagina = asyncio.run(roteador.pagina_consumo("consumo_agua", "atividade", None, None, None, None, 10))
+    assert [(l["usuario_id"], l["id"]) for l in pagina["dados"]] == [(2, 2), (3, 3), (4, 4), (5, 5)]
+    total = asyncio.run(roteador.agregar("consumo_agua", "total", (), None, None, {}, None))
+    assert total["dados"]["leituras"] == [4]
@@ -0,0 +1,75 @@
+import glob
+import os
+from datetime import date, datetime, timedelta
+
+from api import escrita, snapshot
+from api.tables import consumo_agua, produto_tbl
+
+
+def gravar(engine, inicio, n):
+    linhas = [{"usuario_id": 1 + i % 2, "atividade": "banho" if i % 3 else "descarga", "volume_litros": float(i),
+               "timestamp": inicio + timedelta(hours=12 * i)} for i in range(n)]
+    with engine.begin() as conn:
+        escrita.gravar(conn, consumo_agua, linhas)
+
+
+def partes(pasta):
+    return sorted(os.path.relpath(p, pasta) for p in glob.glob(os.path.join(pasta, "consumo_agua", "mes=*", "*.parquet")))
+
+
+def test_exportacao_incremental_so_grava_ids_novos(engine, tmp_path):
+    pasta = str(tmp_path)
+    gravar(engine, datetime(2024, 1, 20), 40)  # janeiro a fevereiro
+    novas, estado = snapshot.exportar(engine, "consumo_agua", pasta)
+    assert (novas, estado) == (40, {"ultimo_id": 40, "linhas": 40})
+    primeiras = partes(pasta)
+    assert {p.split(os.sep)[1] for p in primeiras} == {"mes=2024-01", "mes=2024-02"}
+
+    # sem nada novo, nada é regravado
+    assert snapshot.exportar(engine, "consumo_agua", pasta)[0] == 0
+    assert partes(pasta) == primeiras
+
+    gravar(engine, datetime(2024, 2, 20), 30)
+    novas, estado = snapshot.exportar(engine, "consumo_agua", pasta)
+    assert (novas, estado) == (30, {"ultimo_id": 70, "linhas": 70})
+    assert set(primeiras) < set(partes(pasta))
+
+    df = snapshot.ler_snapshot("consumo_agua", pasta=pasta)
+    assert list(df["id"].sort_values()) == list(range(1, 71))
+    assert set(df["atividade"]) == {"banho", "descarga"}
+
+
+def test_partes_pequenas_e_leitura_filtrada(engine, tmp_path):
+    pasta = str(tmp_path)
+    gravar(engine, datetime(2024, 1, 1), 100)
+    snapshot.exportar(engine, "consumo_agua", pasta, linhas_por_parte=25)
+    assert len({p.split(os.sep)[2] for p in partes(pasta)}) == 4
+
+    df = snapshot.ler_snapshot("consumo_agua", ["timestamp", "volume_litros"], datetime(2024, 2, 1),
+                               datetime(2024, 2, 10), {"usuario_id": 1}, pasta)
+    assert list(df.columns) == ["timestamp", "volume_litros"]
+    assert df["timestamp"].is_monotonic_increasing
+    assert df["timestamp"].min() >= datetime(2024, 2, 1) and df["timestamp"].max() < datetime(2024, 2, 10)
+    with engine.connect() as conn:
+        esperado = conn.exec_driver_sql(
+            "SELECT count(*) FROM consumo_agua WHERE usuario_id = 1 "
+            "AND timestamp >= '2024-02-01' AND timestamp < '2024-02-10'").scalar()
+    assert len(df) == esperado
+
+
+def test_tabela_nao_incremental_e_regravada(engine, tmp_path):
+    pasta = str(tmp_path)
+    assert snapshot.ler_snapshot("produto", pasta=pasta).empty
+    produto = {"nome": "sabonete", "unidade": "un", "quantidade_restante": 1.0, "quantidade_total": 1.0,
+               "quantidade_estoque": 3, "preco_unitario": 2.5, "data_compra": date(2024, 1, 5)}
+    with engine.begin() as conn:
+        conn.execute(produto_tbl.insert(), [produto, {**produto, "nome": "shampoo"}])
+    snapshot.exportar(engine, "produto", pasta)
+
+    # produto muda no lugar: a exportação seguinte substitui tudo, sem duplicar
+    with engine.begin() as conn:
+        conn.execute(produto_tbl.update().where(produto_tbl.c.nome == "sabonete").values(quantidade_estoque=7))
+    snapshot.exportar(engine, "produto", pasta)
+    df = snapshot.ler_snapshot("produto", pasta=pasta)
+    assert sorted(df["nome"]) == ["sabonete", "shampoo"]
+    assert df.set_index("nome").loc["sabonete", "quantidade_estoque"] == 7
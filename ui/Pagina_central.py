@@ -5,9 +5,15 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
+from db import aviso_esquema, aviso_shards
 
 st.set_page_config(page_title="Monitor de Consumo", layout="wide", page_icon="📈")
 st.title("📊 Monitor de Consumo Doméstico")
 st.markdown("Use o menu lateral para navegar entre dashboards e inserir dados.")
 
+if aviso_esquema:
+    st.warning(f"⚠️ {aviso_esquema}")
+if aviso_shards:
+    st.warning(f"⚠️ {aviso_shards}")
+
 
@@ -0,0 +1,29 @@
+import streamlit as st
+
+from util import carregar_alertas
+
+# Painel "🚨 Alertas" dos dashboards de água e energia: leituras marcadas pela detecção
+# de anomalias da API (api/anomalias.py) dentro da janela e do filtro da página.
+
+TITULOS = {
+    "vazamento": "💧 Possível vazamento",
+    "consumo_alto": "📈 Consumo acima do normal",
+    "falha_equipamento": "⚡ Possível falha de equipamento",
+}
+
+
+def painel_alertas(tabela, dias, engine, item=None, unidade=""):
+    alertas = carregar_alertas(tabela, dias, engine, item)
+    st.subheader("🚨 Alertas")
+    if alertas.empty:
+        st.success(f"Nenhuma leitura fora do normal nos últimos {dias} dias.")
+        return
+    for tipo, grupo in alertas.groupby("tipo"):
+        st.error(f"{TITULOS.get(tipo, tipo)}: {len(grupo)} alerta(s), o último em {grupo['timestamp'].max():%d/%m %H:%M}")
+    tabela_alertas = alertas.assign(
+        tipo=alertas["tipo"].map(lambda t: TITULOS.get(t, t)),
+        teste=alertas["teste"].map({"pico": "leitura isolada", "nivel": "mudança persistente"}),
+    )[["timestamp", "usuario_id", "item", "tipo", "teste", "valor", "esperado", "escore"]]
+    with st.expander(f"📋 {len(alertas)} alerta(s)"):
+        st.dataframe(tabela_alertas.rename(columns={"valor": f"valor {unidade}".strip(),
+                                                    "esperado": f"esperado {unidade}".strip()}), hide_index=True)
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import pandas as pd
+import requests
+import streamlit as st
+
+from api import config
+
+# Modo ao vivo dos dashboards: uma thread por processo do Streamlit assina os eventos
+# da API (/eventos, Server-Sent Events) e guarda os recentes. O painel ao vivo é um
+# st.fragment que roda sozinho a cada CONSUMO_UI_AO_VIVO_S segundos e só aplica as
+# leituras novas (o delta) às métricas e às últimas 24 horas; o resto da página, com
+# as consultas e os gráficos do período, não é executado de novo.
+
+MAX_EVENTOS = 1000
+HORAS = 24
+
+
+def ler_eventos(linhas, ao_retry=None):
+    # parser de text/event-stream: devolve (id, tipo, dados) a cada linha em branco
+    id_, tipo, dados = None, "message", []
+    for linha in linhas:
+        if not linha:
+            if dados:
+                yield id_, tipo, json.loads("\n".join(dados))
+            id_, tipo, dados = None, "message", []
+        elif linha.startswith(":"):
+            continue
+        else:
+            campo, _, valor = linha.partition(":")
+            valor = valor[1:] if valor.startswith(" ") else valor
+            if campo == "id":
+                id_ = int(valor)
+            elif campo == "event":
+                tipo = valor
+            elif campo == "data":
+                dados.append(valor)
+            elif campo == "retry" and ao_retry:
+                ao_retry(int(valor) / 1000)
+
+
+class Assinatura:
+    def __init__(self, url, tabelas):
+        self.url = url.rstrip("/")
+        self.tabelas = list(tabelas)
+        # (número local, tipo, dados): os ids da API pulam (são de todas as tabelas), o número não
+        self.eventos = deque(maxlen=MAX_EVENTOS)
+        self.recebidos = 0
+        self.trava = threading.Lock()
+        self.ultimo_id = None
+        self.conectado = False
+        self.erro = None
+        self.espera = config.EVENTOS_RETRY_MS / 1000
+        threading.Thread(target=self.ouvir, daemon=True, name=f"ao_vivo:{','.join(self.tabelas)}").start()
+
+    def ouvir(self):
+        while True:
+            cabecalhos = {"Accept": "text/event-stream"}
+            if self.ultimo_id is not None:
+                # retoma de onde parou: a API reenvia o que ficou no histórico dela
+                cabecalhos["Last-Event-ID"] = str(self.ultimo_id)
+            try:
+                with requests.get(f"{self.url}/eventos", params={"tabela": self.tabelas}, headers=cabecalhos,
+                                  stream=True, timeout=(config.CLIENTE_TIMEOUT_CONEXAO_S,
+                                                        config.EVENTOS_KEEPALIVE_S * 2)) as resposta:
+                    resposta.raise_for_status()
+                    self.conectado, self.erro = True, None
+                    for id_, tipo, dados in ler_eventos(resposta.iter_lines(decode_unicode=True), self.ao_retry):
+                        self.receber(id_, tipo, dados)
+            except (requests.RequestException, ValueError) as err:
+                self.erro = str(err)
+            self.conectado = False
+            time.sleep(self.espera)
+
+    def ao_retry(self, segundos):
+        self.espera = segundos
+
+    def receber(self, id_, tipo, dados):
+        with self.trava:
+            self.ultimo_id = id_
+            if tipo != "inicio":
+                self.recebidos += 1
+                self.eventos.append((self.recebidos, tipo, dados))
+
+    def marca(self):
+        # número do último evento recebido: quem começa a aplicar deltas parte daqui
+        with self.trava:
+            return self.recebidos
+
+    def desde(self, marca):
+        # eventos depois da marca; None se algum já saiu do buffer (é preciso reler tudo)
+        with self.trava:
+            if self.eventos and self.eventos[0][0] > marca + 1:
+                return None
+            return [e for e in self.eventos if e[0] > marca]
+
+
+assinaturas = {}
+trava_assinaturas = threading.Lock()
+
+
+def assinar(tabela):
+    # uma assinatura por tabela e processo: sobrevive aos reruns e é dividida entre as sessões
+    chave = (config.API_URL, tabela)
+    with trava_assinaturas:
+        if chave not in assinaturas:
+            assinaturas[chave] = Assinatura(config.API_URL, [tabela, "alerta"])
+        return assinaturas[chave]
+
+
+# === PAINEL ===
+def inicio_janela():
+    return pd.Timestamp(datetime.now()).floor("h") - pd.Timedelta(hours=HORAS - 1)
+
+
+def marcar(tabela):
+    # chamado pela página antes de ler a base do banco: um evento que chegue durante a
+    # leitura fica depois da marca e é aplicado (no pior caso, uma linha gravada nesse
+    # meio-tempo conta duas vezes até a próxima execução completa; nunca fica de fora)
+    return assinar(tabela).marca()
+
+
+def painel_ao_vivo(tabela, coluna_item, valor, item, df, base_por_item, unidade, marca, desde):
+    # roda a cada execução completa da página: a base (já lida do banco) é refeita e os
+    # deltas voltam a contar a partir da marca tirada antes da leitura; desde é o início
+    # da janela da página, leituras anteriores a ele não entram nos totais
+    inicio = inicio_janela()
+    recentes = df.loc[df.index >= inicio, valor].astype("float64").resample("h").sum()
+    st.session_state[f"ao_vivo:{tabela}"] = {
+        "marca": marca,
+        "desde": pd.Timestamp(desde),
+        "por_item": base_por_item.astype("float64").to_dict(),
+        "horas": {hora: total for hora, total in recentes.items()},
+        "novas": 0,
+        "ultima": None,
+    }
+    fragmento_ao_vivo(tabela, coluna_item, valor, item, unidade)
+
+
+def aplicar(estado, linhas, coluna_item, valor, item):
+    inicio = inicio_janela()
+    for linha in linhas:
+        if item and item != "Todas" and linha[coluna_item] != item:
+            continue
+        instante = pd.Timestamp(linha["timestamp"])
+        if instante < estado["desde"]:
+            # leitura atrasada (importação, correção) fora da janela da página
+            continue
+        estado["por_item"][linha[coluna_item]] = estado["por_item"].get(linha[coluna_item], 0.0) + linha[valor]
+        hora = instante.floor("h")
+        if hora >= inicio:
+            estado["horas"][hora] = estado["horas"].get(hora, 0.0) + linha[valor]
+        estado["novas"] += 1
+        estado["ultima"] = max(estado["ultima"] or instante, instante)
+
+
+@st.fragment(run_every=timedelta(seconds=config.UI_AO_VIVO_S))
+def fragmento_ao_vivo(tabela, coluna_item, valor, item, unidade):
+    assinatura = assinar(tabela)
+    estado = st.session_state.get(f"ao_vivo:{tabela}")
+    if estado is None:
+        return
+    eventos = assinatura.desde(estado["marca"])
+    if eventos is None:
+        st.rerun(scope="app")
+    for numero, tipo, dados in eventos:
+        estado["marca"] = numero
+        if tipo == "recarregar":
+            # carga grande ou reconexão sem histórico: a página relê tudo do banco
+            st.rerun(scope="app")
+        elif tipo == "leituras" and dados["tabela"] == tabela:
+            aplicar(estado, dados["linhas"], coluna_item, valor, item)
+        elif tipo == "alerta":
+            for alerta in dados["alertas"]:
+                if alerta["tabela"] == tabela:
+                    st.toast(f"🚨 {alerta['tipo']}: usuário {alerta['usuario_id']}, {alerta['item']} "
+                             f"({alerta['valor']:.2f} {unidade})")
+
+    st.subheader("🔴 Ao vivo")
+    por_item = pd.Series(estado["por_item"], dtype="float64")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total no período", f"{por_item.sum():.1f} {unidade}",
+                f"+{estado['novas']} leituras" if estado["novas"] else None)
+    col2.metric("📈 Maior Consumo", por_item.idxmax() if not por_item.empty else "-")
+    col3.metric("🕒 Última leitura", f"{estado['ultima']:%H:%M:%S}" if estado["ultima"] is not None else "-")
+    horas = pd.date_range(inicio_janela(), periods=HORAS, freq="h")
+    serie = pd.Series(estado["horas"], dtype="float64").reindex(horas, fill_value=0.0).rename(valor)
+    st.bar_chart(serie)
+    if not assinatura.conectado:
+        st.caption(f"⚠️ Sem conexão com a API ({config.API_URL}): {assinatura.erro or 'conectando...'}")
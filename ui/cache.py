@@ -0,0 +1,107 @@
+import functools
+import inspect
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from api.versoes import ler_versoes
+
+
+MAX_ITENS = 128
+TTL_SEGUNDOS = 300  # consultas com date('now', ...) mudam com o relógio, mesmo sem escrita
+
+
+class CacheConsultas:
+    # Cache LRU de resultados de consultas da UI. Cada item guarda as versões das
+    # tabelas de que depende (versao_tabela, incrementada pela API a cada escrita)
+    # e é descartado quando alguma delas muda.
+
+    def __init__(self, engine, max_itens=MAX_ITENS, ttl=TTL_SEGUNDOS):
+        self.engine = engine
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.itens = OrderedDict()
+        self.trava = threading.Lock()
+        self.sentinela = sqlite3.connect(engine.url.database, check_same_thread=False)
+        self.data_version = None
+        self.versoes_lidas = {}
+        self.acertos = 0
+        self.falhas = 0
+
+    def versoes(self):
+        # PRAGMA data_version só muda quando outra conexão faz commit no arquivo:
+        # enquanto ele não mudar, nem é preciso reler versao_tabela
+        data_version = self.sentinela.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self.data_version:
+            with self.engine.connect() as conn:
+                self.versoes_lidas = ler_versoes(conn)
+            self.data_version = data_version
+        return self.versoes_lidas
+
+    def obter(self, chave, tabelas, carregar):
+        with self.trava:
+            versoes = self.versoes()
+            versao = tuple(versoes.get(t, 0) for t in tabelas)
+            item = self.itens.get(chave)
+            if item and item[0] == versao and time.monotonic() - item[1] < self.ttl:
+                self.itens.move_to_end(chave)
+                self.acertos += 1
+                return copiar(item[2])
+        self.falhas += 1
+        valor = carregar()
+        with self.trava:
+            self.itens[chave] = (versao, time.monotonic(), valor)
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.max_itens:
+                self.itens.popitem(last=False)
+        return copiar(valor)
+
+    def limpar(self):
+        with self.trava:
+            self.itens.clear()
+
+
+def copiar(valor):
+    # as páginas alteram os DataFrames recebidos (ex.: criam colunas), então cada uma recebe a sua cópia
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy()
+    if isinstance(valor, tuple):
+        return tuple(copiar(v) for v in valor)
+    return valor
+
+
+caches = {}
+
+
+def cache_de(engine):
+    if engine not in caches:
+        caches[engine] = CacheConsultas(engine)
+    return caches[engine]
+
+
+def em_cache(*tabelas, tabela_param=None):
+    # tabelas: nomes fixos de que a função depende; tabela_param: nome do argumento
+    # que diz a tabela (ex.: carregar_dados(tabela, ...)). A função precisa receber engine.
+    def decorador(funcao):
+        assinatura = inspect.signature(funcao)
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            argumentos = assinatura.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            valores = dict(argumentos.arguments)
+            engine = valores.pop("engine")
+            dependencias = list(tabelas)
+            if tabela_param:
+                dependencias.append(valores[tabela_param])
+            chave = (funcao.__qualname__, tuple(sorted(
+                (nome, tuple(v) if isinstance(v, list) else v) for nome, v in valores.items()
+            )))
+            return cache_de(engine).obter(chave, dependencias, lambda: funcao(*args, **kwargs))
+
+        return envolvida
+
+    return decorador
@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
+from urllib3.util.retry import Retry
+
+from api import config
+
+# Cliente HTTP da UI de inserção: uma Session com pool de conexões keep-alive,
+# timeouts e novas tentativas com backoff. As novas tentativas só acontecem quando
+# a requisição certamente não foi processada (falha ao conectar ou 503, a fila de
+# escrita cheia), para que um POST nunca seja gravado duas vezes: um 502/504 vem de
+# um proxy e a API pode ter gravado a escrita antes de ele desistir. Se a API estiver fora do ar, a escrita vai
+# para a caixa de saída (um SQLite local) e é reenviada, na ordem, quando ela voltar.
+# Só vão para a fila as escritas que certamente não chegaram à API: se a conexão cai
+# ou a resposta não vem depois do envio, ela pode ter sido gravada e reenviar duplicaria.
+
+STATUS_REPETIR = (503,)
+STATUS_INCERTO = (502, 504)
+
+
+class APIIndisponivel(Exception):
+    pass
+
+
+class EnvioIncerto(Exception):
+    pass
+
+
+def antes_do_envio(err):
+    # só a falha ao abrir a conexão garante que a requisição não foi processada
+    if isinstance(err, requests.ConnectTimeout):
+        return True
+    causa = err.args[0] if err.args else None
+    if isinstance(causa, MaxRetryError):
+        causa = causa.reason
+    return isinstance(causa, (NewConnectionError, ConnectTimeoutError))
+
+
+class CaixaSaida:
+    def __init__(self, caminho=None):
+        self.conn = sqlite3.connect(caminho or config.CAIXA_SAIDA_PATH, check_same_thread=False)
+        self.trava = threading.Lock()
+        with self.trava, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pendente ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, caminho TEXT NOT NULL, dados TEXT NOT NULL, "
+                "criado_em TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pendente', erro TEXT)"
+            )
+
+    def guardar(self, caminho, dados):
+        with self.trava, self.conn:
+            self.conn.execute(
+                "INSERT INTO pendente (caminho, dados, criado_em) VALUES (?, ?, ?)",
+                (caminho, json.dumps(dados), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def primeiro(self):
+        with self.trava:
+            linha = self.conn.execute(
+                "SELECT id, caminho, dados FROM pendente WHERE status = 'pendente' ORDER BY id LIMIT 1"
+            ).fetchone()
+        return (linha[0], linha[1], json.loads(linha[2])) if linha else None
+
+    def remover(self, id_):
+        with self.trava, self.conn:
+            self.conn.execute("DELETE FROM pendente WHERE id = ?", (id_,))
+
+    def rejeitar(self, id_, erro, status="rejeitado"):
+        # a API recusou o registro (ou pode já tê-lo gravado, status 'incerto'): ele sai
+        # da fila para não travar os seguintes nem ser gravado duas vezes
+        with self.trava, self.conn:
+            self.conn.execute("UPDATE pendente SET status = ?, erro = ? WHERE id = ?", (status, erro, id_))
+
+    def contar(self, status="pendente"):
+        with self.trava:
+            return self.conn.execute("SELECT count(*) FROM pendente WHERE status = ?", (status,)).fetchone()[0]
+
+    def listar(self, status="rejeitado"):
+        with self.trava:
+            return self.conn.execute(
+                "SELECT id, caminho, dados, criado_em, erro FROM pendente WHERE status = ? ORDER BY id", (status,)
+            ).fetchall()
+
+
+class ClienteAPI:
+    def __init__(self, url=None, caixa=None, tentativas=None, timeout=None):
+        self.url = (url or config.API_URL).rstrip("/")
+        self.caixa = caixa or CaixaSaida()
+        self.ultimo_reenvio = 0.0
+        self.timeout = timeout or (config.CLIENTE_TIMEOUT_CONEXAO_S, config.CLIENTE_TIMEOUT_LEITURA_S)
+        tentativas = config.CLIENTE_TENTATIVAS if tentativas is None else tentativas
+        repetir = Retry(
+            total=tentativas, connect=tentativas, read=0, status=tentativas,
+            status_forcelist=STATUS_REPETIR, allowed_methods=None,
+            backoff_factor=0.3, respect_retry_after_header=True, raise_on_status=False,
+        )
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=repetir)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+
+    def postar(self, caminho, dados):
+        # APIIndisponivel: nada foi gravado; EnvioIncerto: pode ter sido gravado;
+        # HTTPError: a API recusou os dados (4xx) ou falhou ao processá-los (5xx)
+        try:
+            resposta = self.sessao.post(f"{self.url}/{caminho}", json=dados, timeout=self.timeout)
+        except requests.exceptions.RetryError as err:
+            raise APIIndisponivel(str(err))
+        except requests.ConnectionError as err:
+            if antes_do_envio(err):
+                raise APIIndisponivel(str(err))
+            raise EnvioIncerto(str(err))
+        except requests.Timeout as err:
+            raise EnvioIncerto(str(err))
+        if resposta.status_code in STATUS_REPETIR:
+            raise APIIndisponivel(f"HTTP {resposta.status_code}")
+        if resposta.status_code in STATUS_INCERTO:
+            raise EnvioIncerto(f"HTTP {resposta.status_code}")
+        resposta.raise_for_status()
+        return resposta.json()
+
+    def reenviar(self):
+        # esvazia a caixa de saída na ordem; para no primeiro envio que não puder ser feito
+        self.ultimo_reenvio = time.monotonic()
+        enviados = 0
+        while (item := self.caixa.primeiro()) is not None:
+            id_, caminho, dados = item
+            try:
+                self.postar(caminho, dados)
+            except APIIndisponivel:
+                break
+            except EnvioIncerto as err:
+                self.caixa.rejeitar(id_, str(err)[:500], "incerto")
+                break
+            except requests.HTTPError as err:
+                if err.response.status_code >= 500:
+                    # erro da API, não dos dados: fica na fila para a próxima tentativa
+                    break
+                self.caixa.rejeitar(id_, f"HTTP {err.response.status_code}: {err.response.text[:500]}")
+                continue
+            self.caixa.remover(id_)
+            enviados += 1
+        return enviados
+
+    def reenviar_se_devido(self, intervalo=None):
+        # para os reruns do Streamlit: com a API fora do ar cada tentativa espera o
+        # backoff, então a fila só é reenviada de tempos em tempos
+        intervalo = config.CLIENTE_REENVIO_S if intervalo is None else intervalo
+        if not self.caixa.contar() or time.monotonic() - self.ultimo_reenvio < intervalo:
+            return 0
+        return self.reenviar()
+
+    def enviar(self, caminho, dados):
+        # com itens na fila, o novo só sai depois deles, para manter a ordem das escritas
+        if self.caixa.contar():
+            self.reenviar()
+            if self.caixa.contar():
+                self.caixa.guardar(caminho, dados)
+                return {"status": "enfileirado", "pendentes": self.caixa.contar()}
+        try:
+            resposta = self.postar(caminho, dados)
+        except APIIndisponivel:
+            self.caixa.guardar(caminho, dados)
+            return {"status": "enfileirado", "pendentes": self.caixa.contar()}
+        return {"status": "ok", "resposta": resposta}
+
+
+clientes = {}
+
+
+def cliente():
+    # um cliente por processo do Streamlit: a Session (e as conexões abertas) sobrevive aos reruns
+    if config.API_URL not in clientes:
+        clientes[config.API_URL] = ClienteAPI()
+    return clientes[config.API_URL]
@@ -1,12 +1,29 @@
+import sys
 import os
 
-from sqlalchemy import create_engine
-
 base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))  # volta para a raiz
-db_path = os.path.join(base_dir, "consumo.db")
+sys.path.append(base_dir)
+
+from api import config
+from api.db import criar_engine
+from api.migracoes import verificar_versao
+
+db_path = config.DB_PATH
 
 # Apenas para debug: veja se o arquivo realmente existe
 print("📁 Caminho do banco:", db_path)
 print("🗂️ Existe?", os.path.exists(db_path))
 
-engine = create_engine(f"sqlite:///{db_path}")
+# mesmo factory da API: WAL, busy timeout e pool configurados
+engine = criar_engine(db_path)
+
+aviso_esquema = verificar_versao(engine)
+if aviso_esquema:
+    print("⚠️", aviso_esquema)
+
+# a UI lê o banco direto, sem o roteador da API: com o particionamento por residência as
+# leituras de água e energia (e os rollups e alertas) estão nos shards, e os dashboards
+# delas ficariam parados no que havia no banco central
+aviso_shards = (f"Com CONSUMO_SHARDS={config.SHARDS} as leituras de água e energia ficam nos shards "
+                f"({config.SHARDS_DIR}), que a UI não lê: os dashboards de água e energia estão desligados."
+                if config.SHARDS else None)
@@ -2,43 +2,16 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 from db import engine
+from util import calcular_consumo_mensal, carregar_atividades, carregar_compras, carregar_previsoes, carregar_produtos, gasto_por_produto
+from tempos import iniciar_render, painel_tempos
+
+inicio_render = iniciar_render()
 
 
 # ========== Funções auxiliares ==========
-@st.cache_data
 def carregar_dados():
-    produto = pd.read_sql("SELECT * FROM produto", engine)
-    compra = pd.read_sql("SELECT * FROM compra", engine)
-    atividade = pd.read_sql("SELECT * FROM atividade", engine)
-    return produto, compra, atividade
-
-
-def calcular_consumo_mensal(atividade_df, produto_df, compra_df):
-    atividade_df['data'] = pd.to_datetime(atividade_df['data'])
-    compra_df['data'] = pd.to_datetime(compra_df['data'])
-
-    atividade_df['mes'] = atividade_df['data'].dt.to_period('M')
-    compra_df['mes'] = compra_df['data'].dt.to_period('M')
+    return carregar_produtos(engine), carregar_compras(engine), carregar_atividades(engine)
 
-    consumo_mensal = (
-        atividade_df.groupby(['mes', 'produto_id'])['porcentagem_gasto'].sum().reset_index()
-        .merge(produto_df[['id', 'nome', 'unidade']], left_on='produto_id', right_on='id', how='left')
-    )
-
-    gasto_mensal = (
-        compra_df.groupby(['mes', 'produto_id'])['gasto_total'].sum().reset_index()
-        .merge(produto_df[['id', 'nome']], left_on='produto_id', right_on='id', how='left')
-    )
-
-    return consumo_mensal, gasto_mensal
-
-def gasto_por_produto(compra_df, produto_df):
-    gasto_total = (
-        compra_df.groupby('produto_id')['gasto_total'].sum().reset_index()
-        .merge(produto_df[['id', 'nome']], left_on='produto_id', right_on='id', how='left')
-        .sort_values(by='gasto_total', ascending=False)
-    )
-    return gasto_total
 
 # =======================
 # Interface do Dashboard
@@ -95,6 +68,17 @@ st.bar_chart(df_precos.set_index("nome"))
 
 st.divider()
 
+# Seção: Previsão de Gastos
+previsoes = carregar_previsoes(engine, "compra")
+if not previsoes.empty:
+    st.markdown("## 🔮 Previsão de Gastos")
+    previsto = previsoes["previsto"].sum()
+    st.metric(f"💰 Próximos 30 dias (a partir de {previsoes['inicio'].min():%d/%m})", f"R$ {previsto:.2f}",
+              f"{previsto - previsoes['media_recente'].sum():+.2f} vs. ritmo recente", delta_color="inverse")
+    st.dataframe(previsoes[["usuario_id", "previsto", "media_recente"]], hide_index=True)
+
+    st.divider()
+
 # Seção: Dados Brutos e Exportação
 with st.expander("📄 Visualizar Dados Brutos"):
     st.dataframe(atividade_df)
@@ -107,3 +91,5 @@ with st.expander("📄 Visualizar Dados Brutos"):
         file_name='dados_brutos.csv',
         mime='text/csv',
     )
+
+painel_tempos("Dashboard_Produtos_Higiene", inicio_render, engine)
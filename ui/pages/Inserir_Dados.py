@@ -1,25 +1,52 @@
 import streamlit as st
 import requests
 from datetime import datetime
-from api.app import API_URL
 
 
 from db import engine
+from util import carregar_produtos
+from tempos import iniciar_render, painel_tempos
+from cliente_api import EnvioIncerto, cliente
 import pandas as pd
 
+inicio_render = iniciar_render()
+
 def inserir_dados(tabela, dados):
-    url = f"{API_URL}/{tabela}"
     try:
-        response = requests.post(url, json=dados)
-        response.raise_for_status()
-        st.success("Dados inseridos com sucesso!")
-    except requests.ConnectionError:
-        st.error("❌ Inserção indisponível neste ambiente. Essa funcionalidade só está disponível localmente.")
+        resultado = cliente().enviar(tabela, dados)
+        if resultado["status"] == "enfileirado":
+            st.warning(f"📦 API indisponível: os dados ficaram na caixa de saída e serão enviados quando ela voltar "
+                       f"({resultado['pendentes']} pendentes).")
+        else:
+            st.success("Dados inseridos com sucesso!")
+    except EnvioIncerto:
+        st.error("❌ A API não respondeu: confira se os dados foram gravados antes de salvar de novo.")
     except requests.exceptions.HTTPError as err:
-        st.error(f"❌ Erro ao inserir dados. Código HTTP: {response.status_code}")
+        st.error(f"❌ Erro ao inserir dados. Código HTTP: {err.response.status_code}")
     except Exception as e:
         st.error(f"❌ Erro inesperado: {str(e)}")
 
+def mostrar_caixa_saida():
+    caixa = cliente().caixa
+    # reenvio automático só de tempos em tempos (não a cada rerun) ou quando o usuário pede
+    enviados = cliente().reenviar_se_devido()
+    if caixa.contar() and st.sidebar.button("📤 Reenviar agora"):
+        enviados += cliente().reenviar()
+    if enviados:
+        st.sidebar.success(f"📤 {enviados} registros pendentes enviados")
+    pendentes, rejeitados, incertos = caixa.contar(), caixa.contar("rejeitado"), caixa.contar("incerto")
+    if pendentes:
+        st.sidebar.warning(f"📦 {pendentes} registros aguardando a API")
+    if rejeitados:
+        with st.sidebar.expander(f"⚠️ {rejeitados} registros recusados pela API"):
+            st.dataframe(pd.DataFrame(caixa.listar(), columns=["id", "caminho", "dados", "criado_em", "erro"]),
+                         hide_index=True)
+    if incertos:
+        # a conexão caiu depois do envio: podem ter sido gravados, então não são reenviados
+        with st.sidebar.expander(f"❓ {incertos} registros sem confirmação da API (confira antes de inserir de novo)"):
+            st.dataframe(pd.DataFrame(caixa.listar("incerto"), columns=["id", "caminho", "dados", "criado_em", "erro"]),
+                         hide_index=True)
+
 
 st.set_page_config(page_title="Inserção de Dados", layout="wide", page_icon="📝")
 st.title("📥 Inserção de Dados de Consumo")
@@ -85,7 +112,7 @@ elif tipo == "Energia":
 
 elif tipo == "Higiene - Limpeza":
     
-    produtos_df = pd.read_sql("SELECT * FROM produto", engine)
+    produtos_df = carregar_produtos(engine, ["id", "nome", "quantidade_total"])
     produtos_nome = produtos_df["nome"].tolist()
 
 
@@ -159,13 +186,10 @@ elif tipo == "Higiene - Limpeza":
             }
             compras.append(payload)
         
-        if st.button("Salvar Compra"):
-            for compra in compras:
-                inserir_dados("compra", compra)
+        if st.button("Salvar Compra") and compras:
+            # o carrinho inteiro vai numa requisição só e é gravado numa transação
+            inserir_dados("compra/lote", compras)
 
-                     
-    
-
-    
+mostrar_caixa_saida()
 
-    
\ No newline at end of file
+painel_tempos("Inserir_Dados", inicio_render, engine)
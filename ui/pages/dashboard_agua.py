@@ -2,58 +2,66 @@ import pandas as pd
 import streamlit as st
 import plotly.express as px
 import matplotlib.pyplot as plt
-from db import engine
-from util import carregar_dados, dias_monitorados
+from db import aviso_shards, engine
+from api.amostragem import reduzir_serie
+from util import carregar_dados, carregar_previsoes, carregar_rollup, dias_monitorados, inicio_janela, totais_por_periodo, valores_distintos
+from alertas import painel_alertas
+from ao_vivo import marcar, painel_ao_vivo
+from tempos import iniciar_render, painel_tempos
+
+inicio_render = iniciar_render()
 
 st.set_page_config(page_title="Monitor de Água", layout="wide", page_icon="💧")
 st.title("💧 Dashboard - Consumo de Água")
+if aviso_shards:
+    st.error(f"❌ {aviso_shards}")
+    st.stop()
 diasmonitorados = dias_monitorados("consumo_agua", engine)
 
 dias = st.sidebar.slider("Últimos dias", 1, diasmonitorados, 7)
-atividades = ["Todas"] + pd.read_sql(f"SELECT DISTINCT atividade FROM consumo_agua", engine)["atividade"].tolist()
+atividades = ["Todas"] + valores_distintos("consumo_agua", "atividade", engine)
 atividade = st.sidebar.selectbox("Atividade", atividades)
+ao_vivo = st.sidebar.toggle("🔴 Ao vivo", help="Atualiza o total e as últimas 24 horas a cada leitura nova, sem recarregar a página")
 
 def calcular_custo(litros):
     return 50 if litros <= 10000 else 50 + ((litros - 10000) / 1000) * 2.29
 
+# no modo ao vivo a marca vem antes da leitura: o que for gravado durante ela chega como delta
+marca = marcar("consumo_agua") if ao_vivo else None
 df = carregar_dados("consumo_agua", dias, engine, "atividade", atividade)
+diario = carregar_rollup("consumo_agua", "dia", engine, dias, "atividade", atividade)
 
 if df.empty:
     st.warning("⚠️ Nenhum dado encontrado.")
 else:
-    total = df["volume_litros"].sum()
-    max_atividade = df.groupby("atividade")["volume_litros"].sum().idxmax()
-    min_atividade = df.groupby("atividade")["volume_litros"].sum().idxmin()
-    dias_mon = dias_monitorados("consumo_agua", engine)
+    por_atividade = diario.groupby("atividade")["volume_litros"].sum()
+    total = por_atividade.sum()
+    max_atividade = por_atividade.idxmax()
+    min_atividade = por_atividade.idxmin()
 
     col1, col2, col3 = st.columns(3)
     col1.metric("💧 Total Consumido", f"{total:.1f} L")
     col2.metric("📈 Maior Consumo", max_atividade)
     col3.metric("📉 Menor Consumo", min_atividade)
 
+    painel_alertas("consumo_agua", dias, engine, atividade, "L")
+    if ao_vivo:
+        painel_ao_vivo("consumo_agua", "atividade", "volume_litros", atividade, df, por_atividade, "L", marca, inicio_janela(dias))
+
     st.subheader("📅 Consumo ao longo do tempo")
-    st.line_chart(df["volume_litros"])
+    st.line_chart(reduzir_serie(df["volume_litros"]))
 
     if atividade == "Todas":
         st.subheader("🥧 Por Atividade")
-        fig_pie = px.pie(df.groupby("atividade")["volume_litros"].sum().reset_index(),
-                     values="volume_litros", names="atividade")
+        fig_pie = px.pie(por_atividade.reset_index(), values="volume_litros", names="atividade")
         st.plotly_chart(fig_pie, use_container_width=True)
 
     st.subheader("📊 Por Dia")
-    fig_bar = px.bar(df.resample("D").sum(), y="volume_litros", title="Consumo Diário")
+    fig_bar = px.bar(totais_por_periodo(diario, "volume_litros", "D").to_frame(), y="volume_litros", title="Consumo Diário")
     st.plotly_chart(fig_bar, use_container_width=True)
 
-    
-    df = pd.read_sql("SELECT * FROM consumo_agua", engine)
-
-    df["data"] = pd.to_datetime(df["timestamp"])
-    df.set_index("data", inplace=True)  # Define como índice para usar .resample()
-
-# Agrupa por mês e soma
-    df_mensal = df.resample("ME").sum(numeric_only=True)  # soma o volume_litros por mês
-    
-
+# Agrupa por mês e soma (a partir do rollup mensal)
+    df_mensal = totais_por_periodo(carregar_rollup("consumo_agua", "mes", engine), "volume_litros", "MS").to_frame()
     df_mensal["mes"] = df_mensal.index.strftime("%b/%Y")  # 'Mai/2025', 'Jun/2025' etc.
 
 
@@ -76,5 +84,18 @@ else:
     st.subheader("💸 Gastos")
     st.write(f"R$ {calcular_custo(total):.2f} nos últimos {dias} dias.")
 
+    previsoes = carregar_previsoes(engine, "consumo_agua")
+    if not previsoes.empty:
+        st.subheader("🔮 Previsão")
+        previsto = previsoes["previsto"].sum()
+        col1, col2 = st.columns(2)
+        col1.metric(f"💧 Próximos 30 dias (a partir de {previsoes['inicio'].min():%d/%m})", f"{previsto:.1f} L",
+                    f"{previsto - previsoes['media_recente'].sum():+.1f} L vs. ritmo recente", delta_color="inverse")
+        col2.metric("💸 Gasto previsto", f"R$ {calcular_custo(previsto):.2f}")
+        with st.expander("👥 Por usuário"):
+            st.dataframe(previsoes[["usuario_id", "previsto", "media_recente"]], hide_index=True)
+
     with st.expander("📄 Dados Brutos"):
         st.dataframe(df)
+
+painel_tempos("dashboard_agua", inicio_render, engine)
@@ -1,26 +1,29 @@
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-from db import engine
-from util import carregar_dados, dias_monitorados
+from db import aviso_shards, engine
+from api.amostragem import reduzir_serie
+from util import carregar_dados, carregar_previsoes, carregar_rollup, dias_monitorados, inicio_janela, totais_por_periodo, valores_distintos
+from alertas import painel_alertas
+from ao_vivo import marcar, painel_ao_vivo
+from tempos import iniciar_render, painel_tempos
+
+inicio_render = iniciar_render()
 
 st.set_page_config(page_title="Monitor de Energia", layout="wide", page_icon="⚡")
 st.title("⚡ Dashboard - Consumo de Energia")
+if aviso_shards:
+    st.error(f"❌ {aviso_shards}")
+    st.stop()
 dias_mon = dias_monitorados("consumo_energia", engine)
 
 dias = st.sidebar.slider("Últimos dias", 1, dias_mon, 7)
-equipamentos = ["Todas"] + pd.read_sql(f"SELECT DISTINCT equipamento FROM consumo_energia", engine)["equipamento"].tolist()
+equipamentos = ["Todas"] + valores_distintos("consumo_energia", "equipamento", engine)
 equipamento = st.sidebar.selectbox("equipamento", equipamentos)
+ao_vivo = st.sidebar.toggle("🔴 Ao vivo", help="Atualiza o total e as últimas 24 horas a cada leitura nova, sem recarregar a página")
 
-df = pd.read_sql("SELECT * FROM consumo_energia", engine)
-
-df["data"] = pd.to_datetime(df["timestamp"])
-df.set_index("data", inplace=True)  # Define como índice para usar .resample()
-
-# Agrupa por mês e soma
-df_mensal = df.resample("ME").sum(numeric_only=True)  # soma o volume_litros por mês
-    
-
+# Agrupa por mês e soma (a partir do rollup mensal)
+df_mensal = totais_por_periodo(carregar_rollup("consumo_energia", "mes", engine), "gasto_h", "MS").to_frame()
 df_mensal["mes"] = df_mensal.index.strftime("%b/%Y")  # 'Mai/2025', 'Jun/2025' etc.
 
 
@@ -29,7 +32,7 @@ fig_bar_energia = px.bar(
     df_mensal,
     x="mes",
     y="gasto_h",
-    labels={"mes": "Mês", "gasto_kwh": "Consumo (litros)"},
+    labels={"mes": "Mês", "gasto_h": "Consumo (kWh)"},
     title="📊 Consumo Mensal de Energia",
     color_discrete_sequence=["skyblue"]
 )
@@ -40,33 +43,39 @@ fig_bar_energia = px.bar(
 def calcular_custo(kwh):
     return kwh * 0.656
 
+# no modo ao vivo a marca vem antes da leitura: o que for gravado durante ela chega como delta
+marca = marcar("consumo_energia") if ao_vivo else None
 df_com_filtro = carregar_dados("consumo_energia", dias, engine, "equipamento", equipamento)
+diario = carregar_rollup("consumo_energia", "dia", engine, dias, "equipamento", equipamento)
 
 if df_com_filtro.empty:
     st.warning("⚠️ Nenhum dado encontrado.")
 else:
-    total = df_com_filtro["gasto_h"].sum()
-    max_equipamento = df_com_filtro.groupby("equipamento")["gasto_h"].sum().idxmax()
-    min_equipamento = df_com_filtro.groupby("equipamento")["gasto_h"].sum().idxmin()
-    dias_mon = dias_monitorados("consumo_energia", engine)
+    por_equipamento = diario.groupby("equipamento")["gasto_h"].sum()
+    total = por_equipamento.sum()
+    max_equipamento = por_equipamento.idxmax()
+    min_equipamento = por_equipamento.idxmin()
 
     col1, col2, col3 = st.columns(3)
     col1.metric("🪫 Total Consumido", f"{total:.1f} Kwh")
     col2.metric("📈 Maior Consumo", max_equipamento)
     col3.metric("📉 Menor Consumo", min_equipamento)
 
+    painel_alertas("consumo_energia", dias, engine, equipamento, "kWh")
+    if ao_vivo:
+        painel_ao_vivo("consumo_energia", "equipamento", "gasto_h", equipamento, df_com_filtro, por_equipamento, "kWh", marca, inicio_janela(dias))
+
     st.subheader("📅 Consumo ao longo do tempo")
-    st.line_chart(df_com_filtro["gasto_h"])
+    st.line_chart(reduzir_serie(df_com_filtro["gasto_h"]))
 
 
     if equipamento == "Todas":
         st.subheader("🔧🔧 Por Objeto")
-        fig_pie = px.pie(df_com_filtro.groupby("equipamento")["gasto_h"].sum().reset_index(),
-                     values="gasto_h", names="equipamento")
+        fig_pie = px.pie(por_equipamento.reset_index(), values="gasto_h", names="equipamento")
         st.plotly_chart(fig_pie, use_container_width=True)
 
     st.subheader("📊 Por Dia")
-    fig_bar = px.bar(df_com_filtro.resample("D").sum(), y="gasto_h", title="Consumo Diário")
+    fig_bar = px.bar(totais_por_periodo(diario, "gasto_h", "D").to_frame(), y="gasto_h", title="Consumo Diário")
     st.plotly_chart(fig_bar, use_container_width=True)
 
     
@@ -76,5 +85,18 @@ else:
     st.subheader("💸 Gastos")
     st.write(f"R$ {calcular_custo(total):.2f} nos últimos {dias} dias.")
 
+    previsoes = carregar_previsoes(engine, "consumo_energia")
+    if not previsoes.empty:
+        st.subheader("🔮 Previsão")
+        previsto = previsoes["previsto"].sum()
+        col1, col2 = st.columns(2)
+        col1.metric(f"🪫 Próximos 30 dias (a partir de {previsoes['inicio'].min():%d/%m})", f"{previsto:.1f} Kwh",
+                    f"{previsto - previsoes['media_recente'].sum():+.1f} Kwh vs. ritmo recente", delta_color="inverse")
+        col2.metric("💸 Gasto previsto", f"R$ {calcular_custo(previsto):.2f}")
+        with st.expander("👥 Por usuário"):
+            st.dataframe(previsoes[["usuario_id", "previsto", "media_recente"]], hide_index=True)
+
     with st.expander("📄 Dados Brutos"):
         st.dataframe(df_com_filtro)
+
+painel_tempos("dashboard_energia", inicio_render, engine)
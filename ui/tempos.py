@@ -0,0 +1,38 @@
+import time
+
+import pandas as pd
+import streamlit as st
+
+from api import metricas
+from cache import cache_de
+from util import tempos_recentes
+
+# Painel "⏱️ Tempos" da barra lateral: quanto cada página levou para executar,
+# as consultas desta execução e o acumulado por consulta (o mesmo registro que a API expõe em /metrics).
+
+
+def iniciar_render():
+    return time.perf_counter()
+
+
+def painel_tempos(pagina, inicio, engine):
+    segundos = time.perf_counter() - inicio
+    metricas.renders_ui.observar(segundos, pagina=pagina)
+
+    with st.sidebar.expander("⏱️ Tempos"):
+        st.caption(f"Página executada em {segundos * 1000:.0f} ms")
+        cache = cache_de(engine)
+        st.caption(f"Cache de consultas: {cache.acertos} acertos, {cache.falhas} falhas")
+
+        desta_execucao = [t for t in tempos_recentes if t["instante"] >= inicio]
+        if desta_execucao:
+            st.markdown("**Consultas desta execução** (as servidas pelo cache não aparecem)")
+            st.dataframe(pd.DataFrame(desta_execucao).drop(columns="instante"), hide_index=True)
+
+        acumulado = [
+            {"consulta": chave[0], "execuções": total, "média ms": round(soma / total * 1000, 2)}
+            for chave, (total, soma) in sorted(metricas.consultas_ui.resumo().items())
+        ]
+        if acumulado:
+            st.markdown("**Acumulado desde que a UI subiu**")
+            st.dataframe(pd.DataFrame(acumulado), hide_index=True)
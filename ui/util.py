@@ -1,13 +1,259 @@
+import time
+from collections import deque
+
 import pandas as pd
+from sqlalchemy import func, select
+
+from api import anomalias, arquivo, config, dimensoes, metricas, previsao
+from api.rollups import ROLLUPS
+from api.tables import consumo_agua, consumo_energia, produto_tbl, compra_tbl, atividade_tbl
+from cache import em_cache
+
+# Todas as consultas da UI passam por aqui: montadas sobre as Table de api/tables.py,
+# com parâmetros ligados (o texto SQL não muda com o filtro) e tipos definidos uma vez só.
+
+TABELAS = {
+    "consumo_agua": consumo_agua,
+    "consumo_energia": consumo_energia,
+    "produto": produto_tbl,
+    "compra": compra_tbl,
+    "atividade": atividade_tbl,
+}
+
+# colunas lidas por padrão (o id não é usado pelos dashboards de consumo)
+COLUNAS_CONSUMO = {
+    "consumo_agua": ["timestamp", "usuario_id", "atividade", "volume_litros"],
+    "consumo_energia": ["timestamp", "usuario_id", "equipamento", "potencia_w", "gasto_h"],
+}
+
+TIPOS = {
+    "id": "int64",
+    "usuario_id": "int64",
+    "produto_id": "int64",
+    "volume_litros": "float64",
+    "potencia_w": "float64",
+    "gasto_h": "float64",
+    "leituras": "int64",
+}
+
+DATAS = {"timestamp", "periodo", "data", "data_compra"}
+
+# leituras brutas (a maior parte da memória dos dashboards): medidas em float32,
+# usuário em int32 e atividade/equipamento como category
+TIPOS_COMPACTOS = {
+    "usuario_id": "int32",
+    "volume_litros": "float32",
+    "potencia_w": "float32",
+    "gasto_h": "float32",
+}
+
+
+# === GANCHOS DE TEMPO ===
+# cada consulta chama os ganchos com (nome, segundos, linhas)
+ganchos_tempo = []
+tempos_recentes = deque(maxlen=200)
+
+
+def ao_consultar(gancho):
+    ganchos_tempo.append(gancho)
+    return gancho
+
 
-def carregar_dados(tabela, dias, engine, filtro_col=None, filtro_valor=None):
-    query = f"SELECT * FROM {tabela} WHERE timestamp >= date('now','-{dias} day')"
+@ao_consultar
+def registrar_tempo(nome, segundos, linhas):
+    tempos_recentes.append({
+        "consulta": nome, "ms": round(segundos * 1000, 2), "linhas": linhas, "instante": time.perf_counter(),
+    })
+    metricas.consultas_ui.observar(segundos, consulta=nome)
+
+
+def tipar(df):
+    for coluna in df.columns:
+        if coluna in DATAS:
+            df[coluna] = pd.to_datetime(df[coluna], format="ISO8601")
+        elif coluna in TIPOS:
+            df[coluna] = df[coluna].astype(TIPOS[coluna])
+    return df
+
+
+def notificar(nome, inicio, df):
+    segundos = time.perf_counter() - inicio
+    for gancho in ganchos_tempo:
+        gancho(nome, segundos, len(df))
+
+
+def executar(nome, sel, engine):
+    inicio = time.perf_counter()
+    df = tipar(pd.read_sql(sel, engine))
+    notificar(nome, inicio, df)
+    return df
+
+
+def filtrar(sel, tabela, tbl, filtro_col, filtro_valor):
     if filtro_col and filtro_valor and filtro_valor != "Todas":
-        query += f" AND {filtro_col} = '{filtro_valor}'"
-    df = pd.read_sql(query, engine, parse_dates=["timestamp"])
-    return df.set_index("timestamp").sort_index()
+        sel = sel.where(dimensoes.filtro(tabela, tbl, filtro_col, filtro_valor))
+    return sel
+
+
+@em_cache(*[d[1].name for d in dimensoes.DIMENSOES.values()])
+def nomes_dimensao(tabela, engine):
+    with engine.connect() as conn:
+        return dimensoes.nomes_por_id(conn, tabela)
+
+
+def compactar(df, tabela, engine=None):
+    # ids da dimensão (vindos do banco) ou nomes (vindos do Parquet) viram category
+    if tabela in dimensoes.DIMENSOES and dimensoes.DIMENSOES[tabela][0] in df.columns:
+        nome = dimensoes.DIMENSOES[tabela][0]
+        if engine is not None and pd.api.types.is_integer_dtype(df[nome]):
+            nomes = nomes_dimensao(tabela, engine)
+            codigos = pd.Index(list(nomes)).get_indexer(df[nome])
+            df[nome] = pd.Categorical.from_codes(codigos, categories=list(nomes.values()))
+        else:
+            df[nome] = df[nome].astype("category")
+    for coluna, tipo in TIPOS_COMPACTOS.items():
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype(tipo)
+    return df
 
+
+# === CONSUMO (ÁGUA / ENERGIA) ===
+@em_cache(tabela_param="tabela")
+def carregar_dados(tabela, dias, engine, filtro_col=None, filtro_valor=None, colunas=None):
+    if config.FONTE_UI == "parquet":
+        return carregar_dados_snapshot(tabela, dias, filtro_col, filtro_valor, colunas)
+    with engine.connect() as conn:
+        limite = arquivo.fronteira(conn, tabela)
+    if limite is not None and inicio_janela(dias) < limite:
+        return carregar_dados_arquivo(tabela, dias, engine, filtro_col, filtro_valor, colunas)
+    tbl = TABELAS[tabela]
+    nome, _, coluna_id = dimensoes.DIMENSOES[tabela]
+    # a atividade/o equipamento vêm como id (sem join nem strings repetidas) e viram category em compactar
+    sel = select(*[tbl.c[coluna_id].label(nome) if c == nome else tbl.c[c] for c in colunas or COLUNAS_CONSUMO[tabela]])
+    sel = sel.where(tbl.c.timestamp >= func.date("now", f"-{int(dias)} day"))
+    sel = filtrar(sel, tabela, tbl, filtro_col, filtro_valor).order_by(tbl.c.timestamp)
+    inicio = time.perf_counter()
+    df = compactar(tipar(pd.read_sql(sel, engine)), tabela, engine)
+    notificar(f"carregar_dados:{tabela}", inicio, df)
+    return df.set_index("timestamp")
+
+
+def inicio_janela(dias):
+    # mesma janela de date('now', '-N day') do SQLite (meia-noite UTC de N dias atrás)
+    return (pd.Timestamp.now(tz="UTC").tz_localize(None).normalize() - pd.Timedelta(days=int(dias))).to_pydatetime()
+
+def filtros_de(filtro_col, filtro_valor):
+    return {filtro_col: filtro_valor} if filtro_col and filtro_valor and filtro_valor != "Todas" else None
+
+def carregar_dados_arquivo(tabela, dias, engine, filtro_col=None, filtro_valor=None, colunas=None):
+    # a janela alcança leituras já arquivadas: junta banco e Parquet
+    inicio = time.perf_counter()
+    colunas = colunas or COLUNAS_CONSUMO[tabela]
+    with engine.connect() as conn:
+        df = arquivo.ler_consumo(conn, tabela, colunas, inicio_janela(dias), filtros=filtros_de(filtro_col, filtro_valor))
+    df = compactar(tipar(df[colunas]), tabela)
+    notificar(f"carregar_dados_arquivo:{tabela}", inicio, df)
+    return df.set_index("timestamp")
+
+def carregar_dados_snapshot(tabela, dias, filtro_col=None, filtro_valor=None, colunas=None):
+    from api import snapshot
+
+    inicio = time.perf_counter()
+    filtros = filtros_de(filtro_col, filtro_valor)
+    df = snapshot.ler_snapshot(tabela, colunas or COLUNAS_CONSUMO[tabela], inicio=inicio_janela(dias), filtros=filtros)
+    df = compactar(tipar(df), tabela)
+    notificar(f"carregar_dados_snapshot:{tabela}", inicio, df)
+    return df.set_index("timestamp")
+
+@em_cache(tabela_param="tabela")
 def dias_monitorados(tabela, engine):
-    df = pd.read_sql(f"SELECT timestamp FROM {tabela}", engine)
-    df['data'] = pd.to_datetime(df['timestamp']).dt.date
-    return df['data'].nunique()
+    tbl = ROLLUPS[tabela][0]
+    sel = select(func.count(tbl.c.periodo.distinct())).where(tbl.c.granularidade == "dia")
+    with engine.connect() as conn:
+        return conn.execute(sel).scalar()
+
+@em_cache(tabela_param="tabela")
+def carregar_rollup(tabela, granularidade, engine, dias=None, filtro_col=None, filtro_valor=None):
+    # lê os totais já agregados: o custo depende do número de dias, não de leituras
+    tbl, _, valor = ROLLUPS[tabela]
+    nome = dimensoes.DIMENSOES[tabela][0]
+    sel = dimensoes.selecionar(tabela, tbl, ["periodo", "usuario_id", nome, valor, "leituras"])
+    sel = sel.where(tbl.c.granularidade == granularidade)
+    if dias:
+        sel = sel.where(tbl.c.periodo >= func.date("now", f"-{int(dias)} day"))
+    sel = filtrar(sel, tabela, tbl, filtro_col, filtro_valor)
+    return executar(f"carregar_rollup:{tabela}:{granularidade}", sel, engine)
+
+@em_cache(tabela_param="tabela")
+def valores_distintos(tabela, coluna, engine):
+    # as opções dos filtros saem do rollup mensal, bem menor que a tabela de leituras
+    tbl = ROLLUPS[tabela][0]
+    sel = dimensoes.selecionar(tabela, tbl, [coluna]).where(tbl.c.granularidade == "mes").distinct().order_by(coluna)
+    return executar(f"valores_distintos:{tabela}:{coluna}", sel, engine)[coluna].tolist()
+
+def totais_por_periodo(df, coluna, freq):
+    # soma por período e preenche com zero os períodos sem leitura
+    serie = df.groupby("periodo")[coluna].sum()
+    if serie.empty:
+        return serie
+    return serie.asfreq(freq, fill_value=0)
+
+
+# === HIGIENE E LIMPEZA ===
+@em_cache("produto")
+def carregar_produtos(engine, colunas=None):
+    sel = select(*[produto_tbl.c[c] for c in colunas]) if colunas else select(produto_tbl)
+    return executar("carregar_produtos", sel.order_by(produto_tbl.c.id), engine)
+
+@em_cache("compra")
+def carregar_compras(engine):
+    return executar("carregar_compras", select(compra_tbl).order_by(compra_tbl.c.id), engine)
+
+@em_cache("atividade")
+def carregar_atividades(engine):
+    return executar("carregar_atividades", select(atividade_tbl).order_by(atividade_tbl.c.id), engine)
+
+def calcular_consumo_mensal(atividade_df, produto_df, compra_df):
+    atividade_df['mes'] = atividade_df['data'].dt.to_period('M')
+    compra_df['mes'] = compra_df['data'].dt.to_period('M')
+
+    consumo_mensal = (
+        atividade_df.groupby(['mes', 'produto_id'])['porcentagem_gasto'].sum().reset_index()
+        .merge(produto_df[['id', 'nome', 'unidade']], left_on='produto_id', right_on='id', how='left')
+    )
+
+    gasto_mensal = (
+        compra_df.groupby(['mes', 'produto_id'])['gasto_total'].sum().reset_index()
+        .merge(produto_df[['id', 'nome']], left_on='produto_id', right_on='id', how='left')
+    )
+
+    return consumo_mensal, gasto_mensal
+
+def gasto_por_produto(compra_df, produto_df):
+    gasto_total = (
+        compra_df.groupby('produto_id')['gasto_total'].sum().reset_index()
+        .merge(produto_df[['id', 'nome']], left_on='produto_id', right_on='id', how='left')
+        .sort_values(by='gasto_total', ascending=False)
+    )
+    return gasto_total
+
+
+# === PREVISÕES ===
+@em_cache("previsao")
+def carregar_previsoes(engine, tabela=None):
+    # previsão por usuário a partir dos modelos gravados; a UI não treina (o escritor é a API
+    # ou python -m api.previsao)
+    inicio = time.perf_counter()
+    df = previsao.previsoes()
+    if tabela:
+        df = df[df["tabela"] == tabela].reset_index(drop=True)
+    notificar(f"carregar_previsoes:{tabela or 'todas'}", inicio, df)
+    return df
+
+
+# === ALERTAS ===
+@em_cache("alerta", *[d[1].name for d in dimensoes.DIMENSOES.values()])
+def carregar_alertas(tabela, dias, engine, item=None):
+    item = item if item != "Todas" else None
+    sel = anomalias.selecionar_alertas(tabela, desde=inicio_janela(dias), item=item)
+    return executar(f"carregar_alertas:{tabela}", sel, engine)